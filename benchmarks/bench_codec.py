@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_codec
+----------------------
+
+Measures encoding and decoding every ``fixtures/*.json`` payload, scaled up,
+with each JSON codec installed, against decoding through
+``requests.Response.json()`` (a text decode, then the standard library)::
+
+    $ python benchmarks/bench_codec.py --scale 200
+"""
+
+import argparse
+import glob
+import os
+import time
+
+from common import FIXTURES_PATH, load_fixture, make_response
+
+from togglwrapper.codec import PREFERRED, get_codec
+from togglwrapper.transport import scale_payload
+
+
+def payloads(scale):
+    """ Returns the fixtures, with every list of objects scaled up. """
+    names = sorted(os.path.splitext(os.path.basename(path))[0]
+                   for path in glob.glob(os.path.join(FIXTURES_PATH,
+                                                      '*.json')))
+    return [scale_payload(load_fixture(name), scale) for name in names]
+
+
+def best_of(func, rounds):
+    """ Returns the fastest of several runs of func, in seconds. """
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', type=int, default=100,
+                        help='repeat every list in the fixtures this often')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    data = payloads(args.scale)
+    bodies = [get_codec('json').dumps(payload) for payload in data]
+    megabytes = sum(len(body) for body in bodies) / 1e6
+    print('{} payloads, {:.1f} MB of JSON'.format(len(data), megabytes))
+
+    def json_method():
+        for body in bodies:
+            make_response(body).json()
+
+    baseline = best_of(json_method, args.rounds)
+    print('{:<22} {:>12} {:>12}'.format('codec', 'encode MB/s',
+                                        'decode MB/s'))
+    print('{:<22} {:>12} {:>12.0f}'.format('Response.json()', '-',
+                                           megabytes / baseline))
+    for name in PREFERRED:
+        try:
+            codec = get_codec(name)
+        except ImportError:
+            print('{:<22} not installed'.format(name))
+            continue
+        encode = best_of(lambda: [codec.dumps(payload) for payload in data],
+                         args.rounds)
+        decode = best_of(lambda: [codec.loads(body) for body in bodies],
+                         args.rounds)
+        print('{:<22} {:>12.0f} {:>12.0f}'.format(
+            name, megabytes / encode, megabytes / decode))
+
+
+if __name__ == '__main__':
+    main()
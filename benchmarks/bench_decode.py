@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_decode
+-----------------------
+
+Measures the response pipeline on ``fixtures/user_get_with_related_data.json``
+scaled up to several megabytes, comparing the previous double decode (once in
+``error_checking``, once in ``return_json``) against the current pipeline::
+
+    $ python benchmarks/bench_decode.py --megabytes 8
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from common import load_fixture, make_response, scale_related_data
+
+from togglwrapper.decorators import check_response, decode_response
+
+
+def double_decode(response):
+    """ The previous pipeline: decode for the reason, then again to return. """
+    response.reason = response.json()
+    response.raise_for_status()
+    return response.json()
+
+
+def single_decode(response):
+    """ The current pipeline. """
+    return decode_response(check_response(response))
+
+
+def measure(pipeline, body, rounds):
+    """ Returns (mean seconds, peak bytes) for running the pipeline. """
+    elapsed = 0.0
+    peak = 0
+    for _ in range(rounds):
+        response = make_response(body)
+        tracemalloc.start()
+        start = time.perf_counter()
+        pipeline(response)
+        elapsed += time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return elapsed / rounds, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--megabytes', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    payload = scale_related_data(load_fixture('user_get_with_related_data'),
+                                 args.megabytes * 1024 * 1024)
+    body = json.dumps(payload).encode('utf-8')
+    print('payload size: {:.1f} MB'.format(len(body) / 1024.0 / 1024.0))
+    for name, pipeline in (('double decode', double_decode),
+                           ('single decode', single_decode)):
+        seconds, peak = measure(pipeline, body, args.rounds)
+        print('{:<14} {:8.1f} ms  peak {:7.1f} MB'.format(
+            name, seconds * 1000, peak / 1024.0 / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_models
+-----------------------
+
+Compares the memory held per time entry when kept as decoded dicts against
+``togglwrapper.models.TimeEntry`` records::
+
+    $ python benchmarks/bench_models.py --entries 100000
+"""
+
+import argparse
+import gc
+import json
+import tracemalloc
+
+from common import load_fixture
+
+from togglwrapper.models import TimeEntry
+
+
+def held_bytes(build):
+    """ Returns the bytes still allocated by the object build() returns. """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return after - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=100000)
+    args = parser.parse_args()
+
+    entry = load_fixture('time_entries_get_in_range')[0]
+    body = json.dumps([dict(entry, id=index)
+                       for index in range(args.entries)])
+
+    as_dicts = held_bytes(lambda: json.loads(body))
+    as_models = held_bytes(
+        lambda: [TimeEntry.from_dict(item) for item in json.loads(body)])
+    print('entries:  {}'.format(args.entries))
+    print('dicts:    {:6.0f} bytes/entry'.format(as_dicts / args.entries))
+    print('models:   {:6.0f} bytes/entry'.format(as_models / args.entries))
+    print('saving:   {:5.1f}%'.format(100.0 * (1 - as_models / as_dicts)))
+
+
+if __name__ == '__main__':
+    main()
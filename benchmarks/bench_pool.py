@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_pool
+---------------------
+
+Compares aggregating many accounts with one ``Toggl`` client per token, run
+one after another, to a ``TogglPool`` over a single connection pool. Both
+run against ``togglwrapper.simulator.TogglSimulator`` served over local HTTP,
+which throttles each token to ``--rate`` requests per second::
+
+    $ python benchmarks/bench_pool.py --tokens 50 --calls 10 --rate 20
+"""
+
+import argparse
+import time
+
+import common  # noqa: F401
+
+from togglwrapper import Toggl, TokenBucket
+from togglwrapper.pool import TogglPool
+from togglwrapper.simulator import TogglSimulator
+
+
+def workload(toggl, calls):
+    for _ in range(calls):
+        toggl.Clients.get()
+    return calls
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    count = func()
+    seconds = time.perf_counter() - start
+    print('{:<12} {:>8} requests {:>8.2f} s {:>10.0f} requests/s'.format(
+        name, count, seconds, count / seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tokens', type=int, default=20)
+    parser.add_argument('--calls', type=int, default=10,
+                        help='requests per token')
+    parser.add_argument('--rate', type=float, default=20,
+                        help='requests per second allowed to each token')
+    args = parser.parse_args()
+
+    tokens = ['token-{}'.format(i) for i in range(args.tokens)]
+    # A burst of 2 absorbs the jitter between client and server clocks.
+    simulator = TogglSimulator(tokens=tokens, rate=args.rate, burst=2)
+    simulator.generate(seed=0)
+    server = simulator.serve()
+    base_url = 'http://127.0.0.1:{}/api'.format(server.server_port)
+
+    def sequential():
+        total = 0
+        for token in tokens:
+            with Toggl(token, base_url=base_url,
+                       rate_limiter=TokenBucket(args.rate)) as toggl:
+                total += workload(toggl, args.calls)
+        return total
+
+    def pooled():
+        with TogglPool(tokens, rate=args.rate, base_url=base_url) as pool:
+            result = pool.map(lambda toggl: workload(toggl, args.calls))
+        return sum(result.results.values())
+
+    measure('sequential', sequential)
+    measure('TogglPool', pooled)
+    print('throttled: {}'.format(simulator.throttled))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
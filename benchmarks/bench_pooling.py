@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_pooling
+------------------------
+
+Compares the per-request latency of one-off ``requests.get`` calls (a new
+connection per request) against the pooled session used by ``Toggl``.
+
+Runs against a local keep-alive stub server, so no API token is needed::
+
+    $ python benchmarks/bench_pooling.py --requests 500
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from togglwrapper import Toggl  # noqa: E402
+
+
+BODY = b'{"data": {"id": 1, "name": "Stub"}}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """ Answers every GET with a small JSON body over HTTP/1.1. """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    """ Starts the stub server in a daemon thread and returns it. """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def timed(func, count):
+    """ Returns the mean latency in milliseconds of `count` calls. """
+    start = time.perf_counter()
+    for _ in range(count):
+        func()
+    return (time.perf_counter() - start) * 1000.0 / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[4])
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    server = start_server()
+    base_url = 'http://127.0.0.1:{}/api'.format(server.server_port)
+    toggl = Toggl('token', base_url=base_url)
+    url = toggl.api_url + '/me'
+
+    unpooled = timed(lambda: requests.get(url, auth=toggl.auth),
+                     args.requests)
+    pooled = timed(lambda: toggl.get('/me'), args.requests)
+    server.shutdown()
+
+    print('requests per run:        {}'.format(args.requests))
+    print('unpooled (requests.get): {:.3f} ms/request'.format(unpooled))
+    print('pooled (Toggl.session):  {:.3f} ms/request'.format(pooled))
+    print('speedup:                 {:.2f}x'.format(unpooled / pooled))
+
+
+if __name__ == '__main__':
+    main()
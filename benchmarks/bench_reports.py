@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_reports
+------------------------
+
+Measures fetching a large detailed report page after page versus
+concurrently, replayed offline with simulated latency through
+``togglwrapper.transport.ReplayAdapter``::
+
+    $ python benchmarks/bench_reports.py --rows 5000 --latency 150
+"""
+
+import argparse
+import time
+from urllib.parse import urlencode
+
+import common  # noqa: F401
+
+from togglwrapper import Toggl
+from togglwrapper.reports import DETAILS_PER_PAGE, USER_AGENT
+from togglwrapper.transport import Cassette, ReplayAdapter
+
+
+WORKSPACE_ID = 777
+SINCE = '2016-01-01'
+UNTIL = '2016-12-31'
+
+
+def details_cassette(reports_url, rows):
+    """ Returns a cassette answering every page of a detailed report. """
+    cassette = Cassette()
+    pages = -(-rows // DETAILS_PER_PAGE)
+    for page in range(1, pages + 1):
+        first = (page - 1) * DETAILS_PER_PAGE
+        data = [{'id': index, 'description': 'Entry {}'.format(index),
+                 'dur': 3600000}
+                for index in range(first, min(rows, first + DETAILS_PER_PAGE))]
+        query = urlencode({'workspace_id': WORKSPACE_ID, 'since': SINCE,
+                           'until': UNTIL, 'user_agent': USER_AGENT,
+                           'page': page})
+        cassette.add('GET', '{}/details?{}'.format(reports_url, query),
+                     body={'total_count': rows, 'per_page': DETAILS_PER_PAGE,
+                           'data': data})
+    return cassette
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=100.0,
+                        help='simulated latency in milliseconds')
+    args = parser.parse_args()
+
+    reports_url = Toggl('token').reports_url
+    adapter = ReplayAdapter(details_cassette(reports_url, args.rows),
+                            latency=args.latency / 1000.0)
+    toggl = Toggl('token', transport=adapter)
+
+    for max_workers in (1, 4, 8, 16):
+        start = time.perf_counter()
+        count = sum(1 for _ in toggl.Reports.details(
+            WORKSPACE_ID, since=SINCE, until=UNTIL, max_workers=max_workers))
+        seconds = time.perf_counter() - start
+        print('max_workers={:<3} {:>7} rows {:>8.2f} s {:>10.0f} rows/s'
+              .format(max_workers, count, seconds, count / seconds))
+
+
+if __name__ == '__main__':
+    main()
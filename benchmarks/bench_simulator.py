@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_simulator
+--------------------------
+
+Measures the throughput of the concurrent workflows against
+``togglwrapper.simulator.TogglSimulator`` served over local HTTP, so that
+pooling, concurrency and rate limiting are exercised without the real API::
+
+    $ python benchmarks/bench_simulator.py --time-entries 50000 --workers 8
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+import common  # noqa: F401
+
+from togglwrapper import Toggl
+from togglwrapper.simulator import TogglSimulator
+
+
+def measure(name, func):
+    start = time.perf_counter()
+    count = func()
+    seconds = time.perf_counter() - start
+    print('{:<34} {:>8} items {:>8.2f} s {:>10.0f} items/s'.format(
+        name, count, seconds, count / seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--time-entries', type=int, default=20000)
+    parser.add_argument('--projects', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=None,
+                        help='requests per second the simulator allows')
+    args = parser.parse_args()
+
+    simulator = TogglSimulator(rate=args.rate, burst=args.workers)
+    simulator.generate(workspaces=4, projects=args.projects,
+                       time_entries=args.time_entries, days=90, seed=0)
+    server = simulator.serve()
+    base_url = 'http://127.0.0.1:{}/api'.format(server.server_port)
+    toggl = Toggl('token', base_url=base_url, pool_maxsize=args.workers)
+
+    wids = [workspace['id'] for workspace in toggl.Workspaces.get()]
+    pids = [project['id'] for project in simulator.objects('projects')]
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(days=91)
+
+    measure('Workspaces.get_many_children', lambda: len(
+        toggl.Workspaces.get_many_children(
+            wids, max_workers=args.workers).results))
+    measure('Projects.get_many_children', lambda: len(
+        toggl.Projects.get_many_children(
+            pids, max_workers=args.workers).results))
+    measure('TimeEntries.iter_range', lambda: sum(
+        1 for _ in toggl.TimeEntries.iter_range(
+            start, end, window=timedelta(days=7),
+            max_workers=args.workers)))
+    measure('User.stream_related', lambda: sum(
+        1 for _ in toggl.User.stream_related('time_entries')))
+    print('requests: {}, throttled: {}'.format(simulator.requests,
+                                               simulator.throttled))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
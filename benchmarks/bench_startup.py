@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_startup
+------------------------
+
+Measures the start-up cost paid by short-lived processes, each in a fresh
+interpreter: importing ``togglwrapper``, building a client and touching a
+resource, and sending the first request (through a replayed response, so
+without a network)::
+
+    $ python benchmarks/bench_startup.py --runs 20
+"""
+
+import argparse
+import subprocess
+import sys
+
+from common import ROOT
+
+
+STAGES = (
+    ('import togglwrapper', 'import togglwrapper'),
+    ('Toggl() + resource', 'import togglwrapper; '
+                           'togglwrapper.Toggl("token").TimeEntries'),
+    ('first request', 'import togglwrapper; '
+                      'from togglwrapper.transport import Cassette, '
+                      'ReplayAdapter; '
+                      'c = Cassette(); c.add("GET", "/api/v8/clients", '
+                      'body=[]); '
+                      'togglwrapper.Toggl("token", transport=ReplayAdapter(c))'
+                      '.Clients.get()'),
+)
+
+TIMER = ('import time; start = time.perf_counter(); {}; '
+         'print(time.perf_counter() - start)')
+
+
+def run(code):
+    """ Returns the seconds the code took in a fresh interpreter. """
+    output = subprocess.check_output([sys.executable, '-c',
+                                      TIMER.format(code)], cwd=ROOT)
+    return float(output)
+
+
+def import_time():
+    """ Returns the cumulative import time of togglwrapper, in seconds. """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c',
+                             'import togglwrapper'], cwd=ROOT,
+                            stderr=subprocess.PIPE, universal_newlines=True,
+                            check=True)
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == 'togglwrapper':
+            return int(fields[1]) / 1e6
+    raise RuntimeError('togglwrapper was not imported.')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    print('{:<24} {:>10} {:>10}'.format('stage', 'best ms', 'median ms'))
+    stages = [('-X importtime', import_time)] + [
+        (name, lambda code=code: run(code)) for name, code in STAGES]
+    for name, measure in stages:
+        times = sorted(measure() for _ in range(args.runs))
+        print('{:<24} {:>10.1f} {:>10.1f}'.format(
+            name, times[0] * 1000, times[len(times) // 2] * 1000))
+
+
+if __name__ == '__main__':
+    main()
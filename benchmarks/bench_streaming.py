@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_streaming
+--------------------------
+
+Compares the peak memory of decoding a synthetic related-data response with
+``response.json()`` against streaming its time entries with
+``togglwrapper.streaming.iter_items``, for growing numbers of entries::
+
+    $ python benchmarks/bench_streaming.py --entries 10000 50000 200000
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from common import load_fixture
+
+from togglwrapper.streaming import iter_items
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def synthetic_chunks(entry, count):
+    """ Yields a related-data document with `count` entries, in chunks. """
+    pending = ['{"since": 1, "data": {"id": 1, "time_entries": [']
+    size = len(pending[0])
+    for index in range(count):
+        item = dict(entry, id=index)
+        pending.append((',' if index else '') + json.dumps(item))
+        size += len(pending[-1])
+        if size >= CHUNK_SIZE:
+            yield ''.join(pending).encode('utf-8')
+            pending, size = [], 0
+    pending.append('], "tags": []}}')
+    yield ''.join(pending).encode('utf-8')
+
+
+def full_decode(entry, count):
+    body = b''.join(synthetic_chunks(entry, count))
+    return len(json.loads(body)['data']['time_entries'])
+
+
+def streamed(entry, count):
+    return sum(1 for _ in iter_items(synthetic_chunks(entry, count),
+                                     'data.time_entries'))
+
+
+def measure(func, entry, count):
+    """ Returns (seconds, peak bytes) of counting the entries with func. """
+    tracemalloc.start()
+    start = time.perf_counter()
+    assert func(entry, count) == count
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, nargs='+',
+                        default=[10000, 50000, 100000])
+    args = parser.parse_args()
+
+    fixture = load_fixture('user_get_with_related_data')
+    entry = fixture['data']['time_entries'][0]
+    print('{:>8}  {:>22}  {:>22}'.format('entries', 'response.json()',
+                                         'iter_items'))
+    for count in args.entries:
+        row = []
+        for func in (full_decode, streamed):
+            seconds, peak = measure(func, entry, count)
+            row.append('{:7.2f} s {:8.1f} MB'.format(
+                seconds, peak / 1024.0 / 1024.0))
+        print('{:>8}  {:>22}  {:>22}'.format(count, *row))
+
+
+if __name__ == '__main__':
+    main()
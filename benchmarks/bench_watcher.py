@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_watcher
+------------------------
+
+Counts the requests made to keep a status board of running time entries up
+to date, polling ``TimeEntries.get_current()`` for every user on a fixed
+interval, and with ``togglwrapper.watcher.Watcher``. Every user is a
+``togglwrapper.simulator.TogglSimulator`` in the same process, run on a
+simulated clock, so no time is spent waiting. Users switch time entries at
+random, about every ``--switch`` minutes; ``--outside`` of the switches are
+made from another app, which only polling can notice::
+
+    $ python benchmarks/bench_watcher.py --users 50 --max-interval 60
+"""
+
+import argparse
+import random
+
+import common  # noqa: F401
+
+from togglwrapper import Toggl
+from togglwrapper.simulator import TogglSimulator
+from togglwrapper.transport import WSGIAdapter
+from togglwrapper.watcher import Watcher
+
+
+class Clock(object):
+    """ A simulated epoch clock. """
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def switches(users, seconds, every, outside, seed):
+    """ Returns (time, user, from another app) switches, in time order. """
+    rand = random.Random(seed)
+    events = []
+    for user in range(users):
+        at = rand.expovariate(1.0 / every)
+        while at < seconds:
+            events.append((at, user, rand.random() < outside))
+            at += rand.expovariate(1.0 / every)
+    return sorted(events)
+
+
+def simulate(args, poll_with_watcher):
+    """
+    Returns the requests made to poll, and the mean and worst seconds it took
+    to notice a switch.
+    """
+    start = 1500000000.0
+    clock = Clock(start)
+    clients, others = [], []
+    for _ in range(args.users):
+        transport = WSGIAdapter(TogglSimulator(rate=None, clock=clock))
+        clients.append(Toggl('token', transport=transport))
+        others.append(Toggl('token', transport=transport))
+    watcher = Watcher(dict(enumerate(clients)), min_interval=args.interval,
+                      max_interval=args.max_interval, clock=clock)
+
+    seen = {}
+    lags = []
+    pending = {}
+    polls = 0
+
+    def poll_fixed():
+        for user, toggl in enumerate(clients):
+            entry = toggl.TimeEntries.get_current()['data']
+            if entry != seen.get(user):
+                seen[user] = entry
+                lags.append(clock.now - pending.pop(user))
+        return len(clients)
+
+    def poll_watcher():
+        for change in watcher.poll():
+            lags.append(clock.now - pending.pop(change.key))
+
+    events = switches(args.users, args.hours * 3600, args.switch * 60,
+                      args.outside, args.seed)
+    next_fixed = start
+    end = start + args.hours * 3600
+    while clock.now < end:
+        if poll_with_watcher:
+            due = clock.now + watcher.delay()
+        else:
+            due = next_fixed
+        if events and start + events[0][0] < due:
+            at, user, outside = events.pop(0)
+            clock.now = start + at
+            toggl = others[user] if outside else clients[user]
+            toggl.TimeEntries.start({'time_entry': {'description': 'Work'}})
+            pending.setdefault(user, clock.now)
+            continue
+        clock.now = due
+        if poll_with_watcher:
+            poll_watcher()
+        else:
+            polls += poll_fixed()
+            next_fixed += args.interval
+    if poll_with_watcher:
+        polls = watcher.polls
+    return polls, sum(lags) / max(1, len(lags)), max(lags or [0])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--hours', type=float, default=2)
+    parser.add_argument('--interval', type=float, default=5,
+                        help='the fixed polling interval, in seconds')
+    parser.add_argument('--max-interval', type=float, default=300)
+    parser.add_argument('--switch', type=float, default=30,
+                        help='mean minutes between switches of a user')
+    parser.add_argument('--outside', type=float, default=0.2,
+                        help='fraction of switches made from another app')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print('{:<10} {:>10} {:>14} {:>14}'.format(
+        'polling', 'requests', 'mean lag (s)', 'worst lag (s)'))
+    for name, poll_with_watcher in (('fixed', False), ('Watcher', True)):
+        polls, mean_lag, worst_lag = simulate(args, poll_with_watcher)
+        print('{:<10} {:>10} {:>14.1f} {:>14.1f}'.format(
+            name, polls, mean_lag, worst_lag))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.bench_workflows
+--------------------------
+
+Measures requests per second, p50 and p99 latency and peak memory of the
+main client workflows, replayed offline through
+``togglwrapper.transport.ReplayAdapter``.
+
+Without a cassette, responses are built from the bundled fixtures. Record
+real traffic with ``RecordingAdapter`` and pass ``--cassette`` to replay
+every GET it holds instead::
+
+    $ python benchmarks/bench_workflows.py --latency 20 --threads 8
+    $ python benchmarks/bench_workflows.py --cassette traffic.json \\
+          --scale 10 --throttle-rate 0.05
+
+With ``--coalesce``, identical GETs made by concurrent threads share one
+request, and fewer requests than calls are sent.
+"""
+
+import argparse
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from common import load_fixture
+
+from togglwrapper import Toggl, TokenBucket
+from togglwrapper.api import API_URL
+from togglwrapper.transport import Cassette, ReplayAdapter
+
+
+START = '2016-03-01T00:00:00+00:00'
+END = '2016-03-08T00:00:00+00:00'
+
+
+def fixture_cassette():
+    """ Returns a cassette answering the workflows from the fixtures. """
+    cassette = Cassette()
+    routes = (
+        ('/clients', 'clients_get'),
+        ('/workspaces/777/projects', 'workspace_projects'),
+        ('/time_entries?' + urlencode({'start_date': START,
+                                       'end_date': END}),
+         'time_entries_get_in_range'),
+        ('/me?with_related_data=True', 'user_get_with_related_data'),
+    )
+    for path, fixture in routes:
+        cassette.add('GET', API_URL + path, body=load_fixture(fixture))
+    return cassette
+
+
+def fixture_workflows(toggl):
+    """ Returns the (name, callable) workflows to measure. """
+    return [
+        ('Clients.get', toggl.Clients.get),
+        ('Workspaces.get_projects',
+         lambda: toggl.Workspaces.get_projects(777)),
+        ('TimeEntries.get',
+         lambda: toggl.TimeEntries.get(start_date=START, end_date=END)),
+        ('User.get(related_data)',
+         lambda: toggl.User.get(related_data=True)),
+        ('User.stream_related',
+         lambda: sum(1 for _ in toggl.User.stream_related('time_entries'))),
+    ]
+
+
+def cassette_workflows(toggl, cassette):
+    """ Returns one workflow per distinct GET path in the cassette. """
+    prefix = toggl.api_url.split('://', 1)[-1].split('/', 1)[-1]
+    paths = sorted(set(interaction['path']
+                       for interaction in cassette.interactions
+                       if interaction['method'] == 'GET'))
+    workflows = []
+    for path in paths:
+        uri = path.split('/' + prefix, 1)[-1]
+        workflows.append((uri, lambda uri=uri: toggl.get(uri)))
+    return workflows
+
+
+def percentile(values, share):
+    """ Returns the value below which the given share of values fall. """
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+def run(workflow, count, threads):
+    """ Returns (seconds, latencies) of calling the workflow count times. """
+    def timed_call(_):
+        start = time.perf_counter()
+        workflow()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = list(executor.map(timed_call, range(count)))
+    return time.perf_counter() - start, latencies
+
+
+def peak_memory(workflow):
+    """ Returns the peak bytes allocated during one call of the workflow. """
+    tracemalloc.start()
+    workflow()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cassette', help='a recorded cassette to replay')
+    parser.add_argument('--requests', type=int, default=200,
+                        help='calls per workflow')
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='simulated latency in milliseconds')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='share of requests answered with a 429')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='repeat every list in responses this many times')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='client-side requests per second')
+    parser.add_argument('--coalesce', action='store_true',
+                        help='share identical GETs in flight')
+    args = parser.parse_args()
+
+    cassette = (Cassette.load(args.cassette) if args.cassette
+                else fixture_cassette())
+    adapter = ReplayAdapter(cassette, latency=args.latency / 1000.0,
+                            throttle_rate=args.throttle_rate, retry_after=0,
+                            scale=args.scale, seed=0)
+    # 429s are only re-sent with a rate limiter, so always use one.
+    limiter = TokenBucket(rate=args.rate or 1e9, burst=args.threads)
+    toggl = Toggl('token', transport=adapter, rate_limiter=limiter,
+                  pool_maxsize=args.threads, coalesce=args.coalesce)
+    if args.cassette:
+        workflows = cassette_workflows(toggl, cassette)
+    else:
+        workflows = fixture_workflows(toggl)
+
+    print('{:<28} {:>9} {:>9} {:>9} {:>10}'.format(
+        'workflow', 'req/s', 'p50 ms', 'p99 ms', 'peak KB'))
+    for name, workflow in workflows:
+        sent = adapter.requests
+        seconds, latencies = run(workflow, args.requests, args.threads)
+        requests_per_second = (adapter.requests - sent) / seconds
+        print('{:<28} {:>9.0f} {:>9.2f} {:>9.2f} {:>10.1f}'.format(
+            name[:28], requests_per_second,
+            percentile(latencies, 0.5) * 1000.0,
+            percentile(latencies, 0.99) * 1000.0,
+            peak_memory(workflow) / 1024.0))
+    print('throttled responses: {}'.format(adapter.throttled))
+    if toggl.single_flight is not None:
+        print('requests sent: {calls}, calls coalesced: {coalesced}'.format(
+            **toggl.single_flight.as_dict()))
+
+
+if __name__ == '__main__':
+    main()
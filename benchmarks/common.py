@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""
+benchmarks.common
+-----------------
+
+Helpers shared by the benchmark scripts: loading and scaling the bundled
+fixtures, and building ``requests.Response`` objects without a network.
+"""
+
+import copy
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_PATH = os.path.join(ROOT, 'fixtures')
+
+sys.path.insert(0, ROOT)
+
+
+def load_fixture(name):
+    """ Returns the decoded JSON of the fixture with the given name. """
+    with open(os.path.join(FIXTURES_PATH, name + '.json')) as json_file:
+        return json.load(json_file)
+
+
+def scale_related_data(payload, target_bytes):
+    """
+    Returns a copy of a ``User.get(related_data=True)`` payload whose
+    related lists are repeated until the encoded size reaches target_bytes.
+    """
+    payload = copy.deepcopy(payload)
+    data = payload['data']
+    keys = [key for key, value in data.items() if isinstance(value, list)]
+    originals = dict((key, list(data[key])) for key in keys)
+    unit = sum(len(json.dumps(originals[key])) for key in keys) or 1
+    copies = max(1, target_bytes // unit)
+    next_id = 10 ** 9
+    for key in keys:
+        items = []
+        for _ in range(copies):
+            for item in originals[key]:
+                item = dict(item)
+                item['id'] = next_id
+                next_id += 1
+                items.append(item)
+        data[key] = items
+    return payload
+
+
+def make_response(body, status_code=200, url='http://localhost/api/v8'):
+    """ Returns a requests.Response carrying the given raw body bytes. """
+    import requests
+
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = body
+    response.encoding = 'utf-8'
+    response.headers['Content-Type'] = 'application/json'
+    response.url = url
+    return response
@@ -37,15 +37,18 @@ setup(
         'Topic :: Software Development :: Libraries :: Python Modules',
         'License :: OSI Approved :: MIT License',
         'Natural Language :: English',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.2',
-        'Programming Language :: Python :: 3.3',
-        'Programming Language :: Python :: 3.4',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
     ],
     keywords='toggl timetracking API wrapper',
 
     packages=['togglwrapper'],
+    python_requires='>=3.7',
     package_data={'': ['LICENSE', 'NOTICE']},
 
     # List run-time dependencies here.
@@ -56,5 +59,7 @@ setup(
     # Development dependencies. Install using `pip install -e .[dev]`
     extras_require={
         'dev': requirements + test_requirements,
+        'async': ['httpx'],
+        'fast': ['orjson'],
     },
 )
@@ -11,16 +11,69 @@ Uses the responses library to mock out the requests library, and loads fixtures
 from ``fixtures/`` for the mock JSON response output.
 """
 
+import asyncio
 import json
 import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 import unittest
+from datetime import date, datetime, timedelta, timezone
+from email.utils import formatdate
+from urllib.parse import parse_qs, urlparse
 
+import mock
 import responses
-from requests.exceptions import HTTPError
+import requests
+from requests.exceptions import ConnectionError, HTTPError
+from urllib3.exceptions import MaxRetryError, NewConnectionError
 
 
 from togglwrapper import api
-from togglwrapper.exceptions import AuthError
+from togglwrapper import deadline
+from togglwrapper.deadline import Deadline
+from togglwrapper.exceptions import (AuthError, DeadlineExceeded,
+                                     TruncatedResponse)
+from togglwrapper.hooks import Hook, OpenTelemetryHook, endpoint_template
+from togglwrapper.ratelimit import TokenBucket, parse_retry_after
+from togglwrapper.reports import split_dates
+from togglwrapper.cache import MemoryCache, ResponseCache, SQLiteCache
+from togglwrapper import models
+from togglwrapper.codec import Codec, get_codec
+from togglwrapper.columnar import TimeEntryColumns
+from togglwrapper.concurrency import chunk_ids
+from togglwrapper.metrics import MetricsCollector
+from togglwrapper.mixins import idempotency_key
+from togglwrapper.pool import TogglPool
+from togglwrapper.retry import RetryPolicy
+from togglwrapper.simulator import TogglSimulator
+from togglwrapper.streaming import ItemParser, iter_items
+from togglwrapper.transport import (Cassette, RecordingAdapter, ReplayAdapter,
+                                    WSGIAdapter)
+from togglwrapper.utils import parse_datetime
+from togglwrapper.sync import JSONFileStore, SyncEngine
+from togglwrapper import watcher
+from togglwrapper.watcher import Watcher
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+try:
+    import httpx
+    from togglwrapper.aio import AsyncToggl
+except ImportError:
+    httpx = None
 
 
 FAKE_TOKEN = 'fake_token_1'
@@ -108,6 +161,1732 @@ class TestToggl(TestTogglBase):
         # Ensure that the mocked response was triggered twice
         self.assertEqual(len(responses.calls), 2)
 
+    @responses.activate
+    def test_single_decode(self):
+        """ Should decode a successful response body exactly once. """
+        full_url = self.toggl.api_url + self.toggl.User.uri
+        responses.add(responses.GET, full_url, body=self.get_json('user_get'),
+                      content_type='application/json')
+        codec = self.toggl.codec
+        with mock.patch.object(requests.Response, 'json') as json_mock, \
+                mock.patch.object(codec, 'loads',
+                                  wraps=codec.loads) as loads_mock:
+            self.toggl.User.get()
+        self.assertEqual(loads_mock.call_count, 1)
+        self.assertEqual(json_mock.call_count, 0)
+
+    def test_pooled_session(self):
+        """ Should mount a sized connection pool on a persistent session. """
+        toggl = api.Toggl(self.api_token, pool_connections=2, pool_maxsize=7,
+                          keep_alive=False)
+        adapter = toggl.session.get_adapter(toggl.api_url)
+        self.assertEqual(adapter._pool_connections, 2)
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(toggl.session.headers['Connection'], 'close')
+        self.assertEqual(toggl.session.auth, toggl.auth)
+
+    @responses.activate
+    def test_session_reused(self):
+        """ Should send every verb through the same session. """
+        full_url = self.toggl.api_url + self.toggl.Clients.uri
+        responses.add(responses.GET, full_url, body='[]')
+        responses.add(responses.POST, full_url, body='{}')
+        session = self.toggl.session
+        self.toggl.Clients.get()
+        self.toggl.Clients.create({})
+        self.assertIs(self.toggl.session, session)
+        self.assertEqual(len(responses.calls), 2)
+
+
+class TestStartup(unittest.TestCase):
+    """ Guards the import and cold-start cost of the package. """
+    # Generous enough for slow CI machines; importing requests eagerly
+    # again takes several times longer.
+    IMPORT_BUDGET = 0.1
+
+    def run_python(self, *args):
+        return subprocess.run(
+            [sys.executable] + list(args), stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, universal_newlines=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    def test_lazy_imports(self):
+        """ Should not import requests until the first request. """
+        result = self.run_python('-c', (
+            'import sys, togglwrapper; '
+            'toggl = togglwrapper.Toggl("token"); toggl.TimeEntries; '
+            'print("requests" in sys.modules)'))
+        self.assertEqual(result.stdout.strip(), 'False')
+
+    def test_import_time(self):
+        """ Should import within the budget. """
+        best = None
+        for _ in range(3):
+            result = self.run_python('-X', 'importtime', '-c',
+                                     'import togglwrapper')
+            for line in result.stderr.splitlines():
+                fields = [field.strip() for field in line.split('|')]
+                if len(fields) == 3 and fields[2] == 'togglwrapper':
+                    seconds = int(fields[1]) / 1e6
+                    best = seconds if best is None else min(best, seconds)
+        self.assertLess(best, self.IMPORT_BUDGET)
+
+    def test_lazy_resources(self):
+        """ Should build each resource once, on first access. """
+        toggl = api.Toggl(FAKE_TOKEN)
+        self.assertNotIn('Clients', vars(toggl))
+        clients = toggl.Clients
+        self.assertIsInstance(clients, api.Clients)
+        self.assertIs(toggl.Clients, clients)
+        self.assertIsNot(api.Toggl(FAKE_TOKEN).Clients, clients)
+        self.assertIsNone(toggl._session)
+
+
+class FakeClock(object):
+    """ A controllable clock whose sleep advances time instantly. """
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    """ Tests the client-side request scheduler. """
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_burst_then_rate(self):
+        """ Should allow a burst, then space requests out by the rate. """
+        bucket = TokenBucket(rate=2, burst=3, clock=self.clock)
+        waits = [bucket.reserve() for _ in range(5)]
+        self.assertEqual(waits, [0.0, 0.0, 0.0, 0.5, 1.0])
+
+    def test_refill(self):
+        """ Should earn tokens back while idle, up to the burst. """
+        bucket = TokenBucket(rate=1, burst=2, clock=self.clock,
+                             sleep=self.clock.sleep)
+        bucket.acquire()
+        bucket.acquire()
+        self.clock.now += 10
+        self.assertEqual([bucket.reserve() for _ in range(3)],
+                         [0.0, 0.0, 1.0])
+
+    def test_defer(self):
+        """ Should hold back requests for a Retry-After period. """
+        bucket = TokenBucket(rate=1, burst=5, clock=self.clock)
+        bucket.defer(3)
+        self.assertEqual(bucket.reserve(), 3.0)
+        self.assertEqual(bucket.reserve(), 4.0)
+
+    def test_defer_cap(self):
+        """ Should not hold back requests longer than max_defer. """
+        bucket = TokenBucket(rate=1, burst=1, max_defer=10, clock=self.clock)
+        bucket.defer(86400)
+        self.assertEqual(bucket.reserve(), 10.0)
+
+    def test_invalid(self):
+        """ Should reject rates and bursts that can never send. """
+        self.assertRaises(ValueError, TokenBucket, rate=0)
+        self.assertRaises(ValueError, TokenBucket, burst=0)
+
+
+class TestRateLimitedToggl(TestTogglBase):
+    """ Tests the rate limiter wired into the Toggl client. """
+    focus_class = api.Clients
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(rate=1, burst=1, clock=self.clock,
+                                  sleep=self.clock.sleep)
+        self.toggl = api.Toggl(self.api_token, rate_limiter=self.bucket)
+
+    @responses.activate
+    def test_spaces_requests(self):
+        """ Should wait for the bucket between requests. """
+        self.responses_add('GET', filename='clients_get')
+        for _ in range(3):
+            self.toggl.Clients.get()
+        self.assertEqual(self.clock.slept, [1.0, 1.0])
+
+    @responses.activate
+    def test_retry_after(self):
+        """ Should wait out Retry-After on a 429, then re-send. """
+        url = self.compile_full_url()
+        responses.add(responses.GET, url, status=429,
+                      headers={'Retry-After': '7'})
+        responses.add(responses.GET, url, body=self.get_json('clients_get'))
+        response = self.toggl.Clients.get()
+        self.assertEqual(type(response), list)
+        self.assertEqual(len(responses.calls), 2)
+        self.assertEqual(self.clock.slept, [7.0])
+
+    @responses.activate
+    def test_gives_up_throttled(self):
+        """ Should raise HTTPError if the server keeps answering 429. """
+        responses.add(responses.GET, self.compile_full_url(), status=429)
+        self.assertRaises(HTTPError, self.toggl.Clients.get)
+        self.assertEqual(len(responses.calls), api.MAX_THROTTLE_RETRIES + 1)
+
+
+class FlakyEndpoint(object):
+    """ A responses callback failing a set number of times, then passing. """
+
+    def __init__(self, failures, body='[]'):
+        self.failures = list(failures)
+        self.body = body
+        self.calls = 0
+
+    def __call__(self, request):
+        self.calls += 1
+        if self.failures:
+            failure = self.failures.pop(0)
+            if isinstance(failure, Exception):
+                raise failure
+            return (failure, {'Retry-After': '0'}, '')
+        return (200, {}, self.body)
+
+
+class TestRetry(TestTogglBase):
+    """ Tests automatic retries of transient failures. """
+    focus_class = api.Clients
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.policy = RetryPolicy(max_attempts=4, backoff_base=1,
+                                  backoff_cap=3, jitter=False,
+                                  sleep=self.clock.sleep)
+        self.toggl = api.Toggl(self.api_token, retry=self.policy)
+
+    def add_flaky(self, method, failures):
+        endpoint = FlakyEndpoint(failures)
+        responses.add_callback(getattr(responses, method),
+                               self.compile_full_url(), callback=endpoint)
+        return endpoint
+
+    @responses.activate
+    def test_retries_until_success(self):
+        """ Should retry 5xx and connection errors with capped backoff. """
+        endpoint = self.add_flaky('GET', [503, ConnectionError('reset'), 502])
+        self.assertEqual(self.toggl.Clients.get(), [])
+        self.assertEqual(endpoint.calls, 4)
+        self.assertEqual(self.clock.slept, [1, 2, 3])
+        stats = self.policy.stats.as_dict()
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['retries'], 3)
+        self.assertEqual(stats['sleep_seconds'], 6)
+        self.assertEqual(stats['statuses'],
+                         {503: 1, 502: 1, 'connection': 1})
+
+    @responses.activate
+    def test_gives_up(self):
+        """ Should raise once the attempts are used up. """
+        endpoint = self.add_flaky('GET', [500] * 5)
+        self.assertRaises(HTTPError, self.toggl.Clients.get)
+        self.assertEqual(endpoint.calls, 4)
+        self.assertEqual(self.policy.stats.exhausted, 1)
+
+    @responses.activate
+    def test_not_retryable_status(self):
+        """ Should not retry client errors. """
+        endpoint = self.add_flaky('GET', [404])
+        self.assertRaises(HTTPError, self.toggl.Clients.get)
+        self.assertEqual(endpoint.calls, 1)
+
+    @responses.activate
+    def test_post_opt_in(self):
+        """ Should only retry POST when the policy opts in. """
+        endpoint = self.add_flaky('POST', [503])
+        self.assertRaises(HTTPError, self.toggl.Clients.create, {})
+        self.assertEqual(endpoint.calls, 1)
+        self.assertEqual(self.policy.stats.exhausted, 0)
+
+        self.policy.retry_post = True
+        endpoint.failures = [503]
+        self.assertEqual(self.toggl.Clients.create({}), [])
+        self.assertEqual(endpoint.calls, 3)
+
+    @responses.activate
+    def test_post_unsent(self):
+        """ Should retry a POST only while it never reached the server. """
+        refused = ConnectionError(MaxRetryError(
+            None, '/clients', NewConnectionError(None, 'refused')))
+        endpoint = self.add_flaky('POST', [refused, 429,
+                                           ConnectionError('reset')])
+        self.assertRaises(ConnectionError, self.toggl.Clients.create, {})
+        self.assertEqual(endpoint.calls, 3)
+        self.assertEqual(self.policy.stats.statuses,
+                         {'connection': 1, 429: 1})
+        self.assertEqual(self.policy.stats.exhausted, 0)
+
+    @responses.activate
+    def test_retry_after_cap(self):
+        """ Should not wait out a Retry-After longer than the cap. """
+        responses.add(responses.GET, self.compile_full_url(), status=503,
+                      headers={'Retry-After': '10'})
+        self.assertRaises(HTTPError, self.toggl.Clients.get)
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(self.clock.slept, [])
+        self.assertEqual(self.policy.stats.exhausted, 0)
+
+    def test_jitter(self):
+        """ Should scale the exponential delay by a random factor. """
+        policy = RetryPolicy(backoff_base=2, backoff_cap=5,
+                             random=lambda: 0.5)
+        self.assertEqual([policy.backoff(n) for n in (1, 2, 3)],
+                         [1.0, 2.0, 2.5])
+
+
+class TestDeadline(TestTogglBase):
+    """ Tests request timeouts and deadlines. """
+    focus_class = api.Clients
+
+    def setUp(self):
+        self.clock = FakeClock()
+        cassette = Cassette()
+        cassette.add('GET', api.API_URL + '/clients', body=[])
+        cassette.add('GET', api.API_URL + '/projects/1/project_users',
+                     body=[])
+        self.adapter = ReplayAdapter(cassette)
+        self.toggl = api.Toggl(self.api_token, transport=self.adapter)
+
+    def timeouts(self, call):
+        """ Returns the timeouts the transport was given during a call. """
+        with mock.patch.object(self.adapter, 'send',
+                               wraps=self.adapter.send) as send:
+            call()
+        return [kwargs['timeout'] for _, kwargs in send.call_args_list]
+
+    def test_timeouts(self):
+        """ Should send the client's timeout, or the one of the call. """
+        self.assertEqual(self.timeouts(self.toggl.Clients.get), [(10, 60)])
+        self.assertEqual(
+            self.timeouts(lambda: self.toggl.get('/clients', timeout=2)),
+            [2])
+        self.toggl.timeout = None
+        self.assertEqual(self.timeouts(self.toggl.Clients.get), [None])
+
+    def test_deadline(self):
+        """ Should lower timeouts to the time left, then stop sending. """
+        with Deadline(5, clock=self.clock):
+            with Deadline(30, clock=self.clock):
+                self.assertEqual(self.timeouts(
+                    lambda: self.toggl.ProjectUsers.get_for_project(1)),
+                    [(5, 5)])
+            self.clock.now += 5
+            self.assertRaises(DeadlineExceeded, self.toggl.Clients.get)
+        self.assertEqual(self.adapter.requests, 1)
+        self.assertIsInstance(DeadlineExceeded(), TimeoutError)
+
+    def test_waits_past_deadline(self):
+        """ Should not wait for a token or a retry past the deadline. """
+        limiter = TokenBucket(rate=0.1, clock=self.clock,
+                              sleep=self.clock.sleep)
+        self.toggl.rate_limiter = limiter
+        with Deadline(5, clock=self.clock):
+            self.toggl.Clients.get()
+            self.assertRaises(DeadlineExceeded, self.toggl.Clients.get)
+        self.assertEqual(self.clock.slept, [])
+        self.assertEqual(limiter.delay(), 10)
+
+        self.toggl.rate_limiter = None
+        self.toggl.retry = RetryPolicy(backoff_base=10, jitter=False,
+                                       sleep=self.clock.sleep)
+        self.adapter.throttle_rate = 1
+        with Deadline(5, clock=self.clock):
+            self.assertRaises(DeadlineExceeded, self.toggl.Clients.get)
+        self.assertEqual(self.adapter.requests, 2)
+
+    def test_worker_threads(self):
+        """ Should carry the deadline to calls run on worker threads. """
+        with Deadline(5, clock=self.clock):
+            self.clock.now += 5
+            result = self.toggl.Workspaces.get_many_children(
+                [1, 2, 3], children=['clients'])
+        self.assertEqual(len(result.errors), 3)
+        self.assertTrue(all(isinstance(error, DeadlineExceeded)
+                            for error in result.errors.values()))
+        self.assertEqual(self.adapter.requests, 0)
+
+    def test_coroutines(self):
+        """ Should keep the deadlines of interleaved coroutines apart. """
+        short, long = Deadline(5), Deadline(30)
+        seen = {}
+
+        async def run(limit):
+            with limit:
+                await asyncio.sleep(0)
+                seen[limit] = deadline.current()
+
+        async def main():
+            await asyncio.gather(run(short), run(long))
+
+        asyncio.run(main())
+        self.assertEqual(seen, {short: short, long: long})
+        self.assertIsNone(deadline.current())
+
+    def test_exit_out_of_order(self):
+        """ Should remove the deadline exited, not the last one entered. """
+        first, second = Deadline(5), Deadline(30)
+        first.__enter__()
+        second.__enter__()
+        first.__exit__(None, None, None)
+        self.assertIs(deadline.current(), second)
+        second.__exit__(None, None, None)
+        self.assertIsNone(deadline.current())
+
+
+class TestHooks(TestTogglBase):
+    """ Tests request hooks and the metrics collector. """
+    focus_class = api.Workspaces
+
+    def setUp(self):
+        self.metrics = MetricsCollector(buckets=(0.5, 1.0))
+        self.policy = RetryPolicy(jitter=False, sleep=lambda seconds: None)
+        self.toggl = api.Toggl(self.api_token, retry=self.policy,
+                               hooks=[self.metrics])
+
+    def test_endpoint_template(self):
+        """ Should replace single and comma-separated IDs. """
+        self.assertEqual(endpoint_template('/workspaces/777/projects'),
+                         '/workspaces/{id}/projects')
+        self.assertEqual(endpoint_template('/time_entries/1,2,3'),
+                         '/time_entries/{id}')
+        self.assertEqual(endpoint_template('/me'), '/me')
+
+    @responses.activate
+    def test_metrics(self):
+        """ Should collect latency, bytes, statuses and retries. """
+        url = self.compile_full_url(id=777, child_uri='/projects')
+        responses.add(responses.GET, url, status=503)
+        responses.add(responses.GET, url, body='[]')
+        responses.add(responses.GET, self.compile_full_url(
+            id=778, child_uri='/projects'), body='[{}]')
+        self.toggl.Workspaces.get_projects(777)
+        self.toggl.Workspaces.get_projects(778)
+
+        stats = self.metrics.snapshot()[('GET', '/workspaces/{id}/projects')]
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(stats['statuses'], {200: 2, 503: 1})
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['bytes_in'], 6)
+        self.assertEqual(stats['latency_buckets'][-1], (float('inf'), 3))
+
+        text = self.metrics.to_prometheus()
+        self.assertIn('# TYPE toggl_request_duration_seconds histogram', text)
+        self.assertIn('toggl_request_duration_seconds_bucket{endpoint='
+                      '"/workspaces/{id}/projects",le="+Inf",method="GET"} '
+                      '3', text)
+        self.assertIn('toggl_responses_total{endpoint="/workspaces/{id}/'
+                      'projects",method="GET",status="503"} 1', text)
+
+    @responses.activate
+    def test_hooks(self):
+        """ Should call every hook, and send headers they add. """
+        calls = []
+
+        class Recorder(Hook):
+            def before_request(self, event):
+                event.headers['X-Trace'] = 'abc'
+                calls.append(('before', event.method, event.bytes_out))
+
+            def after_response(self, event, response):
+                calls.append(('after', event.status_code))
+
+            def on_error(self, event, error):
+                calls.append(('error', type(error)))
+
+        self.toggl.hooks.append(Recorder())
+        self.toggl.retry = None
+        url = self.toggl.api_url + api.Clients.uri
+        responses.add(responses.POST, url, body='{}')
+        self.toggl.Clients.create({'client': {'name': 'x'}})
+        self.assertEqual(responses.calls[0].request.headers['X-Trace'], 'abc')
+        responses.add(responses.GET, url, body=ConnectionError('reset'))
+        self.assertRaises(ConnectionError, self.toggl.Clients.get)
+        self.assertEqual(calls, [('before', 'POST', 23), ('after', 200),
+                                 ('before', 'GET', 0),
+                                 ('error', ConnectionError)])
+        stats = self.metrics.snapshot()[('GET', '/clients')]
+        self.assertEqual(stats['errors'], 1)
+
+    @responses.activate
+    def test_opentelemetry_spans(self):
+        """ Should end one span per attempt, with the status. """
+        tracer = mock.Mock()
+        self.toggl.hooks = [OpenTelemetryHook(tracer)]
+        responses.add(responses.GET, self.toggl.api_url + '/me', body='{}')
+        self.toggl.User.get()
+        tracer.start_span.assert_called_once_with(
+            'GET /me', attributes=mock.ANY)
+        span = tracer.start_span.return_value
+        span.set_attribute.assert_any_call('http.status_code', 200)
+        span.end.assert_called_once_with()
+
+
+class TestCoalescing(TestTogglBase):
+    """ Tests coalescing identical GETs in flight. """
+
+    def setUp(self):
+        self.gate = threading.Event()
+        cassette = Cassette()
+        cassette.add('GET', api.API_URL + '/workspaces/7/projects',
+                     body=json.loads(self.get_json('workspace_projects')))
+
+        def hold():
+            self.gate.wait(5)
+            return 0
+
+        self.adapter = ReplayAdapter(cassette, latency=hold)
+        self.toggl = api.Toggl(self.api_token, transport=self.adapter,
+                               coalesce=True)
+
+    def test_coalesces(self):
+        """ Should send one request for identical concurrent GETs. """
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.toggl.Workspaces.get_projects(7))) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for _ in range(500):
+            if self.toggl.single_flight.coalesced == 9:
+                break
+            time.sleep(0.01)
+        self.gate.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.adapter.requests, 1)
+        self.assertEqual(self.toggl.single_flight.as_dict(),
+                         {'calls': 1, 'coalesced': 9})
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[0], results[9])
+        self.assertIsNot(results[0], results[9])
+        # Other URIs, and later calls, are sent.
+        self.assertRaises(HTTPError, self.toggl.Workspaces.get_tags, 7)
+        self.toggl.Workspaces.get_projects(7)
+        self.assertEqual(self.adapter.requests, 3)
+
+    def test_leader_deadline_not_shared(self):
+        """ Should not hand the leader's deadline error to other callers. """
+        def latency():
+            if self.adapter.requests > 1:
+                return 0
+            for _ in range(500):
+                if self.toggl.single_flight.coalesced:
+                    break
+                time.sleep(0.01)
+            time.sleep(0.06)
+            raise requests.ReadTimeout('Read timed out.')
+
+        self.adapter.latency = latency
+        errors = []
+
+        def leader():
+            try:
+                with Deadline(0.05):
+                    self.toggl.Workspaces.get_projects(7)
+            except DeadlineExceeded as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=leader)
+        thread.start()
+        for _ in range(500):
+            if self.adapter.requests:
+                break
+            time.sleep(0.01)
+        projects = self.toggl.Workspaces.get_projects(7)
+        thread.join()
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(projects, json.loads(
+            self.get_json('workspace_projects')))
+        self.assertEqual(self.adapter.requests, 2)
+        self.assertEqual(self.toggl.single_flight.calls, 2)
+
+
+class TestTransport(TestTogglBase):
+    """ Tests recording and replaying traffic through a custom transport. """
+    focus_class = api.Clients
+
+    @responses.activate
+    def test_record_and_replay(self):
+        """ Should replay recorded responses, whatever the query order. """
+        cassette = Cassette()
+        recorder = api.Toggl(self.api_token,
+                             transport=RecordingAdapter(cassette))
+        self.responses_add('GET', filename='client_get', id=1239455)
+        responses.add(responses.GET, self.toggl.api_url + '/time_entries',
+                      body='[{"id": 1}]', headers={'Set-Cookie': 'x'})
+        client = recorder.Clients.get(id=1239455)
+        recorder.TimeEntries.get(start_date='2016-03-01T00:00:00Z',
+                                 end_date='2016-03-02T00:00:00Z')
+        self.assertEqual(len(cassette), 2)
+        self.assertNotIn('Set-Cookie', cassette.interactions[1]['headers'])
+
+        path = os.path.join(tempfile.mkdtemp(), 'cassette.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        cassette.save(path)
+        responses.reset()
+
+        toggl = api.Toggl(self.api_token,
+                          transport=ReplayAdapter(Cassette.load(path)))
+        self.assertEqual(toggl.Clients.get(id=1239455), client)
+        self.assertEqual(toggl.get('/time_entries', params={
+            'end_date': '2016-03-02T00:00:00Z',
+            'start_date': '2016-03-01T00:00:00Z'}), [{'id': 1}])
+        self.assertRaises(HTTPError, toggl.Clients.get)
+
+    def test_replay_options(self):
+        """ Should scale payloads, add latency and inject 429s. """
+        clock = FakeClock()
+        cassette = Cassette()
+        cassette.add('GET', self.toggl.api_url + '/clients',
+                     body=[{'id': 1}, {'id': 2}])
+        adapter = ReplayAdapter(cassette, latency=0.03, throttle_rate=0.5,
+                                retry_after=2, scale=3, seed=1,
+                                sleep=clock.sleep)
+        limiter = TokenBucket(rate=10, burst=10, clock=clock,
+                              sleep=clock.sleep)
+        toggl = api.Toggl(self.api_token, transport=adapter,
+                          rate_limiter=limiter)
+        ids = [client['id'] for client in toggl.Clients.get()]
+        self.assertEqual(ids, [1, 2, 1000000001, 1000000002, 2000000001,
+                               2000000002])
+        for _ in range(10):
+            toggl.Clients.get()
+        self.assertGreater(adapter.throttled, 0)
+        self.assertEqual(adapter.requests, 11 + adapter.throttled)
+        self.assertEqual(clock.slept.count(0.03), adapter.requests)
+        self.assertGreaterEqual(sum(clock.slept),
+                                2 * adapter.throttled)
+
+    def test_replay_stream(self):
+        """ Should stream replayed bodies. """
+        cassette = Cassette()
+        cassette.add('GET', self.toggl.api_url + '/me?with_related_data=True',
+                     body=json.loads(self.get_json(
+                         'user_get_with_related_data')))
+        toggl = api.Toggl(self.api_token,
+                          transport=ReplayAdapter(cassette, scale=2))
+        entries = list(toggl.User.stream_related('time_entries'))
+        self.assertEqual(len(entries), 2 * len(json.loads(self.get_json(
+            'user_get_with_related_data'))['data']['time_entries']))
+
+
+class TestSimulator(unittest.TestCase):
+    """ Tests the client against the in-process API simulator. """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.clock.now = 1500000000.0
+        self.simulator = TogglSimulator(tokens=[FAKE_TOKEN], rate=None,
+                                        clock=self.clock)
+        self.simulator.generate(time_entries=2500, days=30, seed=3)
+        self.toggl = api.Toggl(FAKE_TOKEN,
+                               transport=WSGIAdapter(self.simulator))
+
+    def test_generate(self):
+        """ Should build the same account for the same seed. """
+        other = TogglSimulator(clock=self.clock)
+        other.generate(time_entries=2500, days=30, seed=3)
+        self.assertEqual(other.objects('time_entries'),
+                         self.simulator.objects('time_entries'))
+        self.assertEqual(len(self.toggl.Clients.get()), 10)
+
+    def test_crud(self):
+        """ Should create, read, update, delete and track time entries. """
+        wid = self.toggl.User.get()['data']['default_wid']
+        client = self.toggl.Clients.create({'client': {'name': 'Acme'}})
+        cid = client['data']['id']
+        project = self.toggl.Projects.create(
+            {'project': {'name': 'Site', 'cid': cid}})['data']
+        self.assertEqual(self.toggl.Clients.get_projects(cid), [project])
+        self.assertIn(project, self.toggl.Workspaces.get_projects(wid))
+        self.toggl.Clients.update(id=cid,
+                                  data={'client': {'name': 'Acme Inc'}})
+        self.assertEqual(self.toggl.Clients.get(cid)['data']['name'],
+                         'Acme Inc')
+        self.toggl.Clients.delete(cid)
+        self.assertRaises(HTTPError, self.toggl.Clients.get, cid)
+        self.assertRaises(HTTPError, self.toggl.Tags.create, {'tag': {}})
+
+        entry = self.toggl.TimeEntries.start(
+            {'time_entry': {'description': 'Writing'}})['data']
+        self.assertEqual(self.toggl.TimeEntries.get_current()['data'], entry)
+        self.clock.now += 90
+        stopped = self.toggl.TimeEntries.stop(entry['id'])['data']
+        self.assertEqual(stopped['duration'], 90)
+        self.assertIsNone(self.toggl.TimeEntries.get_current()['data'])
+
+        bad = api.Toggl('bad_token', transport=WSGIAdapter(self.simulator))
+        self.assertRaises(AuthError, bad.Clients.get)
+
+    def test_truncation(self):
+        """ Should cut ranges off at 1000 entries, like Toggl. """
+        start = datetime.fromtimestamp(self.clock.now - 31 * 86400,
+                                       timezone.utc)
+        end = datetime.fromtimestamp(self.clock.now, timezone.utc)
+        self.assertEqual(len(self.toggl.TimeEntries.get(
+            start_date=start.isoformat(), end_date=end.isoformat())), 1000)
+        entries = list(self.toggl.TimeEntries.iter_range(
+            start, end, window=timedelta(days=31)))
+        self.assertEqual(len(entries), 2500)
+
+    def test_throttling(self):
+        """ Should answer 429 per token, which the client waits out. """
+        self.simulator.rate = 1
+        self.simulator.burst = 2
+        other = api.Toggl('other_token',
+                          transport=WSGIAdapter(self.simulator))
+        self.simulator.tokens.add('other_token')
+        limiter = TokenBucket(rate=100, burst=100, clock=self.clock,
+                              sleep=self.clock.sleep)
+        self.toggl.rate_limiter = limiter
+        for _ in range(5):
+            self.toggl.Clients.get()
+        other.Clients.get()
+        other.Clients.get()
+        self.assertEqual(self.simulator.throttled, 3)
+        self.assertRaises(HTTPError, other.Clients.get)
+        self.assertEqual(self.simulator.throttled, 4)
+
+    def test_sync(self):
+        """ Should report changes and deletions since the last sync. """
+        engine = SyncEngine(self.toggl)
+        self.clock.now += 10
+        engine.sync()
+        self.assertEqual(len(engine.objects('time_entries')), 2500)
+        entry_id = next(iter(engine.objects('time_entries')))
+        self.clock.now += 10
+        self.toggl.TimeEntries.delete(entry_id)
+        self.toggl.Tags.create({'tag': {'name': 'new'}})
+        changes = engine.sync()
+        self.assertEqual(changes['time_entries'],
+                         {'updated': 0, 'deleted': 1})
+        self.assertEqual(changes['tags'], {'updated': 1, 'deleted': 0})
+
+
+class TestThreadSafety(unittest.TestCase):
+    """ Tests one client shared by many threads. """
+    threads = 16
+    rounds = 10
+
+    def setUp(self):
+        self.simulator = TogglSimulator(tokens=[FAKE_TOKEN], rate=None)
+        self.simulator.generate(time_entries=10, seed=0)
+        self.server = self.simulator.serve()
+        self.metrics = MetricsCollector()
+        self.toggl = api.Toggl(
+            FAKE_TOKEN,
+            base_url='http://127.0.0.1:{}/api'.format(
+                self.server.server_port),
+            pool_maxsize=self.threads, retry=RetryPolicy(),
+            cache=ResponseCache(), hooks=[self.metrics])
+
+    def tearDown(self):
+        self.toggl.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def work(self, worker, failures):
+        clients = self.toggl.Clients
+        try:
+            for round_ in range(self.rounds):
+                name = 'worker-{}-{}'.format(worker, round_)
+                cid = clients.create({'client': {'name': name}})['data']['id']
+                self.assertEqual(clients.get(cid)['data']['name'], name)
+                clients.update(id=cid,
+                               data={'client': {'name': name + '-renamed'}})
+                self.assertEqual(clients.get(cid)['data']['name'],
+                                 name + '-renamed')
+                self.assertIn(name + '-renamed',
+                              [client['name'] for client in clients.get()])
+                clients.delete(cid)
+                self.assertRaises(HTTPError, clients.get, cid)
+        except Exception as error:
+            failures.append(error)
+
+    def test_mixed_workload(self):
+        """ Should not mix up responses, serve stale data or lose counts. """
+        initial = len(self.simulator.objects('clients'))
+        failures = []
+        workers = [threading.Thread(target=self.work, args=(worker, failures))
+                   for worker in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(failures, [])
+        self.assertEqual(len(self.simulator.objects('clients')), initial)
+
+        sent = self.simulator.requests
+        calls = self.threads * self.rounds
+        # Every call but the client list misses the cache.
+        self.assertTrue(6 * calls <= sent <= 7 * calls)
+        self.assertEqual(self.toggl.retry.stats.requests, sent)
+        self.assertEqual(self.toggl.retry.stats.retries, 0)
+        self.assertEqual(sum(stats['count'] for stats in
+                             self.metrics.snapshot().values()), sent)
+        self.assertEqual(len(self.toggl.session.cookies), 0)
+
+
+class TestTogglPool(unittest.TestCase):
+    """ Tests running many tokens over one connection pool. """
+    tokens = ['token_a', 'token_b', 'token_c']
+
+    def setUp(self):
+        self.simulator = TogglSimulator(tokens=self.tokens, rate=None)
+        self.simulator.generate(time_entries=10, seed=0)
+        self.pool = TogglPool(self.tokens + ['bad_token'], rate=1000,
+                              transport=WSGIAdapter(self.simulator))
+
+    def test_map(self):
+        """ Should call every token's client, with its own token. """
+        result = self.pool.map(lambda toggl: toggl.User.get()['data']['id'])
+        self.assertEqual(sorted(result.results), self.tokens)
+        self.assertIsInstance(result.errors['bad_token'], AuthError)
+        self.assertIs(self.pool['token_a'].session,
+                      self.pool['token_b'].session)
+        self.assertEqual(self.pool.max_workers, 4)
+        self.assertIsNot(self.pool['token_a'].rate_limiter,
+                         self.pool['token_b'].rate_limiter)
+        self.pool['token_a'].close()
+        self.assertEqual(len(self.pool['token_b'].Clients.get()), 10)
+
+    def test_run_takes_turns(self):
+        """ Should interleave the calls of different tokens. """
+        order = []
+
+        def call(toggl):
+            order.append(toggl.api_token)
+            return toggl.User.get()
+
+        jobs = [(('token_a', i), 'token_a', call) for i in range(3)]
+        jobs += [((token, 0), token, call) for token in self.tokens[1:]]
+        result = self.pool.run(jobs, max_workers=1)
+        self.assertEqual(len(result.results), 5)
+        self.assertEqual(order, ['token_a', 'token_b', 'token_c',
+                                 'token_a', 'token_a'])
+        self.assertRaises(KeyError, self.pool.run,
+                          [(1, 'unknown', call)])
+
+
+class TestWatcher(unittest.TestCase):
+    """ Tests watching running time entries against the simulator. """
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.clock.now = 1500000000.0
+        self.simulators = dict(
+            (name, TogglSimulator(rate=None, clock=self.clock))
+            for name in ('ann', 'bob'))
+        self.clients = dict(
+            (name, api.Toggl(FAKE_TOKEN,
+                             transport=WSGIAdapter(simulator)))
+            for name, simulator in self.simulators.items())
+        self.changes = []
+        self.watcher = Watcher(self.clients, on_change=self.changes.append,
+                               min_interval=5, max_interval=40,
+                               clock=self.clock)
+
+    def elsewhere(self, name):
+        """ Returns a client of the user that the watcher doesn't hook. """
+        return api.Toggl(FAKE_TOKEN,
+                         transport=WSGIAdapter(self.simulators[name]))
+
+    def test_adaptive_interval(self):
+        """ Should widen the interval until the running entry changes. """
+        delays = []
+        for _ in range(5):
+            self.watcher.poll()
+            delays.append(self.watcher.delay())
+            self.clock.now += delays[-1]
+        self.assertEqual(delays, [10, 20, 40, 40, 40])
+        self.assertEqual(self.watcher.polls, 10)
+        self.assertEqual(self.changes, [])
+
+        entry = self.elsewhere('ann').TimeEntries.start(
+            {'time_entry': {'description': 'Writing'}})['data']
+        self.clock.now += 40
+        changes = self.watcher.poll()
+        self.assertEqual([change.key for change in changes], ['ann'])
+        self.assertTrue(changes[0].started)
+        self.assertFalse(changes[0].stopped)
+        self.assertEqual(changes[0].current, entry)
+        self.assertEqual(self.changes, changes)
+        self.assertEqual(self.watcher.running(), {'ann': entry})
+        self.assertEqual(self.watcher.delay(), 5)
+
+        # The running time is derived locally, without polling.
+        self.clock.now += 3
+        self.assertEqual(self.watcher.elapsed('ann'), 43)
+        self.assertIsNone(self.watcher.elapsed('bob'))
+        self.assertEqual(watcher.elapsed(entry, self.clock.now), 43)
+        self.assertEqual(self.watcher.polls, 12)
+
+    def test_hooks_replaced(self):
+        """ Should swap in new hook lists rather than change shared ones. """
+        toggl = self.clients['ann']
+        hooks = toggl.hooks
+        self.watcher.remove('ann')
+        self.assertEqual(toggl.hooks, [])
+        self.assertEqual(len(hooks), 1)
+        hooks = toggl.hooks
+        self.watcher.add('ann', toggl)
+        self.assertEqual(hooks, [])
+        self.assertEqual(len(toggl.hooks), 1)
+
+    def test_writes_expedite(self):
+        """ Should poll straight after a start or stop through a client. """
+        self.watcher.poll()
+        self.clock.now += 1
+        toggl = self.clients['bob']
+        entry = toggl.TimeEntries.start(
+            {'time_entry': {'description': 'Review'}})['data']
+        self.assertEqual(self.watcher.delay(), 0)
+        changes = self.watcher.poll()
+        self.assertEqual([change.key for change in changes], ['bob'])
+        self.assertEqual(self.watcher.polls, 3)
+
+        self.clock.now += 2
+        toggl.TimeEntries.stop(entry['id'])
+        change, = self.watcher.poll()
+        self.assertTrue(change.stopped)
+        self.assertIsNone(change.current)
+        self.assertEqual(self.watcher.running(), {})
+
+        self.watcher.remove('bob')
+        self.assertEqual(toggl.hooks, [])
+        toggl.TimeEntries.start({'time_entry': {'description': 'Review'}})
+        self.assertEqual(self.watcher.delay(), 7)
+
+    def test_run(self):
+        """ Should wake up to poll as soon as a client writes an entry. """
+        self.watcher.remove('bob')
+        self.watcher.on_change = lambda change: self.watcher.stop()
+        thread = threading.Thread(target=self.watcher.run)
+        thread.start()
+        for _ in range(500):
+            if self.watcher.polls:
+                break
+            time.sleep(0.01)
+        # The next poll is due in 10 seconds; the write brings it forward.
+        self.clients['ann'].TimeEntries.start(
+            {'time_entry': {'description': 'Writing'}})
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.watcher.polls, 2)
+        self.assertEqual(self.watcher.running()['ann']['description'],
+                         'Writing')
+
+    def test_changes(self):
+        """ Should yield changes, waking up when a client writes. """
+        toggl = self.clients['ann']
+        self.watcher.remove('bob')
+
+        async def first_change():
+            loop = asyncio.get_event_loop()
+            changes = self.watcher.changes()
+            change = asyncio.ensure_future(changes.__anext__())
+            while not self.watcher.polls:
+                await asyncio.sleep(0.01)
+            await loop.run_in_executor(None, toggl.TimeEntries.start,
+                                       {'time_entry': {'description': 'a'}})
+            change = await asyncio.wait_for(change, 5)
+            await changes.aclose()
+            return change
+        change = asyncio.run(first_change())
+        self.assertEqual(change.current['description'], 'a')
+        self.assertEqual(self.watcher.polls, 2)
+        self.assertEqual(self.watcher._async_wakeups, [])
+
+
+@unittest.skipIf(httpx is None, 'httpx is not installed')
+class TestAsyncToggl(TestTogglBase):
+    """ Tests the asyncio client against a mocked httpx transport. """
+
+    def setUp(self):
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handler(self, request):
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        path = request.url.path
+        if path.endswith('/me'):
+            return httpx.Response(403)
+        if path.endswith('/time_entries'):
+            return httpx.Response(404, json=json.loads(
+                self.get_json('failed_request')))
+        if request.method == 'DELETE':
+            return httpx.Response(200)
+        if path.endswith('/projects'):
+            return httpx.Response(200,
+                                  text=self.get_json('workspace_projects'))
+        return httpx.Response(200, text=self.get_json('client_get'))
+
+    def run_with_toggl(self, coroutine_function, **kwargs):
+        async def runner():
+            transport = httpx.MockTransport(self.handler)
+            async with AsyncToggl(self.api_token, transport=transport,
+                                  **kwargs) as toggl:
+                return await coroutine_function(toggl)
+        return asyncio.run(runner())
+
+    def test_resources(self):
+        """ Should reuse the resource URIs and decode the JSON. """
+        async def calls(toggl):
+            return await asyncio.gather(
+                toggl.Clients.get(id=1239455),
+                toggl.Workspaces.get_projects(777),
+                toggl.Tags.delete(5))
+        client, projects, deleted = self.run_with_toggl(calls)
+        self.assertEqual(type(client), dict)
+        self.assertEqual(type(projects), list)
+        self.assertEqual(deleted.status_code, 200)
+        paths = sorted(request.url.path for request in self.requests)
+        self.assertEqual(paths, ['/api/v8/clients/1239455', '/api/v8/tags/5',
+                                 '/api/v8/workspaces/777/projects'])
+        self.assertTrue(all(request.headers['Authorization'].startswith(
+            'Basic ') for request in self.requests))
+
+    def test_hooks(self):
+        """ Should report every attempt to the hooks, queued time included. """
+        metrics = MetricsCollector()
+
+        async def calls(toggl):
+            await asyncio.gather(*[toggl.Workspaces.get_projects(wid)
+                                   for wid in range(1, 5)])
+        self.run_with_toggl(calls, max_concurrency=1, hooks=[metrics])
+        stats = metrics.snapshot()[('GET', '/workspaces/{id}/projects')]
+        self.assertEqual(stats['count'], 4)
+        self.assertEqual(stats['statuses'], {200: 4})
+        self.assertGreater(stats['queued_seconds'], 0.03)
+
+    def test_concurrency_limit(self):
+        """ Should never have more requests in flight than allowed. """
+        async def calls(toggl):
+            return await asyncio.gather(
+                *[toggl.Workspaces.get_projects(wid) for wid in range(20)])
+        results = self.run_with_toggl(calls, max_concurrency=4)
+        self.assertEqual(len(results), 20)
+        self.assertEqual(self.max_in_flight, 4)
+
+    def test_built_outside_loop(self):
+        """ Should work in a loop started after the client was built. """
+        toggl = AsyncToggl(self.api_token,
+                           transport=httpx.MockTransport(self.handler))
+        self.assertIsNone(toggl._semaphore)
+
+        async def calls():
+            try:
+                return await toggl.Clients.get(id=1239455)
+            finally:
+                await toggl.aclose()
+        self.assertEqual(asyncio.run(calls()),
+                         json.loads(self.get_json('client_get')))
+
+    def test_codec(self):
+        """ Should encode and decode bodies with the client's codec. """
+        calls = []
+
+        def dumps(data):
+            calls.append('dumps')
+            return json.dumps(data).encode('utf-8')
+
+        def loads(body):
+            calls.append('loads')
+            return json.loads(body)
+
+        codec = Codec('test', dumps, loads)
+        self.run_with_toggl(
+            lambda toggl: toggl.Clients.update(1239455, data={'client': {}}),
+            codec=codec)
+        self.assertEqual(calls, ['dumps', 'loads'])
+        self.assertEqual(self.requests[0].content, b'{"client": {}}')
+
+    def test_coalescing(self):
+        """ Should await one request for identical concurrent GETs. """
+        async def calls(toggl):
+            results = await asyncio.gather(
+                *[toggl.Workspaces.get_projects(7) for _ in range(5)])
+            return results, toggl.single_flight.as_dict()
+        results, counters = self.run_with_toggl(calls, coalesce=True)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(counters, {'calls': 1, 'coalesced': 4})
+        self.assertEqual(results[0], results[4])
+        self.assertIsNot(results[0], results[4])
+
+    def test_blocking_helpers(self):
+        """ Should refuse the thread pool helpers instead of misbehaving. """
+        toggl = AsyncToggl(self.api_token)
+        calls = [
+            lambda: toggl.Workspaces.get_many_children([1, 2]),
+            lambda: toggl.Tasks.bulk_delete([1, 2]),
+            lambda: toggl.Tasks.bulk_update([1, 2], {}),
+            lambda: toggl.Tags.bulk_create([{'tag': {'name': 'a'}}]),
+            lambda: toggl.TimeEntries.iter_range('2020-01-01T00:00:00Z',
+                                                 '2020-02-01T00:00:00Z'),
+        ]
+        for call in calls:
+            self.assertRaises(TypeError, call)
+        self.assertEqual(self.requests, [])
+
+    def test_errors(self):
+        """ Should raise AuthError and HTTPError like the sync client. """
+        self.assertRaises(AuthError, self.run_with_toggl,
+                          lambda toggl: toggl.User.get())
+        try:
+            self.run_with_toggl(lambda toggl: toggl.TimeEntries.create({}))
+        except HTTPError as e:
+            self.assertEqual(e.response.status_code, 404)
+            self.assertEqual(e.response.reason,
+                             json.loads(self.get_json('failed_request')))
+        else:
+            raise Exception('HTTPError was not raised.')
+
+    def test_deadline(self):
+        """ Should lower timeouts to the time left, then stop sending. """
+        clock = FakeClock()
+
+        async def calls(toggl):
+            with Deadline(2, clock=clock):
+                await toggl.Clients.get(id=1239455)
+                clock.now += 2
+                await toggl.Clients.get(id=1239455)
+
+        self.assertRaises(DeadlineExceeded, self.run_with_toggl, calls)
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.requests[0].extensions['timeout'],
+                         {'connect': 2, 'read': 2, 'write': 2, 'pool': 2})
+
+    def test_retry_after(self):
+        """ Should read Retry-After from httpx responses, dates included. """
+        self.assertEqual(parse_retry_after(
+            httpx.Response(429, headers={'Retry-After': '7'})), 7.0)
+        date_header = formatdate(time.time() + 60, usegmt=True)
+        wait = parse_retry_after(
+            httpx.Response(429, headers={'Retry-After': date_header}))
+        self.assertTrue(55 < wait <= 60)
+
+
+class TestReports(TestTogglBase):
+    """ Tests the Reports API client. """
+
+    def add_details(self, total_count=120, per_page=50):
+        """ Answers detailed reports with generated, numbered rows. """
+        def callback(request):
+            query = dict((key, values[0]) for key, values in
+                         parse_qs(urlparse(request.url).query).items())
+            page = int(query['page'])
+            first = (page - 1) * per_page
+            rows = [{'id': index, 'wid': int(query['workspace_id']),
+                     'since': query.get('since')}
+                    for index in range(first,
+                                       min(total_count, first + per_page))]
+            return (200, {}, json.dumps({
+                'total_count': total_count, 'per_page': per_page,
+                'data': rows}))
+
+        responses.add_callback(responses.GET,
+                               self.toggl.reports_url + '/details',
+                               callback=callback)
+
+    @responses.activate
+    def test_details(self):
+        """ Should fetch every page, and yield the rows in page order. """
+        self.add_details()
+        rows = list(self.toggl.Reports.details(777, since='2016-03-01',
+                                               until=date(2016, 3, 7)))
+        self.assertEqual([row['id'] for row in rows], list(range(120)))
+        self.assertEqual(len(responses.calls), 3)
+        query = parse_qs(urlparse(responses.calls[0].request.url).query)
+        self.assertEqual(query['user_agent'], ['togglwrapper'])
+        self.assertEqual(query['until'], ['2016-03-07'])
+        self.assertTrue(responses.calls[0].request.url.startswith(
+            'https://api.track.toggl.com/reports/api/v2/details?'))
+
+    @responses.activate
+    def test_details_str_id(self):
+        """ Should take a workspace ID given as a string as a single one. """
+        self.add_details(total_count=10)
+        rows = list(self.toggl.Reports.details('777'))
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(set(row['wid'] for row in rows), {777})
+
+    @responses.activate
+    def test_split(self):
+        """ Should split by workspace and date, keeping their order. """
+        self.add_details(total_count=60)
+        rows = list(self.toggl.Reports.details(
+            [1, 2], since='2016-03-01', until='2016-03-10', split_days=4,
+            max_workers=4))
+        self.assertEqual(len(responses.calls), 12)
+        self.assertEqual(len(rows), 360)
+        self.assertEqual(
+            [(row['wid'], row['since']) for row in rows[::60]],
+            [(wid, since) for wid in (1, 2) for since in
+             ('2016-03-01', '2016-03-05', '2016-03-09')])
+        self.assertEqual(split_dates('2016-03-01', '2016-03-01', 7),
+                         [(date(2016, 3, 1), date(2016, 3, 1))])
+        self.assertRaises(ValueError, next,
+                          self.toggl.Reports.details(1, split_days=7))
+
+    @responses.activate
+    def test_summary(self):
+        """ Should GET a summary report with the client's token. """
+        responses.add(responses.GET, self.toggl.reports_url + '/summary',
+                      body='{"total_grand": 3600000, "data": []}')
+        report = self.toggl.Reports.summary(777, grouping='clients')
+        self.assertEqual(report['total_grand'], 3600000)
+        request = responses.calls[0].request
+        self.assertIn('grouping=clients', request.url)
+        self.assertIn('Authorization', request.headers)
+
+
+class TestResponseCache(TestTogglBase):
+    """ Tests caching of GET responses. """
+    focus_class = api.Workspaces
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResponseCache(ttl=10, ttls={'/workspaces': 60},
+                                   clock=self.clock)
+        self.toggl = api.Toggl(self.api_token, cache=self.cache)
+
+    @responses.activate
+    def test_fresh_hit(self):
+        """ Should answer repeated GETs from the cache until they expire. """
+        self.responses_add('GET', 'workspace_projects', id=7,
+                           child_uri='/projects')
+        first = self.toggl.Workspaces.get_projects(7)
+        first.append('mutated by the caller')
+        self.clock.now += 59
+        self.assertEqual(self.toggl.Workspaces.get_projects(7),
+                         json.loads(self.get_json('workspace_projects')))
+        self.assertEqual(len(responses.calls), 1)
+        self.clock.now += 2
+        self.toggl.Workspaces.get_projects(7)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_revalidation(self):
+        """ Should revalidate a stale entry with its ETag. """
+        url = self.compile_full_url(id=7, child_uri='/tags')
+        responses.add(responses.GET, url, body=self.get_json('workspace_tags'),
+                      headers={'ETag': '"v1"'})
+        responses.add(responses.GET, url, status=304)
+        expected = self.toggl.Workspaces.get_tags(7)
+        self.clock.now += 61
+        self.assertEqual(self.toggl.Workspaces.get_tags(7), expected)
+        self.assertEqual(responses.calls[1].request.headers['If-None-Match'],
+                         '"v1"')
+        # The 304 made the entry fresh again.
+        self.toggl.Workspaces.get_tags(7)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_params_and_ttls(self):
+        """ Should key on params, and use the TTL of the longest prefix. """
+        self.cache.ttls['/clients'] = 0
+        url = self.toggl.api_url + '/clients/5/projects'
+        responses.add(responses.GET, url, body='[]')
+        self.toggl.Clients.get_projects(5, active=True)
+        self.toggl.Clients.get_projects(5, active=True)
+        self.assertEqual(len(responses.calls), 2)
+        self.assertEqual(self.cache.ttl_for('/workspaces/1/tags'), 60)
+        self.assertEqual(self.cache.ttl_for('/me'), 10)
+        self.assertNotEqual(ResponseCache.key('/x', {'a': 1}),
+                            ResponseCache.key('/x', {'a': 2}))
+        self.assertEqual(ResponseCache.key('/x', {'a': None}), '/x')
+
+    @responses.activate
+    def test_invalidation(self):
+        """ Should drop the touched resource's entries after a change. """
+        self.responses_add('GET', 'workspace_clients', id=7,
+                           child_uri='/clients')
+        self.responses_add('GET', 'workspace_tags', id=7, child_uri='/tags')
+        responses.add(responses.POST, self.toggl.api_url + '/clients',
+                      body=self.get_json('client_create'))
+        self.toggl.Workspaces.get_clients(7)
+        self.toggl.Workspaces.get_tags(7)
+        self.toggl.Clients.create({'client': {'name': 'New', 'wid': 7}})
+        self.toggl.Workspaces.get_clients(7)
+        self.toggl.Workspaces.get_tags(7)
+        self.assertEqual([call.request.method for call in responses.calls],
+                         ['GET', 'GET', 'POST', 'GET'])
+
+    def test_invalidated_in_flight(self):
+        """ Should not store a GET that raced with a change. """
+        response = mock.Mock(headers={})
+        generation = self.cache.generation('/workspaces/7/clients')
+        self.cache.invalidate('/clients/5')
+        self.cache.store('/workspaces/7/clients', None, [], response,
+                         generation)
+        self.assertIsNone(self.cache.lookup('/workspaces/7/clients'))
+        self.cache.store('/workspaces/7/tags', None, [], response,
+                         generation)
+        self.assertIsNotNone(self.cache.lookup('/workspaces/7/tags'))
+
+    def test_memory_lru(self):
+        """ Should evict the least recently used entry. """
+        backend = MemoryCache(maxsize=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertEqual(sorted(backend.keys()), ['a', 'c'])
+
+    @responses.activate
+    def test_sqlite_backend(self):
+        """ Should persist entries across SQLiteCache instances. """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'cache.sqlite')
+        self.responses_add('GET', 'workspace_tags', id=7, child_uri='/tags')
+        for _ in range(2):
+            backend = SQLiteCache(path)
+            cache = ResponseCache(backend, clock=self.clock)
+            toggl = api.Toggl(self.api_token, cache=cache)
+            toggl.Workspaces.get_tags(7)
+            backend.close()
+        self.assertEqual(len(responses.calls), 1)
+
+
+class TestCodec(TestTogglBase):
+    """ Tests the pluggable JSON codecs. """
+
+    def test_codecs(self):
+        """ Should encode to and decode from bytes alike with any codec. """
+        payload = json.loads(self.get_json('user_get_with_related_data'))
+        payload['data']['fullname'] = u'J\u00fcrgen \u2603'
+        stdlib = get_codec('json')
+        codecs = [stdlib]
+        try:
+            codecs.append(get_codec('orjson'))
+        except ImportError:
+            pass
+        for codec in codecs:
+            encoded = codec.dumps(payload)
+            self.assertIsInstance(encoded, bytes)
+            self.assertEqual(stdlib.loads(encoded), payload)
+            self.assertEqual(codec.loads(stdlib.dumps(payload)), payload)
+            self.assertRaises(ValueError, codec.loads, b'{')
+        self.assertIn(get_codec().name, ('orjson', 'ujson', 'simdjson',
+                                         'json'))
+        custom = Codec('custom', stdlib.dumps, stdlib.loads)
+        self.assertIs(get_codec(custom), custom)
+        self.assertRaises(ValueError, get_codec, 'yaml')
+
+    @responses.activate
+    def test_client_codec(self):
+        """ Should send and read bodies through the client's codec. """
+        toggl = api.Toggl(self.api_token, codec='json')
+        url = toggl.api_url + api.Clients.uri
+        responses.add(responses.POST, url, body=self.get_json('client_create'))
+        created = toggl.Clients.create({'client': {'name': u'Caf\u00e9'}})
+        self.assertEqual(created, json.loads(self.get_json('client_create')))
+        self.assertEqual(responses.calls[0].request.body,
+                         u'{"client":{"name":"Caf\u00e9"}}'.encode('utf-8'))
+
+
+class TestStreaming(TestTogglBase):
+    """ Tests incremental parsing of large responses. """
+    focus_class = api.User
+
+    def chunked(self, body, size):
+        body = body.encode('utf-8')
+        return [body[i:i + size] for i in range(0, len(body), size)]
+
+    def test_iter_items(self):
+        """ Should yield the same elements whatever the chunk boundaries. """
+        document = json.loads(self.get_json('user_get_with_related_data'))
+        entries = document['data']['time_entries'] * 3 + [
+            1, 2.5, -3e10, 'a "quoted" ] string', None, True,
+            {'nested': [1, {'brace': '}'}]}, u'caf\xe9']
+        document['data']['time_entries'] = entries
+        body = json.dumps(document, ensure_ascii=False)
+        for size in (1, 2, 3, 7, 1024):
+            chunks = self.chunked(body, size)
+            self.assertEqual(
+                list(iter_items(chunks, 'data.time_entries')), entries)
+            self.assertEqual(list(iter_items(chunks, 'data.tags')),
+                             document['data']['tags'])
+            self.assertEqual(list(iter_items(chunks, 'data.missing')), [])
+        self.assertEqual(list(iter_items(['[1,', '22', ',3', '33]'])),
+                         [1, 22, 333])
+
+    def test_resumes_scan(self):
+        """ Should decode an element split across pieces only once. """
+        parser = ItemParser()
+        parser._decoder = mock.Mock(wraps=json.JSONDecoder())
+        element = json.dumps({'tags': ['a]'] * 50, 'nested': [{'id': 1}]})
+        items = []
+        for char in '[' + element + ']':
+            items.extend(parser.feed(char))
+        self.assertEqual(items, [json.loads(element)])
+        self.assertEqual(parser._decoder.raw_decode.call_count, 1)
+
+    def test_invalid(self):
+        """ Should raise on a truncated document. """
+        self.assertRaises(ValueError, list, iter_items(['[{"id": 1}, {"i']))
+
+    @responses.activate
+    def test_stream_related(self):
+        """ Should stream one related data collection of the User. """
+        self.responses_add('GET', filename='user_get_with_related_data')
+        projects = list(self.toggl.User.stream_related('projects', since=5))
+        document = json.loads(self.get_json('user_get_with_related_data'))
+        self.assertEqual(projects, document['data']['projects'])
+        url = responses.calls[0].request.url
+        self.assertIn('with_related_data=True', url)
+        self.assertIn('since=5', url)
+
+    @responses.activate
+    def test_stream_time_entries(self):
+        """ Should stream a top-level array of TimeEntries. """
+        url = self.toggl.api_url + api.TimeEntries.uri
+        responses.add(responses.GET, url,
+                      body=self.get_json('time_entries_get_in_range'))
+        entries = list(self.toggl.TimeEntries.stream(
+            start_date='2013-03-10T15:42:46+02:00'))
+        expected = json.loads(self.get_json('time_entries_get_in_range'))
+        self.assertEqual(entries, expected)
+
+    @responses.activate
+    def test_stream_retry_closes(self):
+        """ Should close a streamed response before re-sending. """
+        url = self.toggl.api_url + api.TimeEntries.uri
+        responses.add(responses.GET, url, status=503)
+        responses.add(responses.GET, url, body='[{"id": 1}]')
+        self.toggl.retry = RetryPolicy(jitter=False, sleep=lambda _: None)
+        with mock.patch.object(requests.Response, 'close',
+                               autospec=True) as close:
+            self.assertEqual(list(self.toggl.TimeEntries.stream()),
+                             [{'id': 1}])
+        self.assertEqual([call[0][0].status_code
+                          for call in close.call_args_list], [503, 200])
+
+
+class TestModels(TestTogglBase):
+    """ Tests decoding responses into slotted models. """
+    focus_class = api.TimeEntries
+
+    def setUp(self):
+        self.toggl = api.Toggl(self.api_token, models=True)
+
+    def test_slots(self):
+        """ Should not give instances a __dict__, and keep unknown keys. """
+        entry = models.TimeEntry.from_dict({'id': 1, 'duration': -5,
+                                            'new_field': 'x'})
+        self.assertFalse(hasattr(entry, '__dict__'))
+        self.assertEqual(entry.duration, -5)
+        self.assertIsNone(entry.pid)
+        self.assertEqual(entry['new_field'], 'x')
+        self.assertEqual(entry.get('missing', 3), 3)
+        self.assertRaises(KeyError, lambda: entry['missing'])
+        self.assertEqual(entry.to_dict(),
+                         {'id': 1, 'duration': -5, 'new_field': 'x'})
+
+    def test_model_for(self):
+        """ Should pick the model from the endpoint's URI. """
+        self.assertIs(models.model_for('/workspaces/7/projects'),
+                      models.Project)
+        self.assertIs(models.model_for('/time_entries/current'),
+                      models.TimeEntry)
+        self.assertIs(models.model_for('/tasks/1,2,3'), models.Task)
+        self.assertIs(models.model_for('/me/data.tags'), models.Tag)
+        self.assertIs(models.model_for('/workspaces/7/users'), models.User)
+        self.assertIsNone(models.model_for('/workspaces/7/workspace_users'))
+        self.assertIsNone(models.model_for('dashboard/7'))
+
+    @responses.activate
+    def test_get(self):
+        """ Should return models for lists and 'data' wrapped objects. """
+        self.responses_add('GET', filename='time_entries_get_in_range')
+        self.responses_add('GET', filename='time_entry_get', id=436694100)
+        entries = self.toggl.TimeEntries.get()
+        self.assertTrue(all(isinstance(entry, models.TimeEntry)
+                            for entry in entries))
+        self.assertEqual(
+            [entry.to_dict() for entry in entries],
+            json.loads(self.get_json('time_entries_get_in_range')))
+        entry = self.toggl.TimeEntries.get(id=436694100)['data']
+        self.assertIsInstance(entry, models.TimeEntry)
+
+    def test_decode_in_place(self):
+        """ Should replace each decoded object by its model in place. """
+        payload = {'data': [{'id': 1, 'tags': ['a']}, {'id': 2}]}
+        items = payload['data']
+        self.assertIs(models.decode('/projects/7/tasks', payload), payload)
+        self.assertIs(payload['data'], items)
+        self.assertEqual([task.id for task in items], [1, 2])
+        self.assertIsInstance(items[1], models.Task)
+
+    @responses.activate
+    def test_related_data(self):
+        """ Should decode the User's related data into models too. """
+        url = self.toggl.api_url + api.User.uri
+        responses.add(responses.GET, url,
+                      body=self.get_json('user_get_with_related_data'))
+        user = self.toggl.User.get(related_data=True)['data']
+        self.assertIsInstance(user, models.User)
+        self.assertIsInstance(user.projects[0], models.Project)
+        self.assertIsInstance(user.tags[0], models.Tag)
+        self.assertEqual(
+            user.to_dict(),
+            json.loads(self.get_json('user_get_with_related_data'))['data'])
+        streamed = list(self.toggl.User.stream_related('time_entries'))
+        self.assertIsInstance(streamed[0], models.TimeEntry)
+
+
+class TestTimeEntryColumns(unittest.TestCase):
+    """ Tests the columnar time entry container. """
+
+    def setUp(self):
+        self.columns = TimeEntryColumns([
+            {'id': 1, 'pid': 10, 'wid': 7, 'duration': 3600,
+             'start': '2020-01-01T23:30:00+00:00',
+             'stop': '2020-01-02T00:30:00+00:00',
+             'description': 'Meeting', 'tags': ['billed', 'client']},
+            {'id': 2, 'pid': 11, 'wid': 7, 'duration': 600,
+             'start': '2020-01-02T09:00:00Z', 'description': 'Meeting',
+             'tags': ['billed']},
+        ])
+        running_start = 1577966400  # 2020-01-02T12:00:00Z
+        self.columns.extend([models.TimeEntry.from_dict(
+            {'id': 3, 'wid': 7, 'duration': -running_start,
+             'start': '2020-01-02T12:00:00+00:00', 'description': 'Code'})])
+        self.now = running_start + 60
+
+    def test_columns(self):
+        """ Should store typed, dictionary-encoded columns. """
+        columns = self.columns
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(columns.ids.typecode, 'q')
+        self.assertEqual(list(columns.pids), [10, 11, 0])
+        self.assertEqual(columns.starts[1], 1577955600)
+        self.assertEqual(columns.stops[1], 0)
+        self.assertEqual(list(columns.description_codes), [0, 0, 1])
+        self.assertEqual(columns.descriptions.values, ['Meeting', 'Code'])
+        self.assertEqual(list(columns.tag_offsets), [0, 2, 3, 3])
+        self.assertEqual(columns.tags.values, ['billed', 'client'])
+        self.assertEqual(list(columns.elapsed(self.now)), [3600, 600, 60])
+
+    def test_group_sum(self):
+        """ Should sum tracked seconds per group. """
+        group_sum = self.columns.group_sum
+        self.assertEqual(group_sum('project', now=self.now),
+                         {10: 3600, 11: 600, 0: 60})
+        self.assertEqual(group_sum('workspace', now=self.now), {7: 4260})
+        self.assertEqual(group_sum('tag', now=self.now),
+                         {'billed': 4200, 'client': 3600})
+        self.assertEqual(group_sum('description', now=self.now),
+                         {'Meeting': 4200, 'Code': 60})
+        self.assertEqual(
+            group_sum('client', project_clients={10: 5, 11: 5}, now=self.now),
+            {5: 4200, 0: 60})
+        days = group_sum('day', now=self.now)
+        self.assertEqual(sorted((str(day), sec) for day, sec in days.items()),
+                         [('2020-01-01', 3600), ('2020-01-02', 660)])
+        local_days = group_sum('day', utc_offset=3600, now=self.now)
+        self.assertEqual(sorted(local_days.values()), [4260])
+        self.assertRaises(ValueError, group_sum, 'client')
+        self.assertRaises(ValueError, group_sum, 'color')
+
+    def test_group_sum_without_numpy(self):
+        """ Should sum the same in pure Python when NumPy is missing. """
+        with mock.patch('togglwrapper.columnar._numpy', return_value=None):
+            self.test_group_sum()
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_group_sum_numpy(self):
+        """ Should return plain ints when summing with NumPy. """
+        for by in ('project', 'tag', 'day'):
+            sums = self.columns.group_sum(by, now=self.now)
+            self.assertTrue(all(type(seconds) is int
+                                for seconds in sums.values()))
+        self.assertTrue(all(type(pid) is int for pid in
+                            self.columns.group_sum('project', now=self.now)))
+        self.assertEqual(TimeEntryColumns().group_sum('tag'), {})
+
+    @unittest.skipIf(numpy is None, 'numpy is not installed')
+    def test_to_numpy(self):
+        """ Should expose the columns as NumPy arrays. """
+        columns = self.columns.to_numpy()
+        self.assertEqual(columns['ids'].dtype, numpy.int64)
+        self.assertEqual(columns['ids'].tolist(), [1, 2, 3])
+        self.assertEqual(columns['tags'].tolist(), ['billed', 'client'])
+
+    @unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+    def test_to_arrow(self):
+        """ Should build an Arrow table with dictionary-encoded strings. """
+        table = self.columns.to_arrow()
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.column('description').to_pylist(),
+                         ['Meeting', 'Meeting', 'Code'])
+        self.assertEqual(table.column('tags').to_pylist(),
+                         [['billed', 'client'], ['billed'], []])
+        self.assertEqual(table.column('stop').null_count, 2)
+
+
+class TestBulkOperations(TestTogglBase):
+    """ Tests chunked multi-ID updates and deletes. """
+    focus_class = api.TimeEntries
+
+    def ids_of(self, request):
+        path = urlparse(request.url).path
+        return [int(id) for id in path.rsplit('/', 1)[1].split(',')]
+
+    def test_chunk_ids(self):
+        """ Should split IDs into groups that fit the length. """
+        self.assertEqual(chunk_ids([1, 22, 333, 4444, 5], 8),
+                         [(1, 22, 333), (4444, 5)])
+        self.assertEqual(chunk_ids([], 8), [])
+        self.assertRaises(ValueError, chunk_ids, [123456789], 8)
+
+    @responses.activate
+    def test_bulk_update(self):
+        """ Should update in URL-safe chunks and merge the data arrays. """
+        def callback(request):
+            self.assertLessEqual(len(request.url), 200)
+            ids = self.ids_of(request)
+            if 1000000013 in ids:
+                return (500, {}, '')
+            body = json.loads(request.body)
+            return (200, {}, json.dumps({'data': [
+                dict(body['time_entry'], id=id) for id in ids]}))
+
+        responses.add_callback(
+            responses.PUT, re.compile(re.escape(self.compile_full_url()) +
+                                      r'/[\d,]+$'), callback=callback)
+        ids = list(range(1000000000, 1000000040))
+        data = {'time_entry': {'tags': ['billed'], 'tag_action': 'add'}}
+        result = self.toggl.TimeEntries.bulk_update(ids, data,
+                                                    max_url_length=200)
+        self.assertGreater(len(responses.calls), 2)
+        self.assertEqual(len(result.errors), 1)
+        failed = list(result.errors)[0]
+        self.assertIn(1000000013, failed)
+        self.assertEqual([entry['id'] for entry in result.data],
+                         [id for id in ids if id not in failed])
+        self.assertEqual(sorted(sum(map(list, result.results), []) +
+                                list(failed)), ids)
+
+    def test_bulk_endpoints(self):
+        """ Should only offer bulk changes where the API takes many IDs. """
+        self.assertFalse(hasattr(self.toggl.User, 'bulk_update'))
+        self.assertFalse(hasattr(self.toggl.Clients, 'bulk_update'))
+        self.assertFalse(hasattr(self.toggl.Tags, 'bulk_delete'))
+        self.assertFalse(hasattr(self.toggl.TimeEntries, 'bulk_delete'))
+        self.assertTrue(hasattr(self.toggl.ProjectUsers, 'bulk_update'))
+        self.assertTrue(hasattr(self.toggl.Projects, 'bulk_delete'))
+
+    @responses.activate
+    def test_bulk_delete(self):
+        """ Should delete every ID once, in URL-safe chunks. """
+        deleted = []
+
+        def callback(request):
+            self.assertLessEqual(len(request.url), 120)
+            deleted.extend(self.ids_of(request))
+            return (200, {}, '')
+
+        url = self.toggl.api_url + api.Tasks.uri
+        responses.add_callback(
+            responses.DELETE, re.compile(re.escape(url) + r'/[\d,]+$'),
+            callback=callback)
+        ids = list(range(100000, 100100))
+        result = self.toggl.Tasks.bulk_delete(ids, max_url_length=120,
+                                              max_workers=4)
+        self.assertTrue(result.ok)
+        self.assertEqual(sorted(deleted), ids)
+
+    @responses.activate
+    def test_bulk_create(self):
+        """ Should create each new item once, skipping completed keys. """
+        keys = []
+
+        def callback(request):
+            keys.append(request.headers['Idempotency-Key'])
+            body = json.loads(request.body)['time_entry']
+            if body['description'] == 'fail':
+                return (500, {}, '')
+            return (200, {}, json.dumps({'data': dict(body, id=len(keys))}))
+
+        responses.add_callback(responses.POST, self.compile_full_url(),
+                               callback=callback)
+        items = ({'time_entry': {'description': str(n)}} for n in range(20))
+        completed = set([idempotency_key(
+            {'time_entry': {'description': '3'}})])
+        progress = []
+        result = self.toggl.TimeEntries.bulk_create(
+            items, completed=completed, max_workers=3,
+            on_progress=lambda *counts: progress.append(counts))
+        self.assertTrue(result.ok)
+        self.assertEqual(len(responses.calls), 19)
+        self.assertEqual(len(set(keys)), 19)
+        self.assertEqual(len(completed), 20)
+        self.assertEqual(progress[-1], (19, 0))
+        self.assertEqual(sorted(int(entry['description'])
+                                for entry in result.data),
+                         [n for n in range(20) if n != 3])
+
+        # Running it again creates nothing; a failure is reported by key.
+        items = [{'time_entry': {'description': str(n)}} for n in range(20)]
+        items.append({'time_entry': {'description': 'fail'}})
+        result = self.toggl.TimeEntries.bulk_create(items,
+                                                    completed=completed)
+        self.assertEqual(len(responses.calls), 20)
+        self.assertEqual(list(result.errors),
+                         [(idempotency_key(items[-1]),)])
+
+    @responses.activate
+    def test_bulk_create_not_resent(self):
+        """ Should not re-send a keyed POST the server may have handled. """
+        url = self.compile_full_url()
+        responses.add(responses.POST, url, status=503)
+        responses.add(responses.POST, url, json={'data': {'id': 1}})
+        self.toggl.retry = RetryPolicy(sleep=lambda seconds: None)
+        result = self.toggl.TimeEntries.bulk_create(
+            [{'time_entry': {'description': 'x'}}])
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(len(responses.calls), 1)
+
+    @responses.activate
+    def test_bulk_create_project_users(self):
+        """ Should merge project users differing only by uid. """
+        url = self.toggl.api_url + api.ProjectUsers.uri
+        bodies = []
+
+        def callback(request):
+            body = json.loads(request.body)['project_user']
+            bodies.append(body)
+            uids = body['uid'].split(',')
+            return (200, {}, json.dumps({'data': [
+                dict(body, uid=int(uid)) for uid in uids]}))
+
+        responses.add_callback(responses.POST, url, callback=callback)
+        items = [{'project_user': {'pid': 7, 'uid': uid}}
+                 for uid in range(150)]
+        items.append({'project_user': {'pid': 7, 'uid': 1, 'manager': True}})
+        result = self.toggl.ProjectUsers.bulk_create(items)
+        self.assertTrue(result.ok)
+        self.assertEqual(len(bodies), 3)
+        self.assertEqual(sorted(len(body['uid'].split(','))
+                                for body in bodies), [1, 50, 100])
+        self.assertEqual(len(result.data), 151)
+
 
 class TestClients(TestTogglBase):
     focus_class = api.Clients
@@ -542,6 +2321,42 @@ class TestTimeEntries(TestTogglBase):
         self.assertEqual(type(response), list)
         self.assertEqual(len(responses.calls), 1)
 
+    @responses.activate
+    def test_iter_range(self):
+        """ Should page through full windows and yield each entry once. """
+        base = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        entries = [{'id': hour, 'start': (base + timedelta(hours=hour))
+                    .isoformat()} for hour in range(72)]
+
+        def callback(request):
+            query = parse_qs(urlparse(request.url).query)
+            start = parse_datetime(query['start_date'][0])
+            end = parse_datetime(query['end_date'][0])
+            found = [entry for entry in reversed(entries)
+                     if start <= parse_datetime(entry['start']) <= end]
+            return (200, {}, json.dumps(found[:10]))
+
+        responses.add_callback(responses.GET, self.compile_full_url(),
+                               callback=callback)
+        with mock.patch.object(api, 'TIME_ENTRIES_LIMIT', 10):
+            found = list(self.toggl.TimeEntries.iter_range(
+                '2020-01-01T00:00:00Z', base + timedelta(days=3),
+                window=timedelta(days=1), max_workers=2))
+        self.assertEqual([entry['id'] for entry in found], list(range(72)))
+
+    @responses.activate
+    def test_iter_range_truncated(self):
+        """ Should raise when a one second window is still full. """
+        entries = [{'id': id, 'start': '2020-01-01T12:00:00+00:00'}
+                   for id in range(15)]
+        responses.add(responses.GET, self.compile_full_url(),
+                      body=json.dumps(entries[:10]))
+        with mock.patch.object(api, 'TIME_ENTRIES_LIMIT', 10):
+            self.assertRaises(TruncatedResponse, list,
+                              self.toggl.TimeEntries.iter_range(
+                                  '2020-01-01T00:00:00Z',
+                                  '2020-01-02T00:00:00Z'))
+
     @responses.activate
     def test_update(self):
         """ Should update a TimeEntry. """
@@ -613,6 +2428,78 @@ class TestUser(TestTogglBase):
         self.assertEqual(len(responses.calls), 1)
 
 
+class TestSyncEngine(TestTogglBase):
+    """ Tests incremental syncing of the user's related data. """
+    focus_class = api.User
+
+    def add_sync_response(self, since, **data):
+        url = self.compile_full_url()
+        responses.remove(responses.GET, url)
+        responses.add(responses.GET, url,
+                      body=json.dumps({'since': since, 'data': data}))
+
+    @responses.activate
+    def test_incremental(self):
+        """ Should fetch everything once, then apply deltas and deletions. """
+        engine = SyncEngine(self.toggl)
+        full = json.loads(self.get_json('user_get_with_related_data'))
+        responses.add(responses.GET, self.compile_full_url(),
+                      body=json.dumps(full))
+        changes = engine.sync()
+        tags = engine.objects('tags')
+        self.assertEqual(len(tags), len(full['data']['tags']))
+        self.assertEqual(changes['tags']['updated'], len(tags))
+        self.assertNotIn('since', responses.calls[0].request.url)
+
+        deleted_id, renamed_id = sorted(tags)
+        self.add_sync_response(
+            1400000000,
+            tags=[{'id': deleted_id, 'server_deleted_at': '2014-05-13'},
+                  {'id': renamed_id, 'name': 'Renamed'}])
+        changes = engine.sync()
+        self.assertIn('since={}'.format(full['since']),
+                      responses.calls[1].request.url)
+        self.assertEqual(changes['tags'], {'updated': 1, 'deleted': 1})
+        self.assertEqual(changes['projects'], {'updated': 0, 'deleted': 0})
+        tags = engine.objects('tags')
+        self.assertNotIn(deleted_id, tags)
+        self.assertEqual(tags[renamed_id]['name'], 'Renamed')
+        self.assertEqual(len(engine.objects('projects')), 1)
+        self.assertEqual(engine.store.get_since(engine.key), 1400000000)
+
+    @responses.activate
+    def test_file_store(self):
+        """ Should resume from the saved timestamp in a new process. """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'sync.json')
+        responses.add(responses.GET, self.compile_full_url())
+        self.add_sync_response(100, tags=[{'id': 1, 'name': 'billed'}])
+        SyncEngine(self.toggl, JSONFileStore(path)).sync()
+
+        engine = SyncEngine(self.toggl, JSONFileStore(path))
+        self.assertEqual(engine.objects('tags'), {1: {'id': 1,
+                                                      'name': 'billed'}})
+        self.add_sync_response(200)
+        engine.sync()
+        self.assertIn('since=100', responses.calls[1].request.url)
+        with open(path) as json_file:
+            self.assertNotIn(FAKE_TOKEN, json_file.read())
+
+    @responses.activate
+    def test_models(self):
+        """ Should store dicts when the client returns models. """
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'sync.json')
+        toggl = api.Toggl(self.api_token, models=True)
+        self.add_sync_response(100, tags=[{'id': 1, 'name': 'billed'}])
+        SyncEngine(toggl, JSONFileStore(path)).sync()
+        engine = SyncEngine(toggl, JSONFileStore(path))
+        self.assertEqual(engine.objects('tags'), {1: {'id': 1,
+                                                      'name': 'billed'}})
+
+
 class TestWorkspaces(TestTogglBase):
     focus_class = api.Workspaces
 
@@ -711,6 +2598,30 @@ class TestWorkspaces(TestTogglBase):
         self.assertEqual(type(response), list)
         self.assertEqual(len(responses.calls), 1)
 
+    @responses.activate
+    def test_get_many_children(self):
+        """ Should fan out child requests and collect per-item errors. """
+        self.responses_add('GET', 'workspace_projects', id=1,
+                           child_uri='/projects')
+        self.responses_add('GET', 'workspace_tags', id=1, child_uri='/tags')
+        self.responses_add('GET', 'workspace_projects', id=2,
+                           child_uri='/projects')
+        self.responses_add('GET', 'failed_request', id=2, child_uri='/tags',
+                           status_code=500)
+        result = self.toggl.Workspaces.get_many_children(
+            [1, 2], children=['projects', 'tags'], max_workers=3, rate=1000)
+        self.assertFalse(result.ok)
+        self.assertEqual(sorted(result.results),
+                         [(1, 'projects'), (1, 'tags'), (2, 'projects')])
+        self.assertEqual(list(result.errors), [(2, 'tags')])
+        self.assertIsInstance(result.errors[(2, 'tags')], HTTPError)
+        self.assertEqual(len(responses.calls), 4)
+
+    def test_get_many_children_unknown(self):
+        """ Should refuse children the resource does not have. """
+        self.assertRaises(ValueError, self.toggl.Workspaces.get_many_children,
+                          [1], children=['time_entries'])
+
     @responses.activate
     def test_invite(self):
         """ Should invite users to the given Workspace. """
@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
 
 from .api import Toggl
-
-import logging
-logging.getLogger(__name__)
+from .deadline import Deadline
+from .ratelimit import TokenBucket
+from .retry import RetryPolicy
 
 __version__ = '2.0.0'
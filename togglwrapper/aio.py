@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.aio
+----------------
+
+An asyncio counterpart of :class:`togglwrapper.Toggl`. Every resource method
+(``toggl.Clients.get()``, ``toggl.TimeEntries.start(...)``, ...) returns an
+awaitable instead of blocking, so that many calls can overlap on one event
+loop. Requests share a single pooled ``httpx.AsyncClient``.
+
+Requires `httpx <https://www.python-httpx.org/>`_, installable with
+``pip install togglwrapper[async]``.
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+
+from .api import API_VERSION, BASE_URL, BaseToggl, MAX_THROTTLE_RETRIES
+from .codec import get_codec
+from .deadline import current as current_deadline
+from .decorators import check_response, decode_response
+from .exceptions import DeadlineExceeded
+from .hooks import RequestEvent, body_size, notify_error, notify_response
+from .ratelimit import parse_retry_after
+from .singleflight import AsyncSingleFlight
+
+
+MAX_CONNECTIONS = 20
+MAX_CONCURRENCY = 20
+
+
+class AsyncToggl(BaseToggl):
+    """
+    Asynchronous Toggl client. Use it as an async context manager, or call
+    :meth:`aclose` when done, to release the pooled connections::
+
+        async with AsyncToggl('api_token') as toggl:
+            clients, projects = await asyncio.gather(
+                toggl.Clients.get(), toggl.Workspaces.get_projects(wid))
+
+    The helpers that run requests on a thread pool or stream responses,
+    such as ``bulk_create``, ``get_many_children`` and
+    ``TimeEntries.iter_range``, raise TypeError here; gather the single
+    requests instead.
+    """
+    asynchronous = True
+
+    def __init__(self, api_token, base_url=BASE_URL, version=API_VERSION,
+                 max_connections=MAX_CONNECTIONS,
+                 max_concurrency=MAX_CONCURRENCY, keep_alive=True,
+                 rate_limiter=None, retry=None, transport=None, hooks=(),
+                 coalesce=False, codec=None):
+        """
+        Initializes the asynchronous Toggl client object.
+
+        Args:
+            api_token (str): The Toggl API token.
+            base_url (str): The base API URL.
+            version (str): The version of the API. Defaults to `v8`.
+            max_connections (int): The maximum number of open connections in
+                the shared pool. Defaults to 20.
+            max_concurrency (int): The maximum number of requests in flight
+                at once. Further requests wait for a free slot. Defaults
+                to 20.
+            keep_alive (bool): If False, connections are not kept open
+                between requests. Defaults to True.
+            rate_limiter (TokenBucket, optional): Schedules every request made
+                through this client. Defaults to None.
+            retry (RetryPolicy, optional): Re-sends requests that failed with
+                a transient error. Defaults to None.
+            transport (httpx.AsyncBaseTransport, optional): A custom httpx
+                transport, e.g. for testing. Defaults to None.
+            hooks (iterable of Hook, optional): Notified before and after
+                every request attempt. See :mod:`togglwrapper.hooks`.
+                Defaults to none.
+            coalesce (bool): If True, a GET made while an identical one is
+                in flight awaits its response instead of sending another
+                request. Counters are kept in `single_flight`. Defaults to
+                False.
+            codec (str or Codec, optional): Encodes request bodies and
+                decodes responses, like the codec of
+                :class:`togglwrapper.Toggl`. Defaults to the fastest one
+                installed.
+        """
+        super(AsyncToggl, self).__init__(base_url, version)
+        self.auth = httpx.BasicAuth(api_token, 'api_token')
+        self.rate_limiter = rate_limiter
+        self.retry = retry
+        self.hooks = list(hooks)
+        self.single_flight = AsyncSingleFlight() if coalesce else None
+        self.max_concurrency = max_concurrency
+        self.codec = get_codec(codec)
+        # Created on the first request: before Python 3.10, a semaphore is
+        # bound to the event loop current when it is made.
+        self._semaphore = None
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections if keep_alive else 0)
+        self.client = httpx.AsyncClient(auth=self.auth, limits=limits,
+                                        transport=transport)
+
+    async def aclose(self):
+        """ Closes all pooled connections held by the client. """
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def _send(self, method, uri, attempt=1, **kwargs):
+        """
+        Waits for the rate limiter and a concurrency slot, then sends the
+        request, notifying the hooks of the client.
+        """
+        url = '{base}{uri}'.format(base=self.api_url, uri=uri)
+        hooks = self.hooks
+        if hooks:
+            event = RequestEvent(method, uri, attempt,
+                                 dict(kwargs.get('headers') or {}),
+                                 body_size(kwargs.get('content')))
+            for hook in hooks:
+                hook.before_request(event)
+            kwargs['headers'] = event.headers
+            start = time.perf_counter()
+        deadline = current_deadline()
+        if self.rate_limiter is not None:
+            wait = self.rate_limiter.reserve(
+                deadline.check() if deadline is not None else None)
+            if wait is None:
+                raise DeadlineExceeded('The rate limiter would hold the '
+                                       'request past the deadline.')
+            if wait > 0:
+                await asyncio.sleep(wait)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            if deadline is not None:
+                kwargs['timeout'] = self._timeout(deadline)
+            if not hooks:
+                return await self.client.request(method, url, **kwargs)
+            sent = time.perf_counter()
+            event.queued = sent - start
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            except Exception as e:
+                notify_error(hooks, event, e, time.perf_counter() - sent)
+                raise
+            notify_response(hooks, event, response,
+                            time.perf_counter() - sent)
+            return response
+
+    def _timeout(self, deadline):
+        """ Returns the client's timeouts, lowered to the time left. """
+        remaining = deadline.check()
+        timeout = self.client.timeout
+        return httpx.Timeout(**dict(
+            (phase, remaining if getattr(timeout, phase) is None else
+             min(getattr(timeout, phase), remaining))
+            for phase in ('connect', 'read', 'write', 'pool')))
+
+    def _check_deadline(self):
+        """ Raises DeadlineExceeded if the current deadline has passed. """
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check()
+
+    async def _request(self, method, uri, **kwargs):
+        """
+        Sends a request for the given URI, following the same throttling and
+        retry rules as :meth:`togglwrapper.Toggl._request`.
+        """
+        retry = self.retry
+        if retry is not None:
+            retry.stats.record_request()
+        attempt = 0
+        throttled = 0
+        sent = 0
+        while True:
+            attempt += 1
+            sent += 1
+            try:
+                response = await self._send(method, uri, sent, **kwargs)
+            except httpx.TransportError as e:
+                self._check_deadline()
+                unsent = isinstance(e, (httpx.ConnectError,
+                                        httpx.ConnectTimeout))
+                if retry is None or not retry.is_retryable(
+                        method, attempt, unsent=unsent):
+                    if retry is not None and retry.is_exhausted(
+                            method, attempt, unsent=unsent):
+                        retry.stats.record_exhausted()
+                    raise
+                await self._wait_to_retry(retry, attempt, 'connection')
+                continue
+
+            status_code = response.status_code
+            if (status_code == 429 and self.rate_limiter is not None and
+                    throttled < MAX_THROTTLE_RETRIES):
+                throttled += 1
+                attempt -= 1
+                self.rate_limiter.defer(parse_retry_after(
+                    response, default=1.0 / self.rate_limiter.rate))
+                continue
+            if retry is None or status_code not in retry.retry_statuses:
+                return response
+            retry_after = parse_retry_after(response, default=0.0)
+            if not retry.is_retryable(method, attempt, status_code,
+                                      retry_after=retry_after):
+                if retry.is_exhausted(method, attempt, status_code):
+                    retry.stats.record_exhausted()
+                return response
+            await self._wait_to_retry(retry, attempt, status_code, retry_after)
+
+    async def _wait_to_retry(self, retry, attempt, cause, minimum=0.0):
+        """ Sleeps for the policy's backoff before re-sending a request. """
+        delay = max(minimum, retry.backoff(attempt))
+        deadline = current_deadline()
+        if deadline is not None and delay >= deadline.check():
+            raise DeadlineExceeded(
+                'A retry in {:.3f}s would start past the deadline.'.format(
+                    delay))
+        retry.stats.record_retry(cause, delay)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def get(self, uri, params=None):
+        """
+        GETs to the given URI.
+
+        Args:
+            uri (str): The URI/path to append to the full API URL.
+            params (dict, optional): Extra parameters/querystrings to
+                accompany the GET request. Keys with values of None are
+                ignored.
+        """
+        if params:
+            params = dict((key, value) for key, value in params.items()
+                          if value is not None)
+        if self.single_flight is None:
+            response = await self._request('GET', uri, params=params or None)
+        else:
+            key = (uri, json.dumps(params, sort_keys=True, default=str))
+            response = await self.single_flight.do(
+                key, lambda: self._request('GET', uri, params=params or None))
+        return decode_response(check_response(response), self.codec)
+
+    async def post(self, uri, data=None, headers=None):
+        """
+        POSTs to the given URI.
+
+        Args:
+            uri (str): The URI/path to append to the full API URL.
+            data (optional): dict to POST.
+            headers (dict, optional): Extra headers to send. Defaults to None.
+        """
+        payload = self.codec.dumps(data) if data is not None else None
+        response = await self._request('POST', uri, content=payload,
+                                       headers=headers)
+        return decode_response(check_response(response), self.codec)
+
+    async def put(self, uri, data):
+        """
+        PUTs to the given URI with a data.
+
+        Args:
+            uri (str): The URI/path to append to the full API URL.
+            data: dict to PUT.
+        """
+        response = await self._request('PUT', uri,
+                                       content=self.codec.dumps(data))
+        return decode_response(check_response(response), self.codec)
+
+    async def delete(self, uri):
+        """ DELETEs to the given URI. """
+        return check_response(await self._request('DELETE', uri))
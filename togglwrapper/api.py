@@ -5,17 +5,54 @@ togglwrapper.api
 """
 
 import json
-
-import requests
-from requests.auth import HTTPBasicAuth
-
-from .decorators import error_checking, return_json
-from .mixins import GetMixin, CreateMixin, UpdateMixin, DeleteMixin
+import threading
+import time
+from datetime import timedelta
+
+from .codec import get_codec
+from .deadline import bind as bind_deadline, current as current_deadline
+from .decorators import (blocking, check_response, decode_response,
+                         error_checking, return_json, return_models)
+from .exceptions import DeadlineExceeded, TruncatedResponse
+from .hooks import RequestEvent, body_size, send_with_hooks
+from .models import model_for
+from .mixins import (GetMixin, CreateMixin, UpdateMixin, DeleteMixin,
+                     BulkUpdateMixin, BulkDeleteMixin, ChildrenMixin)
+from .ratelimit import parse_retry_after
+from .reports import Reports, reports_url
+from .singleflight import SingleFlight
+from .streaming import iter_items
+from .utils import parse_datetime
 
 
 BASE_URL = 'https://api.track.toggl.com/api'
 API_VERSION = 'v8'
 API_URL = '{base}/{version}'.format(base=BASE_URL, version=API_VERSION)
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 10
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+MAX_THROTTLE_RETRIES = 3
+STREAM_CHUNK_SIZE = 64 * 1024
+TIME_ENTRIES_LIMIT = 1000
+TIME_ENTRIES_WINDOW = timedelta(days=7)
+TIME_ENTRIES_MIN_WINDOW = timedelta(seconds=1)
+
+
+def _connect_failed(error):
+    """
+    Returns True if a `requests.ConnectionError` was raised because the
+    connection could not be made, so the request was never sent.
+    """
+    import requests
+    from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, NewConnectionError)
 
 
 class TogglObject(object):
@@ -87,8 +124,13 @@ class Dashboard(TogglObject, GetMixin):
         return super(Dashboard, self).get(id=workspace_id)
 
 
-class Projects(TogglObject, GetMixin, CreateMixin, UpdateMixin, DeleteMixin):
+class Projects(TogglObject, GetMixin, CreateMixin, UpdateMixin, DeleteMixin,
+               BulkDeleteMixin, ChildrenMixin):
     uri = '/projects'
+    children = {
+        'project_users': 'get_project_users',
+        'tasks': 'get_tasks',
+    }
 
     def get(self, project_id):
         """ Gets the Project with the given ID. """
@@ -103,8 +145,10 @@ class Projects(TogglObject, GetMixin, CreateMixin, UpdateMixin, DeleteMixin):
         return super(Projects, self).get(project_id, '/tasks')
 
 
-class ProjectUsers(TogglObject, CreateMixin, UpdateMixin, DeleteMixin):
+class ProjectUsers(TogglObject, CreateMixin, UpdateMixin, DeleteMixin,
+                   BulkUpdateMixin, BulkDeleteMixin):
     uri = '/project_users'
+    multi_create = ('project_user', 'uid')
 
     def get_for_project(self, project_id):
         """ Gets the ProjectUsers for the Project with the given ID. """
@@ -115,7 +159,8 @@ class Tags(TogglObject, CreateMixin, UpdateMixin, DeleteMixin):
     uri = '/tags'
 
 
-class Tasks(TogglObject, GetMixin, CreateMixin, UpdateMixin, DeleteMixin):
+class Tasks(TogglObject, GetMixin, CreateMixin, UpdateMixin, DeleteMixin,
+            BulkUpdateMixin, BulkDeleteMixin):
     uri = '/tasks'
 
     def get(self, tag_id):
@@ -128,7 +173,7 @@ class Tasks(TogglObject, GetMixin, CreateMixin, UpdateMixin, DeleteMixin):
 
 
 class TimeEntries(TogglObject, GetMixin, CreateMixin, UpdateMixin,
-                  DeleteMixin):
+                  DeleteMixin, BulkUpdateMixin):
     uri = '/time_entries'
 
     def get(self, id=None, start_date=None, end_date=None):
@@ -137,7 +182,8 @@ class TimeEntries(TogglObject, GetMixin, CreateMixin, UpdateMixin,
 
         If neither an ID or time range is given, returns the time entries
         started during the last 9 days. The limit of returned time entries
-        is 1000. So only the first 1000 found time entries are returned.
+        is 1000. So only the first 1000 found time entries are returned. Use
+        :meth:`iter_range` to get every time entry in a longer range.
 
         Args:
             id (int, optional): The ID of the specific instance to get.
@@ -150,6 +196,92 @@ class TimeEntries(TogglObject, GetMixin, CreateMixin, UpdateMixin,
         params = {'start_date': start_date, 'end_date': end_date}
         return super(TimeEntries, self).get(id=id, params=params)
 
+    @blocking
+    def stream(self, start_date=None, end_date=None):
+        """
+        Yields the time entries :meth:`get` would return, one at a time, as
+        the response is parsed. See :meth:`togglwrapper.Toggl.stream`.
+        """
+        params = {'start_date': start_date, 'end_date': end_date}
+        return self.toggl.stream(self._compile_uri(), params=params)
+
+    @blocking
+    def iter_range(self, start_date, end_date, window=TIME_ENTRIES_WINDOW,
+                   max_workers=4):
+        """
+        Yields every time entry started in a time range, in start order.
+
+        Unlike :meth:`get`, this is not cut off at 1000 entries: the range is
+        split into windows, and any window that comes back full is halved
+        until it is not. Windows are fetched concurrently, within the
+        client's rate limiter, but only a few windows are held in memory at a
+        time. Entries returned for two neighbouring windows are only yielded
+        once.
+
+        Raises:
+            TruncatedResponse: If a window of one second still comes back
+                full, so entries would be left out.
+
+        Args:
+            start_date (str or datetime): ISO 8601 date and time string, or
+                datetime, of the start of the range.
+            end_date (str or datetime): ISO 8601 date and time string, or
+                datetime, of the end of the range.
+            window (timedelta, optional): The length of the windows fetched
+                with one request. Defaults to 7 days.
+            max_workers (int, optional): The maximum number of windows fetched
+                at once. Defaults to 4.
+        """
+        start, end = parse_datetime(start_date), parse_datetime(end_date)
+        windows = []
+        while start < end:
+            windows.append((start, min(start + window, end)))
+            start += window
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = []
+            windows = iter(windows)
+            previous_ids = set()
+            while True:
+                for window_range in windows:
+                    pending.append(executor.submit(bind_deadline(
+                        self._get_window), *window_range))
+                    if len(pending) >= max_workers:
+                        break
+                if not pending:
+                    return
+                entries = pending.pop(0).result()
+                current_ids = set()
+                for entry in entries:
+                    current_ids.add(entry['id'])
+                    if entry['id'] not in previous_ids:
+                        yield entry
+                previous_ids = current_ids
+
+    def _get_window(self, start, end):
+        """
+        Gets all time entries in a window sorted by start, halving the window
+        while the response is full.
+        """
+        entries = self.get(start_date=start.isoformat(),
+                           end_date=end.isoformat())
+        if len(entries) >= TIME_ENTRIES_LIMIT:
+            if end - start <= TIME_ENTRIES_MIN_WINDOW:
+                raise TruncatedResponse(
+                    'More than {} time entries start between {} and {}.'
+                    .format(TIME_ENTRIES_LIMIT, start.isoformat(),
+                            end.isoformat()))
+            middle = start + (end - start) / 2
+            first = self._get_window(start, middle)
+            first_ids = set(entry['id'] for entry in first)
+            second = [entry for entry in self._get_window(middle, end)
+                      if entry['id'] not in first_ids]
+            return first + second
+        return sorted(entries,
+                      key=lambda entry: parse_datetime(entry['start']))
+
     def start(self, data):
         """ Starts a new time entry. """
         return super(TimeEntries, self).create(child_uri='/start', data=data)
@@ -184,6 +316,22 @@ class User(TogglObject, GetMixin, UpdateMixin):
             params['with_related_data'] = related_data
         return super(User, self).get(params=params)
 
+    @blocking
+    def stream_related(self, collection, since=None):
+        """
+        Yields the objects of one related data collection as the response is
+        parsed, instead of building the whole related data dump in memory.
+
+        Args:
+            collection (str): The related data to yield, e.g. 'time_entries',
+                'projects', 'clients', 'tasks', 'tags' or 'workspaces'.
+            since (str or int, optional): Only yield objects which have
+                changed after this unix timestamp. Defaults to None.
+        """
+        params = {'since': since, 'with_related_data': True}
+        path = 'data.{}'.format(collection)
+        return self.toggl.stream(self._compile_uri(), path, params=params)
+
     def update(self, data):
         """
         Updates the user associated with the api token.
@@ -194,8 +342,16 @@ class User(TogglObject, GetMixin, UpdateMixin):
         return super(User, self).update(data=data)
 
 
-class Workspaces(TogglObject, GetMixin, UpdateMixin):
+class Workspaces(TogglObject, GetMixin, UpdateMixin, ChildrenMixin):
     uri = '/workspaces'
+    children = {
+        'clients': 'get_clients',
+        'projects': 'get_projects',
+        'tags': 'get_tags',
+        'tasks': 'get_tasks',
+        'users': 'get_users',
+        'workspace_users': 'get_workspace_users',
+    }
 
     def get_users(self, workspace_id):
         """ Gets the Users for the Workspace with the given ID. """
@@ -237,14 +393,113 @@ class WorkspaceUsers(TogglObject, UpdateMixin, DeleteMixin):
     uri = '/workspace_users'
 
 
-class Toggl(object):
+class resource(object):
+    """
+    Declares a Toggl object on a client. The object is built the first time
+    it is accessed on each client, then cached in the client's __dict__, so
+    later accesses are plain attribute lookups.
+    """
+    def __init__(self, cls):
+        self.cls = cls
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, toggl, owner=None):
+        if toggl is None:
+            return self
+        # setdefault keeps one instance if several threads race here.
+        return toggl.__dict__.setdefault(self.name, self.cls(toggl))
+
+
+class BaseToggl(object):
+    """
+    Collects all Toggl objects in one place, independently of how requests are
+    sent. Subclasses implement `get`, `post`, `put` and `delete`, and set
+    `asynchronous` if those return awaitables.
+    """
+    asynchronous = False
+
+    Clients = resource(Clients)
+    Dashboard = resource(Dashboard)
+    Projects = resource(Projects)
+    ProjectUsers = resource(ProjectUsers)
+    Tags = resource(Tags)
+    Tasks = resource(Tasks)
+    TimeEntries = resource(TimeEntries)
+    User = resource(User)
+    Workspaces = resource(Workspaces)
+    WorkspaceUsers = resource(WorkspaceUsers)
+
+    def __init__(self, base_url=BASE_URL, version=API_VERSION):
+        self.api_url = '{base}/{version}'.format(base=base_url,
+                                                 version=version)
+
+    def signups(self, data):
+        """
+        Creates a new user.
+
+        Args:
+          data (dict): Contains required and optional fields and values.
+        """
+        return self.post('/signups', data)
+
+    def reset_token(self):
+        """ Deletes the current API Token and returns a new token. """
+        return self.post('/reset_token')
+
+
+def build_session(pool_connections=POOL_CONNECTIONS,
+                  pool_maxsize=POOL_MAXSIZE, pool_block=False,
+                  keep_alive=True, transport=None, auth=None):
+    """
+    Returns a requests.Session with a sized connection pool, as used by
+    :class:`Toggl`. See :class:`Toggl` for the arguments.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from http.cookiejar import DefaultCookiePolicy
+
+    session = requests.Session()
+    session.auth = auth
+    # The API token authenticates every request, so cookies are never
+    # needed, and a shared cookie jar is mutated by every response.
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=()))
+    adapter = transport
+    if adapter is None:
+        adapter = HTTPAdapter(pool_connections=pool_connections,
+                              pool_maxsize=pool_maxsize,
+                              pool_block=pool_block)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+class Toggl(BaseToggl):
     """
     Class to collect all Toggl objects in one place.
 
     Ensures easy authentication, since API credentials only need to be provided
     upon instantiation.
+
+    A client is thread-safe: one instance, with its connection pool, rate
+    limiter, retry policy, cache and hooks, can be shared by any number of
+    worker threads calling any of its resources. Configure it, including its
+    `hooks` list, before sharing it; size `pool_maxsize` to the number of
+    threads so that each can keep a connection open.
     """
-    def __init__(self, api_token, base_url=BASE_URL, version=API_VERSION):
+    Reports = resource(Reports)
+
+    def __init__(self, api_token, base_url=BASE_URL, version=API_VERSION,
+                 pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                 pool_block=False, keep_alive=True, rate_limiter=None,
+                 retry=None, cache=None, models=False, hooks=(),
+                 transport=None, session=None,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), coalesce=False,
+                 codec=None):
         """
         Initializes the Toggl client object.
 
@@ -255,77 +510,396 @@ class Toggl(object):
                 `https://www.toggl.com/api`.
             version (str): The version of the API. Used to compile the full
                 URL. Defaults to `v8`.
+            pool_connections (int): The number of per-host connection pools
+                to cache. Defaults to 10.
+            pool_maxsize (int): The maximum number of connections kept open
+                to a single host. Defaults to 10.
+            pool_block (bool): If True, requests wait for a free connection
+                instead of opening a throwaway one once `pool_maxsize`
+                connections to a host are busy. Defaults to False.
+            keep_alive (bool): If False, connections are closed after every
+                request instead of being reused. Defaults to True.
+            rate_limiter (TokenBucket, optional): Schedules every request made
+                through this client, and is held back by the Retry-After
+                header of 429 responses, which are then re-sent. See
+                :class:`togglwrapper.ratelimit.TokenBucket`. Defaults to None,
+                which sends requests as soon as they are made.
+            retry (RetryPolicy, optional): Re-sends requests that failed with
+                a transient error. See :class:`togglwrapper.retry.RetryPolicy`.
+                Defaults to None, which never retries.
+            cache (ResponseCache, optional): Answers repeated GETs locally.
+                See :class:`togglwrapper.cache.ResponseCache`. Defaults to
+                None, which sends every GET.
+            models (bool): If True, time entries, projects, clients, tasks,
+                tags, workspaces and users are returned as compact
+                :mod:`togglwrapper.models` records instead of dicts. They are
+                converted from the decoded response. Defaults to False.
+            hooks (iterable of Hook, optional): Notified before and after
+                every request attempt. See :mod:`togglwrapper.hooks`.
+                Defaults to none.
+            transport (requests.adapters.BaseAdapter, optional): Sends the
+                requests instead of a pooled `HTTPAdapter`, e.g. a
+                :class:`togglwrapper.transport.ReplayAdapter`. The pool
+                options are then ignored. Defaults to None.
+            session (requests.Session, optional): Sends the requests through
+                this session instead of building one, e.g. to share a
+                connection pool between clients of different tokens as
+                :class:`togglwrapper.pool.TogglPool` does. The token of this
+                client is sent with each request, and the pool options and
+                transport are ignored. Defaults to None.
+            timeout (float or tuple, optional): The seconds to wait for a
+                connection and then for each read of the response, as a
+                (connect, read) tuple or one number for both. Can be
+                overridden per call, and is lowered to the time left before
+                a :class:`togglwrapper.deadline.Deadline`. None waits
+                forever. Defaults to (10, 60).
+            coalesce (bool): If True, a GET made while an identical one is
+                in flight shares its response instead of sending another
+                request. Counters are kept in `single_flight`. See
+                :mod:`togglwrapper.singleflight`. Defaults to False.
+            codec (str or Codec, optional): Encodes request bodies and
+                decodes responses: 'orjson', 'ujson', 'simdjson' or 'json'.
+                See :mod:`togglwrapper.codec`. Defaults to the fastest one
+                installed.
         """
-        self.api_url = '{base}/{version}'.format(base=base_url,
-                                                 version=version)
-        self.auth = HTTPBasicAuth(api_token, 'api_token')
-        self.Clients = Clients(self)
-        self.Dashboard = Dashboard(self)
-        self.Projects = Projects(self)
-        self.ProjectUsers = ProjectUsers(self)
-        self.Tags = Tags(self)
-        self.Tasks = Tasks(self)
-        self.TimeEntries = TimeEntries(self)
-        self.User = User(self)
-        self.Workspaces = Workspaces(self)
-        self.WorkspaceUsers = WorkspaceUsers(self)
-
-    def signups(self, data):
+        super(Toggl, self).__init__(base_url, version)
+        self.reports_url = reports_url(base_url)
+        self.api_token = api_token
+        self.rate_limiter = rate_limiter
+        self.retry = retry
+        self.cache = cache
+        self.models = models
+        self.hooks = list(hooks)
+        self.timeout = timeout
+        self.single_flight = SingleFlight() if coalesce else None
+        self.codec = get_codec(codec)
+        self._session_options = (pool_connections, pool_maxsize, pool_block,
+                                 keep_alive, transport)
+        self._session = session
+        self._session_lock = threading.Lock()
+        self._shares_session = session is not None
+        self._request_auth = self.auth if self._shares_session else None
+
+    @property
+    def auth(self):
+        """ The `requests` auth sending the API token. """
+        from requests.auth import HTTPBasicAuth
+
+        return HTTPBasicAuth(self.api_token, 'api_token')
+
+    @property
+    def session(self):
         """
-        Creates a new user.
+        The pooled requests.Session. Built on first use, so that `requests`
+        is only imported once a request is made.
+        """
+        session = self._session
+        if session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = build_session(*self._session_options,
+                                                  auth=self.auth)
+                session = self._session
+        return session
+
+    def close(self):
+        """
+        Closes all pooled connections held by the client. A shared session
+        is left open for its owner to close.
+        """
+        if self._session is not None and not self._shares_session:
+            self._session.close()
 
-        Args:
-          data (dict): Contains required and optional fields and values.
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _send(self, method, uri, attempt=1, api_url=None, timeout=None,
+              **kwargs):
         """
-        return self.post('/signups', data)
+        Waits for the rate limiter, if any, then sends the request, notifying
+        the hooks of the client.
+        """
+        url = '{base}{uri}'.format(base=api_url or self.api_url, uri=uri)
+        if self._request_auth is not None:
+            kwargs['auth'] = self._request_auth
+        deadline = current_deadline()
+        if not self.hooks:
+            if self.rate_limiter is not None:
+                self._acquire(deadline)
+            kwargs['timeout'] = self._timeout(timeout, deadline)
+            return self.session.request(method, url, **kwargs)
+
+        def send(event):
+            if self.rate_limiter is not None:
+                queued_at = time.perf_counter()
+                self._acquire(deadline)
+                event.queued = time.perf_counter() - queued_at
+            kwargs['headers'] = event.headers
+            kwargs['timeout'] = self._timeout(timeout, deadline)
+            return self.session.request(method, url, **kwargs)
+
+        event = RequestEvent(method, uri, attempt,
+                             dict(kwargs.get('headers') or {}),
+                             body_size(kwargs.get('data')))
+        return send_with_hooks(self.hooks, event, send,
+                               streamed=kwargs.get('stream', False))
+
+    def _acquire(self, deadline):
+        """ Waits for the rate limiter, unless that outlasts the deadline. """
+        if deadline is None:
+            self.rate_limiter.acquire()
+        elif self.rate_limiter.acquire(timeout=deadline.check()) is None:
+            raise DeadlineExceeded(
+                'The rate limiter would hold the request past the deadline.')
+
+    def _timeout(self, timeout, deadline):
+        """
+        Returns the timeout of a request: the given one or the client's,
+        lowered to the time left before the deadline.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if deadline is None:
+            return timeout
+        remaining = deadline.check()
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(remaining if part is None else min(part, remaining)
+                         for part in timeout)
+        return min(timeout, remaining)
+
+    def _request(self, method, uri, **kwargs):
+        """
+        Sends a request for the given URI over the pooled session.
 
-    def reset_token(self):
-        """ Deletes the current API Token and returns a new token. """
-        return self.post('/reset_token')
+        When a rate limiter is set, 429 responses hold the limiter back for
+        the duration of their Retry-After header and the request is re-sent,
+        up to `MAX_THROTTLE_RETRIES` times. When a retry policy is set, other
+        transient failures are re-sent according to that policy.
 
-    @return_json
-    @error_checking
-    def get(self, uri, params=None):
+        Args:
+            method (str): The HTTP method to use.
+            uri (str): The URI/path to append to the full API URL.
+            api_url (str, optional): The API URL to append the URI to
+                instead, e.g. the `reports_url`.
+            timeout (float or tuple, optional): Overrides the client's
+                timeout.
+            **kwargs: Extra keyword arguments passed to
+                `requests.Session.request`.
+        """
+        if self.cache is None or method == 'GET':
+            return self._request_with_retries(method, uri, **kwargs)
+        # Invalidating again once the change is made drops responses that
+        # other threads fetched while it was in flight.
+        self.cache.invalidate(uri)
+        try:
+            return self._request_with_retries(method, uri, **kwargs)
+        finally:
+            self.cache.invalidate(uri)
+
+    def _request_with_retries(self, method, uri, **kwargs):
+        """ Sends a request, re-sending it as the limiter and policy say. """
+        import requests
+
+        retry = self.retry
+        if retry is not None:
+            retry.stats.record_request()
+        attempt = 0
+        throttled = 0
+        sent = 0
+        while True:
+            attempt += 1
+            sent += 1
+            try:
+                response = self._send(method, uri, sent, **kwargs)
+            except requests.ConnectionError as e:
+                self._check_deadline()
+                unsent = _connect_failed(e)
+                if retry is None or not retry.is_retryable(
+                        method, attempt, unsent=unsent):
+                    if retry is not None and retry.is_exhausted(
+                            method, attempt, unsent=unsent):
+                        retry.stats.record_exhausted()
+                    raise
+                self._wait_to_retry(retry, attempt, 'connection')
+                continue
+            except requests.Timeout:
+                self._check_deadline()
+                raise
+
+            status_code = response.status_code
+            if (status_code == 429 and self.rate_limiter is not None and
+                    throttled < MAX_THROTTLE_RETRIES):
+                throttled += 1
+                attempt -= 1
+                wait = parse_retry_after(
+                    response, default=1.0 / self.rate_limiter.rate)
+                self.rate_limiter.defer(wait)
+                # Releases the connection of a streamed response.
+                response.close()
+                continue
+            if retry is None or status_code not in retry.retry_statuses:
+                return response
+            retry_after = parse_retry_after(response, default=0.0)
+            if not retry.is_retryable(method, attempt, status_code,
+                                      retry_after=retry_after):
+                if retry.is_exhausted(method, attempt, status_code):
+                    retry.stats.record_exhausted()
+                return response
+            response.close()
+            self._wait_to_retry(retry, attempt, status_code, retry_after)
+
+    def _check_deadline(self):
+        """ Raises DeadlineExceeded if the current deadline has passed. """
+        deadline = current_deadline()
+        if deadline is not None:
+            deadline.check()
+
+    def _wait_to_retry(self, retry, attempt, cause, minimum=0.0):
+        """ Sleeps for the policy's backoff before re-sending a request. """
+        delay = max(minimum, retry.backoff(attempt))
+        deadline = current_deadline()
+        if deadline is not None and delay >= deadline.check():
+            raise DeadlineExceeded(
+                'A retry in {:.3f}s would start past the deadline.'.format(
+                    delay))
+        retry.stats.record_retry(cause, delay)
+        if delay > 0:
+            retry.sleep(delay)
+
+    @return_models
+    def get(self, uri, params=None, timeout=None):
         """
         GETs to the given URI.
 
+        If the client has a cache, fresh cached responses are returned without
+        a request, and stale ones are revalidated with the server when
+        possible.
+
         Args:
             uri (str): The URI/path to append to the full API URL.
             params (dict, optional): Extra parameters/querystrings to accompany the GET request.
+            timeout (float or tuple, optional): Overrides the client's
+                timeout. Defaults to None.
+        """
+        cache = self.cache
+        if cache is None:
+            return decode_response(check_response(
+                self._get(uri, params, timeout=timeout)), self.codec)
+
+        generation = cache.generation(uri)
+        entry = cache.lookup(uri, params)
+        if entry is not None and entry['fresh']:
+            return entry['data']
+        response = self._get(uri, params, cache.validators(entry), timeout)
+        if response.status_code == 304 and entry is not None:
+            cache.refresh(uri, params, entry, generation)
+            return entry['data']
+        data = decode_response(check_response(response), self.codec)
+        cache.store(uri, params, data, response, generation)
+        return data
+
+    def _get(self, uri, params=None, headers=None, timeout=None):
         """
-        full_uri = '{base}{uri}'.format(base=self.api_url, uri=uri)
-        return requests.get(full_uri, params=params, auth=self.auth)
+        Sends a GET, or when coalescing, waits for an identical one in flight
+        and returns its response.
+        """
+        import requests
+
+        def send():
+            return self._request('GET', uri, params=params, headers=headers,
+                                 timeout=timeout)
+
+        if self.single_flight is None:
+            return send()
+        key = (uri, json.dumps(params, sort_keys=True, default=str),
+               json.dumps(headers, sort_keys=True), timeout)
+        deadline = current_deadline()
+        # A timeout may come from the leader's own deadline or timeout, so
+        # the other callers send the request again rather than share it.
+        return self.single_flight.do(
+            key, send, deadline.check() if deadline is not None else None,
+            unshared=(TimeoutError, requests.Timeout))
+
+    def stream(self, uri, path='', params=None, chunk_size=STREAM_CHUNK_SIZE,
+               timeout=None):
+        """
+        GETs to the given URI, and yields the elements of one array of the
+        JSON response as they are parsed, without holding the whole response
+        in memory. Streamed responses are never cached.
 
+        Args:
+            uri (str): The URI/path to append to the full API URL.
+            path (str, optional): The dotted keys of the array to yield the
+                elements of, e.g. 'data.time_entries'. Defaults to '', the
+                top-level array.
+            params (dict, optional): Extra parameters/querystrings to
+                accompany the GET request.
+            chunk_size (int, optional): The number of bytes read at a time.
+                Defaults to 64 KiB.
+            timeout (float or tuple, optional): Overrides the client's
+                timeout. The read timeout applies to each chunk. Defaults to
+                None.
+        """
+        response = check_response(self._request(
+            'GET', uri, params=params, stream=True, timeout=timeout))
+        model = model_for('{}/{}'.format(uri, path)) if self.models else None
+        try:
+            for item in iter_items(response.iter_content(chunk_size), path,
+                                   encoding=response.encoding or 'utf-8'):
+                if model is not None and isinstance(item, dict):
+                    item = model.from_dict(item)
+                yield item
+        finally:
+            response.close()
+
+    @return_models
     @return_json
     @error_checking
-    def post(self, uri, data=None):
+    def post(self, uri, data=None, headers=None, timeout=None):
         """
         POSTs to the given URI.
 
         Args:
             uri (str): The URI/path to append to the full API URL.
             data (optional): dict, bytes, or file-like object to POST.
+            headers (dict, optional): Extra headers to send, e.g. an
+                'Idempotency-Key'. Defaults to None.
+            timeout (float or tuple, optional): Overrides the client's
+                timeout. Defaults to None.
         """
-        full_uri = '{base}{uri}'.format(base=self.api_url, uri=uri)
-        payload = json.dumps(data) if data is not None else None
-        return requests.post(full_uri, data=payload, auth=self.auth)
+        payload = self.codec.dumps(data) if data is not None else None
+        return self._request('POST', uri, data=payload, headers=headers,
+                             timeout=timeout)
 
+    @return_models
     @return_json
     @error_checking
-    def put(self, uri, data):
+    def put(self, uri, data, timeout=None):
         """
         PUTs to the given URI with a data.
 
         Args:
             uri (str): The URI/path to append to the full API URL.
             data: dict, bytes, or file-like object to PUT.
+            timeout (float or tuple, optional): Overrides the client's
+                timeout. Defaults to None.
         """
-        full_uri = '{base}{uri}'.format(base=self.api_url, uri=uri)
-        payload = json.dumps(data)
-        return requests.put(full_uri, data=payload, auth=self.auth)
+        payload = self.codec.dumps(data)
+        return self._request('PUT', uri, data=payload, timeout=timeout)
 
     @error_checking
-    def delete(self, uri):
-        """ DELETEs to the given URI. """
-        full_uri = '{base}{uri}'.format(base=self.api_url, uri=uri)
-        return requests.delete(full_uri, auth=self.auth)
+    def delete(self, uri, timeout=None):
+        """
+        DELETEs to the given URI.
+
+        Args:
+            uri (str): The URI/path to append to the full API URL.
+            timeout (float or tuple, optional): Overrides the client's
+                timeout. Defaults to None.
+        """
+        return self._request('DELETE', uri, timeout=timeout)
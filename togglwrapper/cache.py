@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.cache
+------------------
+
+A response cache for GET requests. Reference data such as a workspace's
+projects, clients and tags changes rarely, so a :class:`ResponseCache` given
+to :class:`togglwrapper.Toggl` answers repeated GETs locally until they
+expire. Expired entries are revalidated with the server when it sent an ETag
+or Last-Modified validator, and any POST, PUT or DELETE made through the same
+client drops the cached entries of the resource it touched.
+
+Entries are stored in a backend: :class:`MemoryCache` (an in-process LRU) or
+:class:`SQLiteCache` (on disk, shared between processes). A cache holds the
+data of one API token; do not share a backend between tokens.
+"""
+
+import copy
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+
+DEFAULT_TTL = 60
+DEFAULT_MAXSIZE = 256
+
+
+class MemoryCache(object):
+    """ A thread-safe in-memory backend evicting the least recently used. """
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        """
+        Args:
+            maxsize (int): The maximum number of entries kept. Defaults to 256.
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+
+class SQLiteCache(object):
+    """ A backend storing entries as JSON in an SQLite database file. """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The database file. Created if it doesn't exist.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS entries '
+                '(key TEXT PRIMARY KEY, entry TEXT NOT NULL)')
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT entry FROM entries WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key, entry):
+        encoded = json.dumps(entry)
+        with self._lock, self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO entries (key, entry) VALUES (?, ?)',
+                (key, encoded))
+
+    def delete(self, key):
+        with self._lock, self._connection:
+            self._connection.execute('DELETE FROM entries WHERE key = ?',
+                                     (key,))
+
+    def keys(self):
+        with self._lock:
+            rows = self._connection.execute('SELECT key FROM entries')
+            return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def _segments(uri):
+    """ Returns the path segments of a URI, without its querystring. """
+    return [segment for segment in uri.split('?')[0].split('/') if segment]
+
+
+class ResponseCache(object):
+    """ Decides what to cache for how long, on top of a backend. """
+    def __init__(self, backend=None, ttl=DEFAULT_TTL, ttls=None,
+                 clock=time.time):
+        """
+        Args:
+            backend (optional): Where entries are stored. Defaults to a new
+                :class:`MemoryCache`.
+            ttl (float): Seconds a response stays fresh. Defaults to 60.
+            ttls (dict, optional): Per-resource freshness, mapping URI
+                prefixes (e.g. '/workspaces') to seconds. The longest matching
+                prefix wins; a TTL of 0 disables caching. Defaults to None.
+            clock (callable, optional): Returns the current time in seconds.
+                Defaults to `time.time`.
+        """
+        self.backend = backend if backend is not None else MemoryCache()
+        self.ttl = ttl
+        self.ttls = dict(ttls or {})
+        self.clock = clock
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(uri, params=None):
+        """ Returns the cache key of a GET for the URI and params. """
+        if params:
+            params = sorted((key, value) for key, value in params.items()
+                            if value is not None)
+        if not params:
+            return uri
+        return '{uri}?{query}'.format(uri=uri, query=urlencode(params))
+
+    def ttl_for(self, uri):
+        """ Returns the freshness lifetime of responses for the URI. """
+        prefixes = [prefix for prefix in self.ttls if uri.startswith(prefix)]
+        if not prefixes:
+            return self.ttl
+        return self.ttls[max(prefixes, key=len)]
+
+    def generation(self, uri):
+        """
+        Returns a token that changes whenever a resource of the URI is
+        invalidated. Take it before sending a GET and pass it on to
+        :meth:`store`, so that a response fetched while the resource was
+        being changed is not cached.
+        """
+        with self._lock:
+            return self._generation(uri)
+
+    def _generation(self, uri):
+        return tuple(self._generations.get(segment, 0)
+                     for segment in _segments(uri))
+
+    def lookup(self, uri, params=None):
+        """
+        Returns the stored entry for a GET, or None.
+
+        The entry is a dict with the decoded response under 'data', whether it
+        is still 'fresh', and any 'etag' or 'last_modified' validators.
+        """
+        entry = self.backend.get(self.key(uri, params))
+        if entry is None:
+            return None
+        entry = copy.deepcopy(entry)
+        entry['fresh'] = entry['expires'] > self.clock()
+        return entry
+
+    def validators(self, entry):
+        """ Returns the conditional request headers for a stored entry. """
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, uri, params, data, response, generation=None):
+        """
+        Stores the decoded data of a successful GET, unless the resource was
+        invalidated since the given :meth:`generation` was taken.
+        """
+        ttl = self.ttl_for(uri)
+        if ttl <= 0:
+            return
+        self._set(uri, params, generation, {
+            'data': copy.deepcopy(data),
+            'expires': self.clock() + ttl,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        })
+
+    def refresh(self, uri, params, entry, generation=None):
+        """ Marks a stored entry fresh again after a 304 Not Modified. """
+        entry = dict(entry, data=copy.deepcopy(entry['data']))
+        entry.pop('fresh', None)
+        entry['expires'] = self.clock() + self.ttl_for(uri)
+        self._set(uri, params, generation, entry)
+
+    def _set(self, uri, params, generation, entry):
+        with self._lock:
+            if generation is None or generation == self._generation(uri):
+                self.backend.set(self.key(uri, params), entry)
+
+    def invalidate(self, uri):
+        """
+        Drops every entry of the resource changed by a request to the URI.
+
+        A change to e.g. '/clients/42' drops '/clients', '/clients/42/...'
+        and also child lists such as '/workspaces/7/clients'.
+        """
+        segments = _segments(uri)
+        if not segments:
+            return
+        resource = segments[0]
+        with self._lock:
+            self._generations[resource] = (
+                self._generations.get(resource, 0) + 1)
+            for key in self.backend.keys():
+                if resource in _segments(key):
+                    self.backend.delete(key)
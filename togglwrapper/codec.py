@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.codec
+------------------
+
+JSON encoding of request bodies and decoding of responses. A :class:`Codec`
+works on bytes: it decodes raw response bodies without first decoding them
+to text, and encodes request bodies straight to bytes.
+
+By default :class:`togglwrapper.Toggl` uses the fastest JSON library
+installed: orjson, then ujson, then simdjson, falling back to the standard
+library. Install one with ``pip install togglwrapper[fast]``, or choose one
+with ``Toggl(..., codec='ujson')``.
+"""
+
+import json
+
+
+PREFERRED = ('orjson', 'ujson', 'simdjson', 'json')
+
+
+class Codec(object):
+    """
+    A pair of functions encoding Python data to JSON bytes, and decoding it
+    back from bytes.
+
+    Attributes:
+        name (str): The name of the JSON library used.
+    """
+    def __init__(self, name, dumps, loads):
+        """
+        Args:
+            name (str): The name of the JSON library used.
+            dumps (callable): Returns the JSON bytes of the given data.
+            loads (callable): Returns the data of the given JSON bytes.
+                Raises ValueError on invalid JSON.
+        """
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return '<Codec {}>'.format(self.name)
+
+
+def _orjson():
+    import orjson
+
+    def dumps(data):
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return Codec('orjson', dumps, orjson.loads)
+
+
+def _ujson():
+    import ujson
+
+    def dumps(data):
+        return ujson.dumps(data, ensure_ascii=False).encode('utf-8')
+    return Codec('ujson', dumps, ujson.loads)
+
+
+def _simdjson():
+    import simdjson
+
+    # simdjson only parses; it encodes with the standard library.
+    return Codec('simdjson', _stdlib_dumps, simdjson.loads)
+
+
+def _stdlib_dumps(data):
+    return json.dumps(data, ensure_ascii=False,
+                      separators=(',', ':')).encode('utf-8')
+
+
+def _stdlib():
+    return Codec('json', _stdlib_dumps, json.loads)
+
+
+_FACTORIES = {
+    'orjson': _orjson,
+    'ujson': _ujson,
+    'simdjson': _simdjson,
+    'json': _stdlib,
+}
+_default = None
+
+
+def get_codec(codec=None):
+    """
+    Returns a codec.
+
+    Args:
+        codec (str or Codec, optional): A codec, or the name of a JSON
+            library: 'orjson', 'ujson', 'simdjson' or 'json'. Defaults to
+            None, the fastest one installed.
+
+    Raises:
+        ImportError: If the named library is not installed.
+    """
+    global _default
+
+    if isinstance(codec, Codec):
+        return codec
+    if codec is not None:
+        if codec not in _FACTORIES:
+            raise ValueError('Unknown JSON codec: {!r}'.format(codec))
+        return _FACTORIES[codec]()
+    if _default is None:
+        for name in PREFERRED:
+            try:
+                _default = _FACTORIES[name]()
+            except ImportError:
+                continue
+            break
+    return _default
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.columnar
+---------------------
+
+A column-oriented container for time entries, for reporting and analytics.
+
+:class:`TimeEntryColumns` keeps each field of a batch of time entries in its
+own typed array: IDs, durations and timestamps as 64-bit integers, and
+descriptions and tags dictionary-encoded as integer codes into a table of
+distinct values. It can be built up from successive ``TimeEntries.get``
+batches, sums durations by project, client, workspace, tag, description or
+day without going back to the entries, and exports to NumPy or Arrow when
+those packages are installed. With NumPy installed, the sums are vectorised
+over the columns instead of looping over the entries in Python.
+"""
+
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+
+from .utils import parse_datetime
+
+
+# Stored for absent IDs and times, e.g. a time entry without a project.
+MISSING = 0
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+SECONDS_PER_DAY = 86400
+
+
+def _epoch(value):
+    """ Returns the epoch seconds of an ISO 8601 string, or MISSING. """
+    if not value:
+        return MISSING
+    return int((parse_datetime(value) - EPOCH).total_seconds())
+
+
+def _numpy():
+    """ Returns the numpy module, or None if it is not installed. """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class Dictionary(object):
+    """ Assigns a stable integer code to every distinct value. """
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, value):
+        """ Returns the code of the value, adding it if it is new. """
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class TimeEntryColumns(object):
+    """
+    Time entries stored as typed columns.
+
+    Attributes:
+        ids, wids, pids, tids, uids (array of int64): The object IDs, with
+            MISSING (0) where absent.
+        durations (array of int64): Durations in seconds. Running entries
+            keep Toggl's negative duration; see :meth:`elapsed`.
+        starts, stops (array of int64): Epoch seconds, with MISSING (0)
+            where absent.
+        billable (array of int8): 1 for billable entries, otherwise 0.
+        description_codes (array of int64): Codes into `descriptions`.
+        descriptions (Dictionary): The distinct descriptions.
+        tag_codes (array of int64): The codes into `tags` of every entry's
+            tags, one entry after the other.
+        tag_offsets (array of int64): Where each entry's tags start in
+            `tag_codes`: entry i has the codes from tag_offsets[i] up to
+            tag_offsets[i + 1].
+        tags (Dictionary): The distinct tags.
+    """
+    INT_COLUMNS = ('ids', 'wids', 'pids', 'tids', 'uids', 'durations',
+                   'starts', 'stops', 'description_codes')
+
+    def __init__(self, entries=None):
+        """
+        Args:
+            entries (iterable, optional): Time entries to add, as dicts or
+                :class:`togglwrapper.models.TimeEntry` records.
+        """
+        for name in self.INT_COLUMNS:
+            setattr(self, name, array('q'))
+        self.billable = array('b')
+        self.tag_codes = array('q')
+        self.tag_offsets = array('q', [0])
+        self.descriptions = Dictionary()
+        self.tags = Dictionary()
+        if entries is not None:
+            self.extend(entries)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, entry):
+        """ Adds one time entry, as a dict or TimeEntry record. """
+        get = entry.get
+        self.ids.append(get('id') or MISSING)
+        self.wids.append(get('wid') or MISSING)
+        self.pids.append(get('pid') or MISSING)
+        self.tids.append(get('tid') or MISSING)
+        self.uids.append(get('uid') or MISSING)
+        self.durations.append(get('duration') or 0)
+        self.starts.append(_epoch(get('start')))
+        self.stops.append(_epoch(get('stop')))
+        self.billable.append(1 if get('billable') else 0)
+        self.description_codes.append(
+            self.descriptions.encode(get('description') or ''))
+        for tag in get('tags') or ():
+            if tag:
+                self.tag_codes.append(self.tags.encode(tag))
+        self.tag_offsets.append(len(self.tag_codes))
+
+    def extend(self, entries):
+        """
+        Adds a batch of time entries, e.g. the result of
+        ``TimeEntries.get(start_date, end_date)``.
+        """
+        for entry in entries:
+            self.append(entry)
+        return self
+
+    def elapsed(self, now=None):
+        """
+        Returns the tracked seconds of every entry as an int64 array, working
+        out the time so far of running entries.
+
+        Args:
+            now (float, optional): The current epoch time in seconds.
+                Defaults to `time.time()`.
+        """
+        now = int(time.time() if now is None else now)
+        # Running entries have a duration of minus their start epoch.
+        return array('q', [duration if duration >= 0 else now + duration
+                           for duration in self.durations])
+
+    def group_sum(self, by, project_clients=None, utc_offset=0, now=None):
+        """
+        Returns the tracked seconds summed per group.
+
+        Args:
+            by (str): What to group by: 'project', 'workspace', 'client',
+                'user', 'task', 'description', 'tag' or 'day'. With 'tag', an
+                entry counts towards each of its tags; entries without tags are
+                not counted.
+            project_clients (dict, optional): Maps project IDs to client IDs.
+                Required to group by 'client', since time entries don't carry
+                their client. Defaults to None.
+            utc_offset (int, optional): Seconds to add to start times before
+                taking the day, to group by local days. Defaults to 0.
+            now (float, optional): The current epoch time, for running
+                entries. Defaults to `time.time()`.
+
+        Returns:
+            dict: Maps each group (an ID, description, tag or
+                datetime.date) to the summed seconds. Entries whose group ID
+                is missing are summed under MISSING (0).
+        """
+        numpy = _numpy() if len(self) else None
+        if numpy is None:
+            elapsed = self.elapsed(now)
+        else:
+            durations = numpy.frombuffer(self.durations, dtype=numpy.int64)
+            elapsed = numpy.where(
+                durations >= 0, durations,
+                int(time.time() if now is None else now) + durations)
+        sums = {}
+        if by == 'tag':
+            if numpy is not None:
+                # Every entry's seconds, repeated once per tag it has.
+                counts = numpy.diff(numpy.frombuffer(self.tag_offsets,
+                                                     dtype=numpy.int64))
+                tag_sums = numpy.bincount(
+                    numpy.frombuffer(self.tag_codes, dtype=numpy.int64),
+                    weights=numpy.repeat(elapsed, counts),
+                    minlength=len(self.tags))
+                return dict(zip(self.tags.values,
+                                tag_sums.astype(numpy.int64).tolist()))
+            tag_codes, offsets = self.tag_codes, self.tag_offsets
+            values = self.tags.values
+            for index, seconds in enumerate(elapsed):
+                for position in range(offsets[index], offsets[index + 1]):
+                    tag = values[tag_codes[position]]
+                    sums[tag] = sums.get(tag, 0) + seconds
+            return sums
+
+        if by == 'day':
+            if numpy is not None:
+                days = (numpy.frombuffer(self.starts, dtype=numpy.int64) +
+                        utc_offset) // SECONDS_PER_DAY
+            else:
+                days = [(start + utc_offset) // SECONDS_PER_DAY
+                        for start in self.starts]
+            code_sums = self._sum_by(days, elapsed, numpy)
+            return dict(((EPOCH + timedelta(days=day)).date(), seconds)
+                        for day, seconds in code_sums.items())
+        if by == 'description':
+            code_sums = self._sum_by(self.description_codes, elapsed, numpy)
+            values = self.descriptions.values
+            return dict((values[code], seconds)
+                        for code, seconds in code_sums.items())
+        if by == 'client':
+            if project_clients is None:
+                raise ValueError("Grouping by 'client' needs project_clients.")
+            project_sums = self._sum_by(self.pids, elapsed, numpy)
+            for pid, seconds in project_sums.items():
+                cid = project_clients.get(pid) or MISSING
+                sums[cid] = sums.get(cid, 0) + seconds
+            return sums
+
+        columns = {'project': self.pids, 'workspace': self.wids,
+                   'user': self.uids, 'task': self.tids}
+        if by not in columns:
+            raise ValueError('Cannot group by {!r}.'.format(by))
+        return self._sum_by(columns[by], elapsed, numpy)
+
+    @staticmethod
+    def _sum_by(keys, values, numpy=None):
+        if numpy is not None:
+            if isinstance(keys, array):
+                keys = numpy.frombuffer(keys, dtype=numpy.int64)
+            groups, inverse = numpy.unique(keys, return_inverse=True)
+            group_sums = numpy.bincount(inverse.ravel(), weights=values,
+                                        minlength=len(groups))
+            return dict(zip(groups.tolist(),
+                            group_sums.astype(numpy.int64).tolist()))
+        sums = {}
+        get = sums.get
+        for key, value in zip(keys, values):
+            sums[key] = get(key, 0) + value
+        return sums
+
+    def to_numpy(self):
+        """
+        Returns the columns as a dict of NumPy arrays, without copying the
+        integer columns. Descriptions and tags stay dictionary-encoded.
+
+        Requires `numpy`.
+        """
+        import numpy
+
+        columns = dict((name, numpy.frombuffer(getattr(self, name),
+                                               dtype=numpy.int64))
+                       for name in self.INT_COLUMNS)
+        columns['billable'] = numpy.frombuffer(self.billable,
+                                               dtype=numpy.int8)
+        columns['tag_codes'] = numpy.frombuffer(self.tag_codes,
+                                                dtype=numpy.int64)
+        columns['tag_offsets'] = numpy.frombuffer(self.tag_offsets,
+                                                  dtype=numpy.int64)
+        columns['descriptions'] = numpy.array(self.descriptions.values,
+                                              dtype=object)
+        columns['tags'] = numpy.array(self.tags.values, dtype=object)
+        return columns
+
+    def to_arrow(self):
+        """
+        Returns the entries as a pyarrow.Table, with dictionary-encoded
+        descriptions and a list of dictionary-encoded tags per entry.
+
+        Requires `pyarrow`.
+        """
+        import pyarrow
+
+        def ints(values):
+            return pyarrow.array(values, type=pyarrow.int64())
+
+        def times(values):
+            return pyarrow.array(
+                [value if value != MISSING else None for value in values],
+                type=pyarrow.timestamp('s', tz='UTC'))
+
+        descriptions = pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(self.description_codes, type=pyarrow.int32()),
+            pyarrow.array(self.descriptions.values, type=pyarrow.string()))
+        tags = pyarrow.ListArray.from_arrays(
+            pyarrow.array(self.tag_offsets, type=pyarrow.int32()),
+            pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array(self.tag_codes, type=pyarrow.int32()),
+                pyarrow.array(self.tags.values, type=pyarrow.string())))
+        return pyarrow.table({
+            'id': ints(self.ids),
+            'wid': ints(self.wids),
+            'pid': ints(self.pids),
+            'tid': ints(self.tids),
+            'uid': ints(self.uids),
+            'duration': ints(self.durations),
+            'start': times(self.starts),
+            'stop': times(self.stops),
+            'billable': pyarrow.array([bool(flag) for flag in self.billable]),
+            'description': descriptions,
+            'tags': tags,
+        })
+
+    def to_parquet(self, path):
+        """ Writes the entries to a Parquet file. Requires `pyarrow`. """
+        import pyarrow.parquet
+
+        pyarrow.parquet.write_table(self.to_arrow(), path)
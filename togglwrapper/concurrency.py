@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.concurrency
+------------------------
+
+Helpers to run many independent API calls at once on a bounded thread pool.
+Failures are collected per item instead of aborting the whole batch.
+"""
+
+from .deadline import bind
+from .ratelimit import TokenBucket
+
+
+DEFAULT_MAX_WORKERS = 8
+
+
+class BulkResult(object):
+    """
+    The outcome of a batch of calls.
+
+    Attributes:
+        results (dict): Maps the key of every call that succeeded to its
+            return value.
+        errors (dict): Maps the key of every call that failed to the
+            exception it raised.
+        data (list): For bulk operations returning objects, the 'data'
+            arrays of the successful calls merged in call order.
+    """
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+        self.data = []
+
+    @property
+    def ok(self):
+        """ True if no call failed. """
+        return not self.errors
+
+    def __repr__(self):
+        return '<BulkResult results={} errors={}>'.format(
+            len(self.results), len(self.errors))
+
+
+def run_concurrently(calls, max_workers=DEFAULT_MAX_WORKERS, rate=None):
+    """
+    Runs the given calls on a thread pool and collects their outcomes.
+
+    Args:
+        calls (iterable): (key, callable) pairs. Each callable is called
+            without arguments; keys must be unique and hashable.
+        max_workers (int): The maximum number of calls running at once.
+            Defaults to 8.
+        rate (float, optional): The maximum number of calls started per
+            second, on top of any rate limiter of the client. Defaults to None,
+            which starts calls as soon as a worker is free.
+
+    Returns:
+        BulkResult: The return values and exceptions, keyed by call key.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    limiter = TokenBucket(rate=rate) if rate else None
+
+    def call(func):
+        if limiter is not None:
+            limiter.acquire()
+        return func()
+
+    result = BulkResult()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [(key, executor.submit(bind(call), func))
+                   for key, func in calls]
+        for key, future in futures:
+            try:
+                result.results[key] = future.result()
+            except Exception as e:
+                result.errors[key] = e
+    return result
+
+
+def run_pipelined(calls, on_done, max_workers=DEFAULT_MAX_WORKERS, rate=None):
+    """
+    Runs calls from a possibly endless iterable on a thread pool, keeping at
+    most `max_workers` calls in flight, so memory stays bounded however many
+    calls there are.
+
+    Args:
+        calls (iterable): (key, callable) pairs, consumed lazily.
+        on_done (callable): Called as on_done(key, result, error) in the
+            calling thread as each call finishes; error is None on success.
+        max_workers (int): The maximum number of calls running at once.
+            Defaults to 8.
+        rate (float, optional): The maximum number of calls started per
+            second. Defaults to None.
+    """
+    from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+    limiter = TokenBucket(rate=rate) if rate else None
+
+    def call(func):
+        if limiter is not None:
+            limiter.acquire()
+        return func()
+
+    def finish(done):
+        for future in done:
+            key = in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                on_done(key, None, e)
+            else:
+                on_done(key, result, None)
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for key, func in calls:
+            if len(in_flight) >= max_workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                finish(done)
+            in_flight[executor.submit(bind(call), func)] = key
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            finish(done)
+
+
+def iter_ordered(calls, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Runs calls from an iterable on a thread pool, keeping at most
+    `max_workers` in flight, and yields their results in call order as soon
+    as each is available. The first exception raised by a call is raised
+    when its turn comes, and the calls not yet started are cancelled.
+
+    Args:
+        calls (iterable of callables): Called without arguments, consumed
+            lazily.
+        max_workers (int): The maximum number of calls running at once.
+            Defaults to 8.
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for func in calls:
+                if len(pending) >= max_workers:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(bind(func)))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def chunk_ids(ids, max_length):
+    """
+    Splits IDs into groups whose comma-separated form fits in max_length
+    characters.
+
+    Args:
+        ids (iterable of ints): The IDs to split.
+        max_length (int): The maximum length of each joined group.
+
+    Returns:
+        list of tuples: The groups of IDs, in the original order.
+    """
+    chunks = []
+    chunk = []
+    length = 0
+    for id in ids:
+        id_length = len(str(id))
+        added = id_length + (1 if chunk else 0)
+        if chunk and length + added > max_length:
+            chunks.append(tuple(chunk))
+            chunk, length, added = [], 0, id_length
+        if id_length > max_length:
+            raise ValueError('The ID {} does not fit in a URL.'.format(id))
+        chunk.append(id)
+        length += added
+    if chunk:
+        chunks.append(tuple(chunk))
+    return chunks
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.deadline
+---------------------
+
+A time budget shared by every request of a compound operation::
+
+    with Deadline(10):
+        toggl.ProjectUsers.get_for_project(42)
+        toggl.Workspaces.get_many_children(wids)
+
+Within the block, each request a :class:`togglwrapper.Toggl` client makes in
+this thread, or a :class:`togglwrapper.aio.AsyncToggl` client makes in this
+coroutine, only gets the time left: its connect and read timeouts are lowered
+to it, waits for the rate limiter or a retry that would outlast it are
+skipped, and once it has run out :class:`DeadlineExceeded` is raised instead
+of sending. The helpers running calls on worker threads carry the
+deadline over to them, so calls not yet started when it passes fail
+straight away.
+"""
+
+import time
+from contextvars import ContextVar
+
+from .exceptions import DeadlineExceeded
+
+
+# The deadlines entered in the current context. A ContextVar rather than a
+# thread local, so that coroutines interleaved on one thread, each running in
+# its own context, don't see each other's deadlines.
+_active = ContextVar('togglwrapper_deadlines', default=())
+
+
+def current():
+    """
+    Returns the soonest deadline active in this thread or coroutine, or None.
+    """
+    active = _active.get()
+    if not active:
+        return None
+    return min(active, key=lambda deadline: deadline.expires)
+
+
+def bind(func):
+    """
+    Returns the function wrapped to run under the calling thread's deadline,
+    for handing over to another thread. Once the deadline has passed, the
+    wrapper raises :class:`DeadlineExceeded` without calling the function.
+    """
+    deadline = current()
+    if deadline is None:
+        return func
+
+    def bound(*args, **kwargs):
+        token = _active.set(_active.get() + (deadline,))
+        try:
+            deadline.check()
+            return func(*args, **kwargs)
+        finally:
+            _active.reset(token)
+    return bound
+
+
+class Deadline(object):
+    """
+    A point in time by which requests must complete. Use it as a context
+    manager; nested deadlines can only shorten the time left.
+    """
+    def __init__(self, seconds, clock=time.monotonic):
+        """
+        Args:
+            seconds (float): The time budget, from now.
+            clock (callable, optional): Returns the current time in seconds.
+                Defaults to `time.monotonic`.
+        """
+        self.clock = clock
+        self.expires = clock() + seconds
+
+    def remaining(self):
+        """ Returns the seconds left, or 0 once the deadline has passed. """
+        return max(0.0, self.expires - self.clock())
+
+    @property
+    def expired(self):
+        """ True once the deadline has passed. """
+        return self.clock() >= self.expires
+
+    def check(self):
+        """
+        Returns the seconds left, or raises :class:`DeadlineExceeded` if the
+        deadline has passed.
+        """
+        remaining = self.expires - self.clock()
+        if remaining <= 0:
+            raise DeadlineExceeded('The deadline passed {:.3f}s ago.'.format(
+                -remaining))
+        return remaining
+
+    def __enter__(self):
+        _active.set(_active.get() + (self,))
+        return self
+
+    def __exit__(self, *exc_info):
+        # Removes this deadline, not whichever was entered last: blocks
+        # suspended in generators don't always exit in order.
+        active = _active.get()
+        index = len(active) - 1 - active[::-1].index(self)
+        _active.set(active[:index] + active[index + 1:])
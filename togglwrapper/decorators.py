@@ -10,15 +10,70 @@ methods, and ensure errors in the responses are raised as exceptions.
 
 from functools import wraps
 
+from . import models
 from .exceptions import AuthError
 
 
+def check_response(response):
+    """
+    Raises exceptions if the response did not return a successful status.
+
+    403 raises :class:`togglwrapper.exceptions.AuthError`; any other error
+    status raises a `requests.exceptions.HTTPError`. The body is only decoded
+    when the request failed, in which case the decoded error message is
+    attached to the response as its reason. Works on both requests and httpx
+    responses.
+    """
+    # Status code of 403 Forbidden means incorrect API token/wrong auth
+    if response.status_code == 403:
+        raise AuthError('Incorrect API token.')
+    if response.status_code >= 400:
+        from requests.exceptions import HTTPError
+
+        try:
+            response.reason = response.json()
+        except ValueError:
+            # httpx responses name it reason_phrase.
+            response.reason = getattr(response, 'reason', None) or getattr(
+                response, 'reason_phrase', None)
+        kind = 'Client' if response.status_code < 500 else 'Server'
+        message = '{code} {kind} Error: {reason} for url: {url}'.format(
+            code=response.status_code, kind=kind, reason=response.reason,
+            url=response.url)
+        raise HTTPError(message, response=response)
+    return response
+
+
+def decode_response(response, codec=None):
+    """
+    Returns the decoded JSON content of a requests or httpx response. With a
+    codec (see :mod:`togglwrapper.codec`), the raw body bytes are decoded by
+    it.
+    """
+    if codec is None:
+        return response.json()
+    return codec.loads(response.content)
+
+
 def return_json(func):
     """ Returns the JSON content of a requests.Response. """
     @wraps(func)
-    def inner(*args, **kwargs):
-        response = func(*args, **kwargs)
-        return response.json()
+    def inner(toggl, *args, **kwargs):
+        return decode_response(func(toggl, *args, **kwargs), toggl.codec)
+    return inner
+
+
+def return_models(func):
+    """
+    Turns the decoded JSON returned by a Toggl request method into models,
+    when the client was created with `models=True`.
+    """
+    @wraps(func)
+    def inner(toggl, uri, *args, **kwargs):
+        data = func(toggl, uri, *args, **kwargs)
+        if toggl.models:
+            return models.decode(uri, data)
+        return data
     return inner
 
 
@@ -26,17 +81,21 @@ def error_checking(func):
     """ Raises exceptions if the response did not return 200 OK. """
     @wraps(func)
     def inner(*args, **kwargs):
-        response = func(*args, **kwargs)
-        # Status code of 403 Forbidden means incorrect API token/wrong auth
-        if response.status_code == 403:
-            raise AuthError('Incorrect API token.')
-        # Raise an HTTPError if status code isn't 200
-        try:
-            reason = response.json()
-        except ValueError:
-            pass
-        else:
-            response.reason = reason
-        response.raise_for_status()
-        return response
+        return check_response(func(*args, **kwargs))
+    return inner
+
+
+def blocking(func):
+    """
+    Marks a resource method that blocks its thread, e.g. by running requests
+    on a thread pool, so that it raises TypeError when the resource belongs
+    to an asynchronous client rather than returning un-awaited coroutines.
+    """
+    @wraps(func)
+    def inner(resource, *args, **kwargs):
+        if resource.toggl.asynchronous:
+            raise TypeError(
+                '{}.{}() blocks, so it cannot be used with an asynchronous '
+                'client.'.format(type(resource).__name__, func.__name__))
+        return func(resource, *args, **kwargs)
     return inner
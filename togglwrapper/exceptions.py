@@ -7,3 +7,14 @@ togglwrapper.exceptions
 
 class AuthError(Exception):
     """ Raised when authentication fails. """
+
+
+class DeadlineExceeded(TimeoutError):
+    """ Raised when a deadline passes before a request could complete. """
+
+
+class TruncatedResponse(Exception):
+    """
+    Raised when Toggl cuts a response off, and the results left out can't be
+    fetched by narrowing the request.
+    """
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.hooks
+------------------
+
+Callbacks around every HTTP request a client sends. Pass hook objects to
+``Toggl(..., hooks=[...])``; each is told when a request is about to be sent
+(``before_request``), when its response arrived (``after_response``) and when
+it failed without a response (``on_error``). Retries and re-sent throttled
+requests are reported as separate attempts.
+
+Subclass :class:`Hook` and override the methods you need, or use
+:class:`togglwrapper.metrics.MetricsCollector` or :class:`OpenTelemetryHook`.
+"""
+
+import re
+import time
+
+
+_ID_SEGMENT = re.compile(r'/\d+(?:,\d+)*(?=/|$)')
+
+
+def endpoint_template(uri):
+    """
+    Returns the URI with its IDs replaced by a placeholder, so that requests
+    to the same endpoint can be grouped, e.g. '/workspaces/{id}/projects'.
+    """
+    return _ID_SEGMENT.sub('/{id}', uri.split('?', 1)[0])
+
+
+def body_size(body):
+    """ Returns the length in bytes of a request body, if known. """
+    if body is None:
+        return 0
+    if isinstance(body, str):
+        return len(body.encode('utf-8'))
+    try:
+        return len(body)
+    except TypeError:
+        return 0
+
+
+def response_size(response, streamed=False):
+    """
+    Returns the length in bytes of a response body. Streamed bodies are not
+    read; their Content-Length is used if the server sent one.
+    """
+    length = response.headers.get('Content-Length')
+    if length is not None and length.isdigit():
+        return int(length)
+    if streamed:
+        return 0
+    return len(response.content)
+
+
+class RequestEvent(object):
+    """
+    One attempt at sending a request, as passed to every hook.
+
+    Hooks may store their own state on the event as extra attributes, and may
+    add to `headers` in `before_request`.
+
+    Attributes:
+        method (str): The HTTP method.
+        uri (str): The URI/path the request is sent to.
+        endpoint (str): The URI with its IDs replaced, see
+            :func:`endpoint_template`.
+        attempt (int): 1 for the first attempt, 2 for the first re-send, etc.
+        headers (dict): The extra headers to send.
+        bytes_out (int): The size of the request body.
+        queued (float): Seconds spent waiting for the rate limiter.
+        elapsed (float): Seconds from sending the request to receiving the
+            response headers, or to the failure.
+        status_code (int): The response status, or None.
+        bytes_in (int): The size of the response body.
+        error (Exception): The exception raised by a failed attempt, or None.
+    """
+    def __init__(self, method, uri, attempt=1, headers=None, bytes_out=0):
+        self.method = method
+        self.uri = uri
+        self.endpoint = endpoint_template(uri)
+        self.attempt = attempt
+        self.headers = headers if headers is not None else {}
+        self.bytes_out = bytes_out
+        self.queued = 0.0
+        self.elapsed = 0.0
+        self.status_code = None
+        self.bytes_in = 0
+        self.error = None
+
+    def __repr__(self):
+        return '<RequestEvent {} {} attempt={}>'.format(
+            self.method, self.endpoint, self.attempt)
+
+
+class Hook(object):
+    """ Base class for request hooks. Every method does nothing by default. """
+    def before_request(self, event):
+        """ Called before the request waits for the rate limiter. """
+
+    def after_response(self, event, response):
+        """ Called once the response headers have been received. """
+
+    def on_error(self, event, error):
+        """ Called when the request failed without a response. """
+
+
+class OpenTelemetryHook(Hook):
+    """
+    Records every request attempt as an OpenTelemetry client span.
+
+    Requires the `opentelemetry-api` package, unless a tracer is given.
+    """
+    def __init__(self, tracer=None):
+        """
+        Args:
+            tracer (optional): The tracer to create spans with. Defaults to
+                the 'togglwrapper' tracer of the global tracer provider.
+        """
+        if tracer is None:
+            from opentelemetry import trace
+            tracer = trace.get_tracer('togglwrapper')
+        self.tracer = tracer
+
+    def before_request(self, event):
+        event.span = self.tracer.start_span(
+            '{} {}'.format(event.method, event.endpoint),
+            attributes={'http.method': event.method,
+                        'http.route': event.endpoint,
+                        'http.request_content_length': event.bytes_out,
+                        'togglwrapper.attempt': event.attempt})
+
+    def after_response(self, event, response):
+        span = event.span
+        span.set_attribute('http.status_code', event.status_code)
+        span.set_attribute('http.response_content_length', event.bytes_in)
+        span.set_attribute('togglwrapper.queued_seconds', event.queued)
+        span.end()
+
+    def on_error(self, event, error):
+        span = event.span
+        span.record_exception(error)
+        span.set_attribute('togglwrapper.queued_seconds', event.queued)
+        span.end()
+
+
+def notify_response(hooks, event, response, elapsed, streamed=False):
+    """ Completes the event with the response, and notifies the hooks. """
+    event.elapsed = elapsed
+    event.status_code = response.status_code
+    event.bytes_in = response_size(response, streamed)
+    for hook in hooks:
+        hook.after_response(event, response)
+
+
+def notify_error(hooks, event, error, elapsed):
+    """ Completes the event with the error, and notifies the hooks. """
+    event.elapsed = elapsed
+    event.error = error
+    for hook in hooks:
+        hook.on_error(event, error)
+
+
+def send_with_hooks(hooks, event, send, streamed=False,
+                    clock=time.perf_counter):
+    """
+    Runs one request attempt, timing it and notifying the hooks.
+
+    Args:
+        hooks (sequence of Hook): The hooks to notify.
+        event (RequestEvent): The attempt being made.
+        send (callable): Called as send(event); waits for the rate limiter,
+            records the queued time on the event and returns the response.
+        streamed (bool): True if the response body is streamed.
+        clock (callable): Returns the current time in seconds.
+    """
+    for hook in hooks:
+        hook.before_request(event)
+    start = clock()
+    try:
+        response = send(event)
+    except Exception as e:
+        notify_error(hooks, event, e, clock() - start - event.queued)
+        raise
+    notify_response(hooks, event, response, clock() - start - event.queued,
+                    streamed)
+    return response
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.metrics
+--------------------
+
+A request hook that keeps per-endpoint statistics: a latency histogram, bytes
+sent and received, response statuses, errors, retries and time spent queued
+behind the rate limiter. Endpoints are grouped by template, e.g.
+``/workspaces/{id}/projects``, so that every workspace counts once.
+
+The statistics can be read with :meth:`MetricsCollector.snapshot` or exported
+in the Prometheus text exposition format with
+:meth:`MetricsCollector.to_prometheus`.
+"""
+
+import threading
+from bisect import bisect_left
+
+from .hooks import Hook
+
+
+# Upper bounds in seconds of the latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+
+class Histogram(object):
+    """ Counts observations into cumulative buckets, Prometheus-style. """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket, plus one for values above the last bound.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """ Returns (upper bound, count) pairs, ending with '+Inf'. """
+        pairs = []
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class EndpointStats(object):
+    """
+    The statistics of one method and endpoint template.
+
+    Attributes:
+        latency (Histogram): Seconds from sending each attempt to its
+            response, excluding time queued.
+        bytes_out (int): Total request body bytes.
+        bytes_in (int): Total response body bytes.
+        statuses (dict): Number of responses per status code.
+        errors (int): Attempts that failed without a response.
+        retries (int): Attempts after the first, including re-sent throttled
+            requests.
+        queued_seconds (float): Total time spent waiting to be sent.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.latency = Histogram(buckets)
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.statuses = {}
+        self.errors = 0
+        self.retries = 0
+        self.queued_seconds = 0.0
+
+    def as_dict(self):
+        return {
+            'count': self.latency.count,
+            'latency_sum': self.latency.sum,
+            'latency_buckets': self.latency.cumulative(),
+            'bytes_out': self.bytes_out,
+            'bytes_in': self.bytes_in,
+            'statuses': dict(self.statuses),
+            'errors': self.errors,
+            'retries': self.retries,
+            'queued_seconds': self.queued_seconds,
+        }
+
+
+def _escape(value):
+    """ Escapes a Prometheus label value. """
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _labels(**labels):
+    return '{' + ','.join('{}="{}"'.format(name, _escape(value))
+                          for name, value in sorted(labels.items())) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsCollector(Hook):
+    """
+    Collects request statistics per endpoint. Thread-safe, so one collector
+    can be shared by several clients::
+
+        metrics = MetricsCollector()
+        toggl = Toggl('api_token', hooks=[metrics])
+        ...
+        print(metrics.to_prometheus())
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS, prefix='toggl'):
+        """
+        Args:
+            buckets (iterable of floats, optional): The upper bounds in
+                seconds of the latency histogram buckets.
+            prefix (str, optional): Prepended to exported metric names.
+                Defaults to 'toggl'.
+        """
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _endpoint(self, event):
+        key = (event.method, event.endpoint)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = EndpointStats(self.buckets)
+        return stats
+
+    def _record(self, event):
+        stats = self._endpoint(event)
+        stats.latency.observe(event.elapsed)
+        stats.bytes_out += event.bytes_out
+        stats.queued_seconds += event.queued
+        if event.attempt > 1:
+            stats.retries += 1
+        return stats
+
+    def after_response(self, event, response):
+        with self._lock:
+            stats = self._record(event)
+            stats.bytes_in += event.bytes_in
+            status = event.status_code
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def on_error(self, event, error):
+        with self._lock:
+            self._record(event).errors += 1
+
+    def reset(self):
+        """ Forgets every statistic collected so far. """
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self):
+        """
+        Returns a consistent copy of the statistics.
+
+        Returns:
+            dict: Maps (method, endpoint template) to a dict of 'count',
+                'latency_sum', 'latency_buckets', 'bytes_out', 'bytes_in',
+                'statuses', 'errors', 'retries' and 'queued_seconds'.
+        """
+        with self._lock:
+            return dict((key, stats.as_dict())
+                        for key, stats in self._stats.items())
+
+    def to_prometheus(self):
+        """ Returns the statistics in the Prometheus text format. """
+        snapshot = sorted(self.snapshot().items())
+        prefix = self.prefix
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help_text))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+
+        def sample(name, labels, value):
+            lines.append('{}_{}{} {}'.format(prefix, name, labels,
+                                             _number(value)))
+
+        family('request_duration_seconds', 'histogram',
+               'Time from sending a request to receiving its response.')
+        for (method, endpoint), stats in snapshot:
+            for bound, count in stats['latency_buckets']:
+                sample('request_duration_seconds_bucket',
+                       _labels(method=method, endpoint=endpoint,
+                               le=_number(bound)), count)
+            labels = _labels(method=method, endpoint=endpoint)
+            sample('request_duration_seconds_sum', labels,
+                   stats['latency_sum'])
+            sample('request_duration_seconds_count', labels, stats['count'])
+
+        family('responses_total', 'counter', 'Responses by status code.')
+        for (method, endpoint), stats in snapshot:
+            for status, count in sorted(stats['statuses'].items()):
+                sample('responses_total',
+                       _labels(method=method, endpoint=endpoint,
+                               status=status), count)
+
+        counters = (
+            ('request_bytes_total', 'bytes_out', 'Request body bytes sent.'),
+            ('response_bytes_total', 'bytes_in',
+             'Response body bytes received.'),
+            ('request_errors_total', 'errors',
+             'Requests that failed without a response.'),
+            ('request_retries_total', 'retries',
+             'Request attempts after the first.'),
+            ('request_queued_seconds_total', 'queued_seconds',
+             'Time requests spent waiting to be sent.'),
+        )
+        for name, field, help_text in counters:
+            family(name, 'counter', help_text)
+            for (method, endpoint), stats in snapshot:
+                sample(name, _labels(method=method, endpoint=endpoint),
+                       stats[field])
+        return '\n'.join(lines) + '\n'
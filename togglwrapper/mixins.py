@@ -12,6 +12,37 @@ allows updating and getting, not deleting or creating). Separating the
 methods out into mixins allows easy mix-and-matching, and re-useability.
 """
 
+import json
+from functools import partial
+
+from .concurrency import (BulkResult, DEFAULT_MAX_WORKERS, chunk_ids,
+                          run_concurrently, run_pipelined)
+from .decorators import blocking
+from .retry import IDEMPOTENCY_HEADER
+
+
+# Many servers and proxies reject URLs longer than this.
+MAX_URL_LENGTH = 2000
+
+
+def _ids_budget(resource, child_uri=None, max_url_length=MAX_URL_LENGTH):
+    """
+    Returns the number of characters left for comma-separated IDs in a URL
+    for the resource, once the API URL, the resource URI and child URI are
+    accounted for.
+    """
+    uri = resource._compile_uri(child_uri=child_uri)
+    prefix = resource.toggl.api_url + uri
+    return max_url_length - len(prefix) - 1
+
+
+def idempotency_key(data):
+    """ Returns a key identifying the given create payload by its content. """
+    import hashlib
+
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
 
 class GetMixin(object):
     """ Mixin to add get methods to a class. """
@@ -51,6 +82,125 @@ class CreateMixin(object):
         uri = self._compile_uri(child_uri=child_uri)
         return self.toggl.post(uri, data)
 
+    # Set to (wrapper key, field) on classes whose create endpoint accepts
+    # comma-separated values of the field, to create many objects at once.
+    multi_create = None
+    multi_create_batch = 100
+
+    @blocking
+    def bulk_create(self, items, child_uri=None, key=idempotency_key,
+                    completed=None, on_progress=None, collect=True,
+                    max_workers=DEFAULT_MAX_WORKERS, rate=None):
+        """
+        Creates any number of new instances.
+
+        Items are read lazily and at most `max_workers` requests are in
+        flight, so memory stays bounded for very large inputs. Where the
+        endpoint can create many objects in one request (see
+        `multi_create`), items differing only in that field are merged.
+
+        Every request carries an 'Idempotency-Key' header derived from its
+        items. Items whose keys are in `completed` are skipped, and the keys
+        of created items are added to it, so a bulk create interrupted part
+        way can be run again without creating duplicates.
+
+        Args:
+            items (iterable of dicts): The data of each object to create.
+            child_uri (str, optional): The URI of the child Object or subpath.
+                Defaults to None.
+            key (callable, optional): Returns the idempotency key of an item.
+                Defaults to a digest of the item's JSON.
+            completed (set, optional): Keys of items already created; updated
+                in place. Defaults to None.
+            on_progress (callable, optional): Called with the number of items
+                created and failed so far, each time a request finishes.
+            collect (bool, optional): If False, created objects are not kept
+                in the result, to bound memory. Defaults to True.
+            max_workers (int, optional): The maximum number of requests in
+                flight at once. Defaults to 8.
+            rate (float, optional): The maximum number of requests started
+                per second. Defaults to None.
+
+        Returns:
+            BulkResult: The created objects in `data` (if collected), and
+                `errors` keyed by the tuple of idempotency keys of each
+                failed request.
+        """
+        result = BulkResult()
+        counts = {'created': 0, 'failed': 0}
+        uri = self._compile_uri(child_uri=child_uri)
+
+        def requests():
+            for keys, data in self._bulk_create_payloads(items, key,
+                                                         completed):
+                headers = {IDEMPOTENCY_HEADER: idempotency_key(sorted(keys))}
+                yield keys, partial(self.toggl.post, uri, data, headers)
+
+        def on_done(keys, created, error):
+            if error is not None:
+                result.errors[keys] = error
+                counts['failed'] += len(keys)
+            else:
+                if completed is not None:
+                    completed.update(keys)
+                counts['created'] += len(keys)
+                if collect:
+                    created = created.get('data', created)
+                    if isinstance(created, list):
+                        result.data.extend(created)
+                    else:
+                        result.data.append(created)
+            if on_progress is not None:
+                on_progress(counts['created'], counts['failed'])
+
+        run_pipelined(requests(), on_done, max_workers=max_workers,
+                      rate=rate)
+        return result
+
+    def _bulk_create_payloads(self, items, key, completed):
+        """
+        Yields (keys, data) for each request of a bulk create, merging items
+        in batches when the endpoint supports multi-create.
+        """
+        batch = []
+        for item in items:
+            item_key = key(item)
+            if completed is not None and item_key in completed:
+                continue
+            if self.multi_create is None:
+                yield (item_key,), item
+                continue
+            batch.append((item_key, item))
+            if len(batch) >= self.multi_create_batch:
+                for payload in self._merge_multi_create(batch):
+                    yield payload
+                batch = []
+        if batch:
+            for payload in self._merge_multi_create(batch):
+                yield payload
+
+    def _merge_multi_create(self, batch):
+        """
+        Merges items that differ only in the multi-create field into one
+        payload with comma-separated values of that field.
+        """
+        wrapper, field = self.multi_create
+        groups = {}
+        order = []
+        for item_key, item in batch:
+            fields = dict(item[wrapper])
+            value = fields.pop(field)
+            group = json.dumps(fields, sort_keys=True)
+            if group not in groups:
+                groups[group] = (fields, [], [])
+                order.append(group)
+            groups[group][1].append(item_key)
+            groups[group][2].append(str(value))
+        for group in order:
+            fields, keys, values = groups[group]
+            data = {wrapper: dict(fields, **{field: ','.join(values)})}
+            yield tuple(keys), data
+
 
 class UpdateMixin(object):
     """ Mixin to add update methods to a class. """
@@ -91,3 +241,127 @@ class DeleteMixin(object):
         if not any((id, ids)):
             raise Exception('Must provide either an ID or an iterable of IDs.')
         return self.toggl.delete(self._compile_uri(id=id, ids=ids))
+
+
+class BulkUpdateMixin(object):
+    """
+    Mixin to update many instances at once, for classes whose update
+    endpoint accepts comma-separated IDs.
+    """
+    @blocking
+    def bulk_update(self, ids, data, child_uri=None,
+                    max_url_length=MAX_URL_LENGTH,
+                    max_workers=DEFAULT_MAX_WORKERS, rate=None):
+        """
+        Updates any number of instances with the same data.
+
+        The IDs are split into chunks short enough for the URL, which are
+        updated concurrently within the client's rate limiter.
+
+        Args:
+            ids (iterable of ints): The IDs of the instances to update.
+            data (dict): The dict of information to update the objects.
+            child_uri (str, optional): The URI/path to append to the object's
+                URI, to update. Defaults to None.
+            max_url_length (int, optional): The maximum length of a request
+                URL. Defaults to 2000.
+            max_workers (int, optional): The maximum number of chunks in
+                flight at once. Defaults to 8.
+            rate (float, optional): The maximum number of chunks started per
+                second. Defaults to None.
+
+        Returns:
+            BulkResult: `results` and `errors` keyed by the tuple of IDs of
+                each chunk, and the merged 'data' arrays of the successful
+                chunks in `data`.
+        """
+        chunks = chunk_ids(ids, _ids_budget(self, child_uri, max_url_length))
+        calls = [(chunk, partial(self.update, ids=chunk, child_uri=child_uri,
+                                 data=data))
+                 for chunk in chunks]
+        result = run_concurrently(calls, max_workers=max_workers, rate=rate)
+        for chunk in chunks:
+            if chunk in result.results:
+                updated = result.results[chunk]
+                if isinstance(updated, dict):
+                    updated = updated.get('data')
+                if isinstance(updated, list):
+                    result.data.extend(updated)
+                elif updated is not None:
+                    result.data.append(updated)
+        return result
+
+
+class BulkDeleteMixin(object):
+    """
+    Mixin to delete many instances at once, for classes whose delete
+    endpoint accepts comma-separated IDs.
+    """
+    @blocking
+    def bulk_delete(self, ids, max_url_length=MAX_URL_LENGTH,
+                    max_workers=DEFAULT_MAX_WORKERS, rate=None):
+        """
+        Deletes any number of instances.
+
+        The IDs are split into chunks short enough for the URL, which are
+        deleted concurrently within the client's rate limiter.
+
+        Args:
+            ids (iterable of ints): The IDs of the instances to delete.
+            max_url_length (int, optional): The maximum length of a request
+                URL. Defaults to 2000.
+            max_workers (int, optional): The maximum number of chunks in
+                flight at once. Defaults to 8.
+            rate (float, optional): The maximum number of chunks started per
+                second. Defaults to None.
+
+        Returns:
+            BulkResult: `results` and `errors` keyed by the tuple of IDs of
+                each chunk.
+        """
+        budget = _ids_budget(self, max_url_length=max_url_length)
+        chunks = chunk_ids(ids, budget)
+        calls = [(chunk, partial(self.delete, ids=chunk)) for chunk in chunks]
+        return run_concurrently(calls, max_workers=max_workers, rate=rate)
+
+
+class ChildrenMixin(object):
+    """
+    Mixin to fetch the child objects of many instances at once.
+
+    Classes list their child getters in `children`, mapping a child name
+    (e.g. 'projects') to the name of the method fetching it for one ID
+    (e.g. 'get_projects').
+    """
+    children = {}
+
+    @blocking
+    def get_many_children(self, ids, children=None,
+                          max_workers=DEFAULT_MAX_WORKERS, rate=None):
+        """
+        Gets the given children of every instance, concurrently.
+
+        Args:
+            ids (iterable of ints): The IDs of the instances.
+            children (iterable of str, optional): The names of the children to
+                get, from the class's `children`. Defaults to all of them.
+            max_workers (int, optional): The maximum number of requests in
+                flight at once. Defaults to 8.
+            rate (float, optional): The maximum number of requests started per
+                second. Defaults to None, meaning no cap besides the client's
+                rate limiter.
+
+        Returns:
+            BulkResult: `results` and `errors` keyed by (id, child) tuples.
+        """
+        if children is None:
+            children = sorted(self.children)
+        unknown = set(children) - set(self.children)
+        if unknown:
+            raise ValueError('Unknown children: {}'.format(
+                ', '.join(sorted(unknown))))
+        calls = [
+            ((id, child), partial(getattr(self, self.children[child]), id))
+            for id in ids for child in children
+        ]
+        return run_concurrently(calls, max_workers=max_workers, rate=rate)
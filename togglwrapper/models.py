@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.models
+-------------------
+
+Compact record classes for Toggl objects. Every model declares its fields in
+``__slots__``, so an instance has no per-object ``__dict__`` and takes a
+fraction of the memory of the equivalent dict. Fields that a model does not
+declare are kept in its ``extra`` dict, so no data is lost.
+
+Pass ``models=True`` to :class:`togglwrapper.Toggl` to get models instead of
+dicts from every endpoint that returns time entries, projects, clients, tasks,
+tags, workspaces or users. Responses are converted after they are decoded:
+each object is replaced by its model in turn, so the decoded dicts are freed
+as the conversion goes, but peak memory is still that of the decoded
+response. To build models while the body is parsed, use the streaming
+methods, e.g. :meth:`togglwrapper.api.TimeEntries.stream`.
+"""
+
+import sys
+
+
+class Model(object):
+    """ Base class for Toggl object records. """
+    __slots__ = ('extra',)
+    fields = ()
+
+    def __init__(self, **values):
+        for field in self.fields:
+            setattr(self, field, values.pop(field, None))
+        self.extra = values or None
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Returns a model holding the values of a decoded JSON object. """
+        return cls(**data)
+
+    def to_dict(self):
+        """ Returns the model as a dict, without unset fields. """
+        data = dict((field, getattr(self, field)) for field in self.fields
+                    if getattr(self, field) is not None)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __getitem__(self, key):
+        if key in self.fields:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        """ Returns a field by name, like dict.get. """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '<{name} id={id}>'.format(name=type(self).__name__,
+                                         id=getattr(self, 'id', None))
+
+
+def _model(name, fields, doc):
+    """ Returns a Model subclass with the given slotted fields. """
+    fields = tuple(fields)
+    return type(name, (Model,), {'__slots__': fields, 'fields': fields,
+                                 '__doc__': doc})
+
+
+_TimeEntry = _model('TimeEntry', (
+    'id', 'guid', 'wid', 'pid', 'tid', 'uid', 'billable', 'start', 'stop',
+    'duration', 'description', 'tags', 'duronly', 'at', 'created_with',
+    'server_deleted_at',
+), None)
+
+
+class TimeEntry(_TimeEntry):
+    """
+    A time entry. A negative duration means the entry is running.
+
+    Descriptions and tags repeat across many entries, so they are interned,
+    and tags are kept as a tuple.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        for field in ('description', 'created_with'):
+            if isinstance(data.get(field), str):
+                data[field] = sys.intern(data[field])
+        if data.get('tags') is not None:
+            data['tags'] = tuple(sys.intern(tag) for tag in data['tags'])
+        return cls(**data)
+
+    def to_dict(self):
+        data = super(TimeEntry, self).to_dict()
+        if self.tags is not None:
+            data['tags'] = list(self.tags)
+        return data
+
+
+Project = _model('Project', (
+    'id', 'guid', 'wid', 'cid', 'name', 'billable', 'is_private', 'active',
+    'template', 'template_id', 'auto_estimates', 'estimated_hours', 'at',
+    'color', 'hex_color', 'rate', 'created_at', 'actual_hours',
+    'server_deleted_at',
+), """ A project. """)
+
+Client = _model('Client', (
+    'id', 'guid', 'wid', 'name', 'notes', 'hrate', 'cur', 'at',
+    'server_deleted_at',
+), """ A client. """)
+
+Task = _model('Task', (
+    'id', 'name', 'pid', 'wid', 'uid', 'estimated_seconds', 'tracked_seconds',
+    'active', 'at', 'server_deleted_at',
+), """ A task. """)
+
+Tag = _model('Tag', (
+    'id', 'guid', 'wid', 'name', 'at', 'server_deleted_at',
+), """ A tag. """)
+
+Workspace = _model('Workspace', (
+    'id', 'name', 'profile', 'premium', 'admin', 'default_hourly_rate',
+    'default_currency', 'only_admins_may_create_projects',
+    'only_admins_see_billable_rates', 'only_admins_see_team_dashboard',
+    'projects_billable_by_default', 'rounding', 'rounding_minutes',
+    'api_token', 'at', 'logo_url', 'ical_url', 'ical_enabled',
+    'server_deleted_at',
+), """ A workspace. """)
+
+_User = _model('User', (
+    'id', 'api_token', 'default_wid', 'email', 'fullname',
+    'jquery_timeofday_format', 'jquery_date_format', 'timeofday_format',
+    'date_format', 'store_start_and_stop_time', 'beginning_of_week',
+    'language', 'image_url', 'sidebar_piechart', 'at', 'created_at',
+    'retention', 'record_timeline', 'render_timeline', 'timeline_enabled',
+    'timeline_experiment', 'new_blog_post', 'send_product_emails',
+    'send_weekly_report', 'send_timer_notifications', 'openid_enabled',
+    'timezone', 'time_entries', 'projects', 'tags', 'workspaces', 'clients',
+    'tasks',
+), None)
+
+
+class User(_User):
+    """ A user. Related data, when requested, is decoded into models too. """
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        for collection, model in RELATED_MODELS.items():
+            if data.get(collection) is not None:
+                data[collection] = [model.from_dict(item)
+                                    for item in data[collection]]
+        return cls(**data)
+
+    def to_dict(self):
+        data = super(User, self).to_dict()
+        for collection in RELATED_MODELS:
+            if data.get(collection) is not None:
+                data[collection] = [item.to_dict()
+                                    for item in data[collection]]
+        return data
+
+
+RELATED_MODELS = {
+    'clients': Client,
+    'projects': Project,
+    'tags': Tag,
+    'tasks': Task,
+    'time_entries': TimeEntry,
+    'workspaces': Workspace,
+}
+
+# Maps the last meaningful URI segment of an endpoint to its model.
+URI_MODELS = dict(RELATED_MODELS, me=User, users=User)
+
+# URI segments naming actions rather than objects, e.g. '/time_entries/start'.
+ACTION_SEGMENTS = frozenset(['current', 'start', 'stop'])
+
+
+def model_for(uri):
+    """
+    Returns the model of the objects returned by an endpoint, or None.
+
+    Args:
+        uri (str): The URI/path of the endpoint, e.g. '/workspaces/7/projects',
+            or the dotted path of a related data collection, e.g.
+            'data.time_entries'.
+    """
+    segments = [segment for segment in uri.replace('.', '/').split('/')
+                if segment and not segment.isdigit() and
+                segment not in ACTION_SEGMENTS and ',' not in segment]
+    if not segments:
+        return None
+    return URI_MODELS.get(segments[-1])
+
+
+def decode(uri, payload):
+    """
+    Returns the decoded JSON of a response with its objects turned into
+    models, if the endpoint returns objects with a model.
+
+    Handles both bare objects and arrays, and those wrapped in 'data'. The
+    payload is converted in place: every object in an array is replaced by
+    its model as soon as it is built, so that its dict can be freed.
+    """
+    model = model_for(uri)
+    if model is None:
+        return payload
+    if isinstance(payload, dict) and 'data' in payload:
+        payload['data'] = _build(model, payload['data'])
+        return payload
+    return _build(model, payload)
+
+
+def _build(model, value):
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            if isinstance(item, dict):
+                value[i] = model.from_dict(item)
+        return value
+    if isinstance(value, dict):
+        return model.from_dict(value)
+    return value
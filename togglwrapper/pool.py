@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.pool
+-----------------
+
+Many API tokens over one connection pool. Toggl throttles each token on its
+own, so an application aggregating many accounts gets the most throughput by
+keeping every token's budget in use at the same time. A :class:`TogglPool`
+holds one :class:`togglwrapper.Toggl` client per token, each with its own
+:class:`togglwrapper.TokenBucket`, all sending through a single pooled
+session, and runs calls across them on one thread pool.
+"""
+
+import threading
+from collections import OrderedDict, deque
+
+from .api import API_VERSION, BASE_URL, POOL_CONNECTIONS, Toggl, build_session
+from .concurrency import BulkResult
+from .deadline import bind
+from .ratelimit import DEFAULT_BURST, DEFAULT_RATE, TokenBucket
+
+
+# Calls mostly wait for their token's bucket, so threads are cheap; this only
+# caps the default for very large pools.
+MAX_WORKERS = 256
+
+
+class TogglPool(object):
+    """
+    A Toggl client per API token, sharing one connection pool.
+
+    Clients are looked up by token, e.g. ``pool['token'].Clients.get()``.
+    The retry policy and hooks given to the pool are shared by every client,
+    so a :class:`togglwrapper.metrics.MetricsCollector` counts the requests
+    of all tokens.
+    """
+    def __init__(self, tokens, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 max_workers=None, base_url=BASE_URL, version=API_VERSION,
+                 pool_connections=POOL_CONNECTIONS, pool_maxsize=None,
+                 pool_block=False, keep_alive=True, retry=None, models=False,
+                 hooks=(), transport=None):
+        """
+        Arguments not listed are those of :class:`togglwrapper.Toggl`.
+
+        Args:
+            tokens (iterable of str): The API tokens.
+            rate (float, optional): Requests per second allowed to each
+                token. Defaults to 1, Toggl's limit. None sends requests
+                as soon as they are made.
+            burst (int, optional): Requests each token may send back-to-back
+                after an idle period. Defaults to 1.
+            max_workers (int, optional): The number of calls run at once by
+                :meth:`run` and :meth:`map`. Defaults to one per token, up to
+                256.
+            pool_maxsize (int, optional): The maximum number of connections
+                kept open to the API. Defaults to `max_workers`.
+            retry (RetryPolicy, optional): Shared by every client.
+            hooks (iterable of Hook, optional): Shared by every client.
+        """
+        self.tokens = list(OrderedDict.fromkeys(tokens))
+        if not self.tokens:
+            raise ValueError('A pool needs at least one token.')
+        self.max_workers = max_workers or min(len(self.tokens), MAX_WORKERS)
+        self.session = build_session(pool_connections,
+                                     pool_maxsize or self.max_workers,
+                                     pool_block, keep_alive, transport)
+        hooks = list(hooks)
+        self.clients = OrderedDict()
+        for token in self.tokens:
+            limiter = TokenBucket(rate, burst) if rate else None
+            self.clients[token] = Toggl(
+                token, base_url=base_url, version=version,
+                rate_limiter=limiter, retry=retry, models=models, hooks=hooks,
+                session=self.session)
+
+    def __getitem__(self, token):
+        return self.clients[token]
+
+    def __len__(self):
+        return len(self.clients)
+
+    def __iter__(self):
+        return iter(self.clients.values())
+
+    def close(self):
+        """ Closes all pooled connections. """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _backlog(self, token, running):
+        """
+        Returns roughly how long a new call for the token would wait for
+        its bucket, counting the calls of it already running.
+        """
+        limiter = self.clients[token].rate_limiter
+        if limiter is None:
+            return running
+        return limiter.delay() + running / limiter.rate
+
+    def run(self, jobs, max_workers=None):
+        """
+        Runs calls across the tokens of the pool and collects their outcomes.
+
+        Calls wait in one queue per token. A free worker takes the next call
+        of the token that can send soonest, given its bucket and its calls
+        already running, so workers don't queue behind one busy token while
+        others have budget left. Tokens that can send equally soon take
+        turns.
+
+        Args:
+            jobs (iterable): (key, token, func) triples. Each func is called
+                with the client of its token; keys must be unique and
+                hashable.
+            max_workers (int, optional): The maximum number of calls running
+                at once. Defaults to the pool's `max_workers`.
+
+        Returns:
+            BulkResult: The return values and exceptions, keyed by call key.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        queues = OrderedDict()
+        for key, token, func in jobs:
+            if token not in self.clients:
+                raise KeyError('Unknown token: {!r}'.format(token))
+            queues.setdefault(token, deque()).append((key, bind(func)))
+        running = dict.fromkeys(queues, 0)
+        lock = threading.Lock()
+        result = BulkResult()
+
+        def next_call():
+            with lock:
+                pending = [token for token, queue in queues.items() if queue]
+                if not pending:
+                    return None
+                token = min(pending, key=lambda token: self._backlog(
+                    token, running[token]))
+                queues.move_to_end(token)
+                running[token] += 1
+                return (token,) + queues[token].popleft()
+
+        def work():
+            while True:
+                call = next_call()
+                if call is None:
+                    return
+                token, key, func = call
+                try:
+                    value = func(self.clients[token])
+                except Exception as e:
+                    with lock:
+                        result.errors[key] = e
+                else:
+                    with lock:
+                        result.results[key] = value
+                finally:
+                    with lock:
+                        running[token] -= 1
+
+        calls = sum(len(queue) for queue in queues.values())
+        workers = min(max_workers or self.max_workers, calls)
+        if workers:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for future in [executor.submit(work)
+                               for _ in range(workers)]:
+                    future.result()
+        return result
+
+    def map(self, func, tokens=None, max_workers=None):
+        """
+        Calls a function with the client of every token, concurrently, e.g.
+        ``pool.map(lambda toggl: toggl.TimeEntries.get(...))``.
+
+        Args:
+            func (callable): Called with one :class:`togglwrapper.Toggl`.
+            tokens (iterable of str, optional): The tokens to call it for.
+                Defaults to all of them.
+            max_workers (int, optional): The maximum number of calls running
+                at once. Defaults to the pool's `max_workers`.
+
+        Returns:
+            BulkResult: The return values and exceptions, keyed by token.
+        """
+        tokens = self.tokens if tokens is None else tokens
+        return self.run(((token, token, func) for token in tokens),
+                        max_workers)
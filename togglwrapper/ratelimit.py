@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.ratelimit
+----------------------
+
+Client-side scheduling of requests. Toggl throttles each API token to roughly
+one request per second, and answers bursts with 429 Too Many Requests. A
+:class:`TokenBucket` given to :class:`togglwrapper.Toggl` spaces out requests
+from every resource and thread sharing that client, so that callers get the
+maximum sustainable throughput instead of errors.
+"""
+
+import threading
+import time
+
+
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 1
+# The longest a Retry-After header may hold the bucket back, in seconds.
+MAX_DEFER = 60.0
+
+
+def parse_retry_after(response, default=None):
+    """
+    Returns the number of seconds to wait from a response's Retry-After header.
+
+    Args:
+        response (requests.Response): The throttled response.
+        default (float, optional): Returned when the header is missing or
+            cannot be parsed. Defaults to None.
+    """
+    value = response.headers.get('Retry-After')
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import mktime_tz, parsedate_tz
+
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return default
+    return max(0.0, mktime_tz(parsed) - time.time())
+
+
+class TokenBucket(object):
+    """
+    A thread-safe token bucket.
+
+    Tokens are added at `rate` per second, up to `burst` tokens. Every request
+    takes one token; when none are left the request is scheduled for the
+    moment its token will be available, so waiting callers are served in the
+    order they asked.
+    """
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 max_defer=MAX_DEFER, clock=time.monotonic, sleep=time.sleep):
+        """
+        Args:
+            rate (float): Requests allowed per second. Defaults to 1.
+            burst (int): Requests allowed back-to-back after an idle period.
+                Defaults to 1.
+            max_defer (float): The longest :meth:`defer` holds the bucket
+                back, in seconds, whatever the server asks. Defaults to 60.
+            clock (callable, optional): Returns the current time in seconds.
+                Defaults to `time.monotonic`.
+            sleep (callable, optional): Blocks for the given seconds.
+                Defaults to `time.sleep`.
+        """
+        if rate <= 0:
+            raise ValueError('The rate must be greater than zero.')
+        if burst < 1:
+            raise ValueError('The burst must be at least one.')
+        self.rate = float(rate)
+        self.burst = burst
+        self.max_defer = max_defer
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+
+    def _refill(self):
+        """ Adds the tokens earned since the last update. Needs the lock. """
+        now = self._clock()
+        elapsed = now - self._updated
+        self._updated = now
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+
+    def reserve(self, timeout=None):
+        """
+        Takes a token and returns the seconds to wait before using it.
+
+        Args:
+            timeout (float, optional): The longest wait to accept, in
+                seconds. Defaults to None, which accepts any wait.
+
+        Returns:
+            float: The seconds to wait, or None without taking a token if
+                that would be longer than `timeout`.
+        """
+        with self._lock:
+            self._refill()
+            wait = (1 - self._tokens) / self.rate
+            if timeout is not None and wait > timeout:
+                return None
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def try_acquire(self):
+        """
+        Takes a token if one is available now, without waiting.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one
+                will be available. No token is taken in that case.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def delay(self):
+        """ Returns the seconds until a token is available, taking none. """
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self.rate)
+
+    def acquire(self, timeout=None):
+        """
+        Blocks until a token is available.
+
+        Args:
+            timeout (float, optional): The longest to wait, in seconds.
+                Defaults to None, which waits as long as needed.
+
+        Returns:
+            float: The seconds waited, or None without waiting or taking a
+                token if that would have taken longer than `timeout`.
+        """
+        wait = self.reserve(timeout)
+        if wait is None:
+            return None
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def defer(self, seconds):
+        """
+        Makes sure no token is handed out sooner than the given number of
+        seconds from now, e.g. after a 429 response with a Retry-After header.
+        The wait is capped at `max_defer`, so that one bad header can't hold
+        back every caller sharing the bucket for hours.
+        """
+        seconds = min(seconds, self.max_defer)
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 1.0 - seconds * self.rate)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.reports
+--------------------
+
+A client for Toggl's Reports API, available as ``toggl.Reports``. Requests
+go through the session, token, rate limiter, retry policy and hooks of the
+:class:`togglwrapper.Toggl` client, to the Reports API URL next to its
+`base_url`.
+
+Detailed reports come in pages of 50 rows. :meth:`Reports.details` reads the
+total count from the first page, fetches the other pages concurrently and
+yields the rows in page order as those pages arrive. Large reports can be
+split by workspace and date into smaller ones, whose pages are all fetched at
+once. The first page of every smaller report is fetched before any row is
+yielded, so that all their other pages can be requested together.
+"""
+
+from datetime import timedelta
+
+from .concurrency import DEFAULT_MAX_WORKERS, iter_ordered
+from .decorators import check_response, decode_response
+from .ratelimit import TokenBucket
+from .utils import parse_date
+
+
+REPORTS_VERSION = 'v2'
+USER_AGENT = 'togglwrapper'
+DETAILS_PER_PAGE = 50
+
+
+def reports_url(base_url, version=REPORTS_VERSION):
+    """
+    Returns the Reports API URL next to a main API base URL, e.g.
+    'https://api.track.toggl.com/reports/api/v2' for
+    'https://api.track.toggl.com/api'.
+    """
+    root = base_url.rstrip('/')
+    if root.endswith('/api'):
+        root = root[:-len('/api')]
+    return '{root}/reports/api/{version}'.format(root=root, version=version)
+
+
+def split_dates(since, until, days):
+    """
+    Splits a range of dates into consecutive ranges of at most `days` days.
+
+    Args:
+        since (date or str): The first day.
+        until (date or str): The last day, included.
+        days (int): The maximum number of days in each range.
+
+    Returns:
+        list of tuples: (since, until) date pairs, in order.
+    """
+    since, until = parse_date(since), parse_date(until)
+    ranges = []
+    while since <= until:
+        end = min(until, since + timedelta(days=days - 1))
+        ranges.append((since, end))
+        since = end + timedelta(days=1)
+    return ranges
+
+
+class Reports(object):
+    """ The detailed, summary and weekly reports of the Reports API. """
+
+    def __init__(self, toggl):
+        self.toggl = toggl
+        self.user_agent = USER_AGENT
+
+    def _params(self, workspace_id, since, until, params):
+        """ Returns the query parameters of a report. """
+        query = dict((key, value) for key, value in params.items()
+                     if value is not None)
+        query['workspace_id'] = workspace_id
+        query['user_agent'] = self.user_agent
+        if since is not None:
+            query['since'] = parse_date(since).isoformat()
+        if until is not None:
+            query['until'] = parse_date(until).isoformat()
+        return query
+
+    def _get(self, uri, params):
+        """ GETs a report, and returns the decoded response. """
+        response = self.toggl._request('GET', uri, params=params,
+                                       api_url=self.toggl.reports_url)
+        return decode_response(check_response(response), self.toggl.codec)
+
+    def summary(self, workspace_id, since=None, until=None, **params):
+        """
+        Returns a summary report, grouped by projects and users by default.
+
+        Args:
+            workspace_id (int): The workspace to report on.
+            since (date or str, optional): The first day. Defaults to a
+                week ago.
+            until (date or str, optional): The last day. Defaults to today.
+            **params: Other Reports API parameters, e.g. grouping='clients'.
+        """
+        return self._get('/summary',
+                         self._params(workspace_id, since, until, params))
+
+    def weekly(self, workspace_id, since=None, **params):
+        """
+        Returns a weekly report: the durations of the 7 days from `since`.
+
+        Args:
+            workspace_id (int): The workspace to report on.
+            since (date or str, optional): The first day. Defaults to a
+                week ago.
+            **params: Other Reports API parameters, e.g. calculate='earnings'.
+        """
+        return self._get('/weekly',
+                         self._params(workspace_id, since, None, params))
+
+    def details(self, workspace_id, since=None, until=None, split_days=None,
+                max_workers=DEFAULT_MAX_WORKERS, rate=None, **params):
+        """
+        Yields the time entries of a detailed report, in page order.
+
+        The first page of every report made, per workspace and date range, is
+        fetched before the first row is yielded. The rows of the other pages
+        are yielded as those pages arrive.
+
+        Args:
+            workspace_id (int, str or iterable of ints): The workspace to
+                report on. With several, one report is made per workspace,
+                and their rows are yielded one workspace after another.
+            since (date or str, optional): The first day. Defaults to a
+                week ago.
+            until (date or str, optional): The last day. Defaults to today.
+            split_days (int, optional): Splits the range into reports of at
+                most this many days, fetched concurrently and yielded in date
+                order. Needs `since` and `until`. Defaults to None.
+            max_workers (int, optional): The maximum number of pages fetched
+                at once. Defaults to 8.
+            rate (float, optional): The maximum number of pages requested
+                per second, on top of any rate limiter of the client.
+                Defaults to None.
+            **params: Other Reports API parameters, e.g. project_ids='1,2'
+                or order_field='date'.
+        """
+        if isinstance(workspace_id, (int, str, bytes)):
+            workspace_ids = [workspace_id]
+        else:
+            workspace_ids = list(workspace_id)
+        if split_days:
+            if since is None or until is None:
+                raise ValueError('Splitting by date needs since and until.')
+            ranges = split_dates(since, until, split_days)
+        else:
+            ranges = [(since, until)]
+        queries = [self._params(wid, start, end, params)
+                   for wid in workspace_ids for start, end in ranges]
+        limiter = TokenBucket(rate=rate) if rate else None
+
+        def fetch(query, page):
+            if limiter is not None:
+                limiter.acquire()
+            return self._get('/details', dict(query, page=page))
+
+        # The first pages tell how many pages each report has.
+        first_pages = list(iter_ordered(
+            [lambda query=query: fetch(query, 1) for query in queries],
+            max_workers))
+
+        def pages():
+            for query, first in zip(queries, first_pages):
+                yield lambda first=first: first['data']
+                per_page = first.get('per_page') or DETAILS_PER_PAGE
+                count = -(-first.get('total_count', 0) // per_page)
+                for page in range(2, count + 1):
+                    yield lambda query=query, page=page: (
+                        fetch(query, page)['data'])
+
+        for rows in iter_ordered(pages(), max_workers):
+            for row in rows:
+                yield row
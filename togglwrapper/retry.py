@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.retry
+------------------
+
+Automatic retries for transient failures. A :class:`RetryPolicy` given to
+:class:`togglwrapper.Toggl` re-sends requests that failed with a retryable
+status (e.g. 502, 503, 429) or a dropped connection, waiting an exponentially
+growing, jittered delay between attempts. Only idempotent verbs are retried
+unless POST is explicitly opted in. Any request that provably never reached
+the server, because the connection could not be made or the server throttled
+it with a 429, is retried whatever its method.
+"""
+
+import random
+import threading
+import time
+
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+IDEMPOTENT_METHODS = frozenset(['GET', 'PUT', 'DELETE'])
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+class RetryStats(object):
+    """
+    Thread-safe counters describing the retries made under a policy.
+
+    Attributes:
+        requests (int): Requests sent through the policy, not counting
+            retries.
+        retries (int): Extra attempts made after a failure.
+        exhausted (int): Retryable requests that still failed after the
+            last attempt allowed.
+        sleep_seconds (float): Total time spent waiting between attempts.
+        statuses (dict): Number of retries triggered by each status code, or
+            by 'connection' errors.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.exhausted = 0
+        self.sleep_seconds = 0.0
+        self.statuses = {}
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_retry(self, cause, delay):
+        with self._lock:
+            self.retries += 1
+            self.sleep_seconds += delay
+            self.statuses[cause] = self.statuses.get(cause, 0) + 1
+
+    def record_exhausted(self):
+        with self._lock:
+            self.exhausted += 1
+
+    def as_dict(self):
+        """ Returns a consistent snapshot of the counters. """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'exhausted': self.exhausted,
+                'sleep_seconds': self.sleep_seconds,
+                'statuses': dict(self.statuses),
+            }
+
+
+class RetryPolicy(object):
+    """ Decides which failed requests to re-send, and how long to wait. """
+    def __init__(self, max_attempts=3, backoff_base=0.5, backoff_cap=30.0,
+                 jitter=True, retry_statuses=RETRY_STATUSES, retry_post=False,
+                 sleep=time.sleep, random=random.random):
+        """
+        Args:
+            max_attempts (int): The total number of attempts per request,
+                including the first. Defaults to 3.
+            backoff_base (float): The delay in seconds before the first retry.
+                Doubles for every following retry. Defaults to 0.5.
+            backoff_cap (float): The longest delay in seconds between two
+                attempts. A response whose Retry-After asks for a longer wait
+                is returned instead of retried. Defaults to 30.
+            jitter (bool): If True, each delay is drawn uniformly between zero
+                and the exponential delay, so that many clients retrying at
+                once spread out. Defaults to True.
+            retry_statuses (iterable of ints): The response status codes to
+                retry. Defaults to 429, 500, 502, 503 and 504.
+            retry_post (bool): If True, POST requests are retried too. Only
+                enable this for endpoints where a repeated POST is harmless.
+                Defaults to False.
+            sleep (callable, optional): Blocks for the given seconds.
+                Defaults to `time.sleep`.
+            random (callable, optional): Returns a float in [0, 1). Defaults
+                to `random.random`.
+        """
+        if max_attempts < 1:
+            raise ValueError('At least one attempt must be allowed.')
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_post = retry_post
+        self.sleep = sleep
+        self.random = random
+        self.stats = RetryStats()
+
+    def allows(self, method):
+        """ Returns True if requests with the given method are retried. """
+        method = method.upper()
+        return (method in IDEMPOTENT_METHODS or
+                (method == 'POST' and self.retry_post))
+
+    def is_retryable(self, method, attempt, status_code=None, unsent=False,
+                     retry_after=0.0):
+        """
+        Returns True if another attempt should follow the given failed one.
+
+        Args:
+            method (str): The HTTP method of the request.
+            attempt (int): The number of the attempt that failed, from 1.
+            status_code (int, optional): The status of the response. None
+                means the connection failed before a response arrived.
+            unsent (bool): True if the connection failed before the request
+                was sent. Defaults to False.
+            retry_after (float): The seconds the server asked to wait before
+                the next attempt. A wait longer than `backoff_cap` is not
+                made, so the request is not retried. Defaults to 0.
+        """
+        if attempt >= self.max_attempts or retry_after > self.backoff_cap:
+            return False
+        return self._handles(method, status_code, unsent)
+
+    def is_exhausted(self, method, attempt, status_code=None, unsent=False):
+        """
+        Returns True if the given failed attempt would have been retried, but
+        was the last one allowed. Takes the arguments of :meth:`is_retryable`.
+        """
+        return (attempt >= self.max_attempts and
+                self._handles(method, status_code, unsent))
+
+    def _handles(self, method, status_code, unsent):
+        """ Returns True if the failure is one the policy retries. """
+        if status_code is not None and status_code not in self.retry_statuses:
+            return False
+        # Throttled requests and unsent ones were never handled by the
+        # server, so re-sending them can't repeat their effect.
+        return self.allows(method) or unsent or status_code == 429
+
+    def backoff(self, attempt):
+        """ Returns the seconds to wait after the given failed attempt. """
+        delay = min(self.backoff_cap,
+                    self.backoff_base * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay *= self.random()
+        return delay
@@ -0,0 +1,651 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.simulator
+----------------------
+
+An in-process stand-in for the Toggl v8 API, for integration and load tests
+that must not touch the real service.
+
+:class:`TogglSimulator` is a WSGI application that keeps workspaces, clients,
+projects, tasks, tags, time entries, project users and workspace users in
+memory, and answers the endpoints wrapped by :class:`togglwrapper.Toggl`. It
+follows the service's rules that matter for throughput: each API token is
+throttled with 429 responses carrying Retry-After, time entry ranges are cut
+off at 1000 entries, and ``/me?since=...`` only returns what changed,
+including deleted objects with ``server_deleted_at`` set.
+
+Use it without a network through
+:class:`togglwrapper.transport.WSGIAdapter`, or over HTTP with
+:meth:`TogglSimulator.serve`::
+
+    simulator = TogglSimulator(tokens=['token'], rate=None)
+    simulator.generate(time_entries=50000, seed=1)
+    toggl = Toggl('token', transport=WSGIAdapter(simulator))
+"""
+
+import base64
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl
+
+from .ratelimit import DEFAULT_BURST, DEFAULT_RATE, TokenBucket
+from .utils import parse_datetime
+
+
+TIME_ENTRIES_LIMIT = 1000
+TIME_ENTRIES_DEFAULT_DAYS = 9
+ACTIVE_CHOICES = {'true': (True,), 'false': (False,), 'both': (True, False)}
+
+# The key each kind of object is wrapped in, in request bodies.
+WRAPPERS = {
+    'clients': 'client',
+    'projects': 'project',
+    'project_users': 'project_user',
+    'tags': 'tag',
+    'tasks': 'task',
+    'time_entries': 'time_entry',
+    'workspaces': 'workspace',
+    'workspace_users': 'workspace_user',
+}
+
+# Fields that must be given when creating each kind of object.
+REQUIRED = {
+    'clients': ('name',),
+    'projects': ('name',),
+    'project_users': ('pid', 'uid'),
+    'tags': ('name',),
+    'tasks': ('name', 'pid'),
+    'time_entries': ('start', 'duration'),
+}
+
+# The collections returned by /me?with_related_data=true.
+RELATED = ('workspaces', 'clients', 'projects', 'tasks', 'time_entries',
+           'tags')
+
+STATUS_REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden',
+                  404: 'Not Found', 405: 'Method Not Allowed',
+                  429: 'Too Many Requests'}
+
+WORDS = ('design', 'review', 'planning', 'support', 'research', 'meeting',
+         'backend', 'frontend', 'testing', 'deploy', 'docs', 'billing',
+         'sprint', 'interview', 'refactor', 'triage')
+
+
+def _iso(timestamp):
+    """ Returns an epoch timestamp as an ISO 8601 string in UTC. """
+    return datetime.fromtimestamp(int(timestamp), timezone.utc).isoformat()
+
+
+def _epoch(value):
+    """ Returns the epoch seconds of an ISO 8601 string. """
+    return parse_datetime(value).timestamp()
+
+
+class SimulatorError(Exception):
+    """ Ends a request with an error status and message. """
+    def __init__(self, status, message):
+        super(SimulatorError, self).__init__(message)
+        self.status = status
+        self.message = message
+
+
+class TogglSimulator(object):
+    """
+    A WSGI application simulating the Toggl v8 API for one user.
+
+    Attributes:
+        user (dict): The user every accepted token belongs to.
+        requests (int): Requests received, including rejected ones.
+        throttled (int): Requests answered with 429.
+    """
+    def __init__(self, tokens=None, rate=DEFAULT_RATE, burst=DEFAULT_BURST,
+                 time_entries_limit=TIME_ENTRIES_LIMIT, prefix='/api/v8',
+                 clock=time.time):
+        """
+        Args:
+            tokens (iterable of str, optional): The API tokens accepted.
+                Defaults to None, which accepts any token.
+            rate (float, optional): The requests per second allowed for each
+                token before answering 429. None disables throttling.
+                Defaults to 1, like Toggl.
+            burst (int, optional): The requests allowed back-to-back for each
+                token. Defaults to 1.
+            time_entries_limit (int, optional): The most time entries
+                returned for a range. Defaults to 1000, like Toggl.
+            prefix (str, optional): The path the API is served under.
+                Defaults to '/api/v8'.
+            clock (callable, optional): Returns the current epoch time in
+                seconds, for timestamps and throttling. Defaults to
+                `time.time`.
+        """
+        self.tokens = set(tokens) if tokens is not None else None
+        self.rate = rate
+        self.burst = burst
+        self.time_entries_limit = time_entries_limit
+        self.prefix = prefix.rstrip('/')
+        self.clock = clock
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.RLock()
+        self._buckets = {}
+        self._ids = itertools.count(1000)
+        self._objects = dict((kind, {}) for kind in WRAPPERS)
+        self._deleted = dict((kind, {}) for kind in WRAPPERS)
+        self._starts = {}
+        self._routes = self._build_routes()
+
+        now = _iso(clock())
+        self.user = {
+            'id': self._next_id(), 'api_token': 'simulator_token',
+            'default_wid': None, 'email': 'simulated@example.com',
+            'fullname': 'Simulated User', 'timezone': 'UTC',
+            'beginning_of_week': 1, 'at': now,
+        }
+        workspace = self._store('workspaces', {'name': 'Default workspace',
+                                               'premium': False,
+                                               'admin': True})
+        self.user['default_wid'] = workspace['id']
+        self._store('workspace_users', {'wid': workspace['id'],
+                                        'uid': self.user['id'],
+                                        'admin': True, 'active': True})
+
+    # State
+
+    def _next_id(self):
+        return next(self._ids)
+
+    def _store(self, kind, fields):
+        """ Adds a new object of the given kind and returns it. """
+        with self._lock:
+            obj = dict(fields, id=self._next_id(), at=_iso(self.clock()))
+            self._objects[kind][obj['id']] = obj
+            return obj
+
+    def _get(self, kind, id):
+        obj = self._objects[kind].get(id)
+        if obj is None:
+            raise SimulatorError(404, None)
+        return obj
+
+    def _update(self, kind, id, fields):
+        obj = self._get(kind, id)
+        fields = dict((key, value) for key, value in fields.items()
+                      if key != 'id')
+        obj.update(fields, at=_iso(self.clock()))
+        return obj
+
+    def _delete(self, kind, id):
+        obj = self._objects[kind].pop(id, None)
+        if obj is None:
+            raise SimulatorError(404, None)
+        now = _iso(self.clock())
+        self._deleted[kind][id] = dict(obj, at=now, server_deleted_at=now)
+
+    def objects(self, kind):
+        """ Returns a list of copies of the objects of the given kind. """
+        with self._lock:
+            return [dict(obj) for obj in self._objects[kind].values()]
+
+    def generate(self, workspaces=1, clients=10, projects=50, tasks=100,
+                 tags=20, time_entries=1000, days=365, seed=None):
+        """
+        Adds random but reproducible objects, e.g. to load-test against a
+        realistically large account.
+
+        Args:
+            workspaces (int): Extra workspaces to add besides the default.
+            clients, projects, tasks, tags (int): The objects to add, spread
+                over the workspaces.
+            time_entries (int): The stopped time entries to add, spread over
+                the last `days` days.
+            days (int): How far back time entries start. Defaults to 365.
+            seed (optional): Seeds the random generator, so that the same
+                arguments always build the same account.
+        """
+        rand = random.Random(seed)
+        with self._lock:
+            wids = [self.user['default_wid']] + [
+                self._store('workspaces', {'name': 'Workspace {}'.format(n),
+                                           'premium': False,
+                                           'admin': True})['id']
+                for n in range(workspaces)]
+            cids = [self._store('clients', {
+                'name': 'Client {}'.format(n), 'wid': rand.choice(wids),
+            })['id'] for n in range(clients)]
+            project_ids = []
+            for n in range(projects):
+                cid = rand.choice(cids) if cids else None
+                wid = (self._objects['clients'][cid]['wid'] if cid
+                       else rand.choice(wids))
+                project_ids.append(self._store('projects', {
+                    'name': 'Project {}'.format(n), 'wid': wid, 'cid': cid,
+                    'active': rand.random() > 0.1,
+                    'billable': rand.random() > 0.5, 'is_private': True,
+                })['id'])
+            task_ids = []
+            for n in range(tasks if project_ids else 0):
+                pid = rand.choice(project_ids)
+                task_ids.append(self._store('tasks', {
+                    'name': 'Task {}'.format(n), 'pid': pid,
+                    'wid': self._objects['projects'][pid]['wid'],
+                    'active': True,
+                })['id'])
+            tag_names = []
+            for n in range(tags):
+                tag = self._store('tags', {
+                    'name': '{}-{}'.format(rand.choice(WORDS), n),
+                    'wid': rand.choice(wids)})
+                tag_names.append(tag['name'])
+
+            end = self.clock()
+            for _ in range(time_entries):
+                start = end - rand.random() * days * 86400
+                duration = rand.randint(60, 4 * 3600)
+                pid = rand.choice(project_ids) if project_ids else None
+                tid = rand.choice(task_ids) if task_ids else None
+                entry_tags = rand.sample(tag_names,
+                                         min(len(tag_names),
+                                             rand.randint(0, 2)))
+                self._store('time_entries', {
+                    'wid': (self._objects['projects'][pid]['wid'] if pid
+                            else self.user['default_wid']),
+                    'pid': pid, 'tid': tid, 'uid': self.user['id'],
+                    'billable': rand.random() > 0.5,
+                    'start': _iso(start), 'stop': _iso(start + duration),
+                    'duration': duration,
+                    'description': ' '.join(rand.sample(WORDS, 2)),
+                    'tags': entry_tags, 'created_with': 'togglwrapper',
+                })
+
+    # WSGI
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.requests += 1
+        try:
+            token = self._authenticate(environ)
+            self._throttle(token)
+            status, body = self._dispatch(environ)
+            headers = [('Content-Type', 'application/json')]
+        except SimulatorError as e:
+            status = e.status
+            headers = [('Content-Type', 'application/json')]
+            if e.status == 429:
+                headers.append(('Retry-After', e.message))
+                body = ''
+            elif e.message is None:
+                body = 'null'
+            else:
+                body = json.dumps([e.message])
+        body = body.encode('utf-8')
+        headers.append(('Content-Length', str(len(body))))
+        start_response('{} {}'.format(status, STATUS_REASONS.get(status, '')),
+                       headers)
+        return [body]
+
+    def serve(self, host='127.0.0.1', port=0):
+        """
+        Serves the simulator over HTTP from a daemon thread.
+
+        Returns:
+            The running `wsgiref` server. Its `server_port` is the port
+            listened on; call `shutdown()` to stop it.
+        """
+        from socketserver import ThreadingMixIn
+        from wsgiref.simple_server import (WSGIRequestHandler, WSGIServer,
+                                           make_server)
+
+        class Server(ThreadingMixIn, WSGIServer):
+            daemon_threads = True
+            # The default backlog of 5 resets connections from busy pools.
+            request_queue_size = 128
+
+        class Handler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        server = make_server(host, port, self, server_class=Server,
+                             handler_class=Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return server
+
+    def _authenticate(self, environ):
+        """ Returns the API token of the request, or raises 403. """
+        header = environ.get('HTTP_AUTHORIZATION', '')
+        token = None
+        if header.startswith('Basic '):
+            try:
+                decoded = base64.b64decode(header[6:]).decode('utf-8')
+            except (ValueError, UnicodeDecodeError):
+                decoded = ''
+            token = decoded.partition(':')[0]
+        if not token or (self.tokens is not None and
+                         token not in self.tokens):
+            raise SimulatorError(403, 'Incorrect API token')
+        return token
+
+    def _throttle(self, token):
+        """ Raises 429 when the token sent requests faster than allowed. """
+        if self.rate is None:
+            return
+        with self._lock:
+            bucket = self._buckets.get(token)
+            if bucket is None:
+                bucket = self._buckets[token] = TokenBucket(
+                    self.rate, self.burst, clock=self.clock)
+        wait = bucket.try_acquire()
+        if wait > 0:
+            with self._lock:
+                self.throttled += 1
+            raise SimulatorError(429, '{:.3f}'.format(wait))
+
+    def _dispatch(self, environ):
+        """ Routes a request to its handler, returning (status, body). """
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(self.prefix + '/'):
+            raise SimulatorError(404, 'Not found')
+        path = path[len(self.prefix):].rstrip('/')
+        method = environ['REQUEST_METHOD']
+        query = dict(parse_qsl(environ.get('QUERY_STRING', '')))
+        body = self._read_body(environ)
+
+        allowed = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed = True
+                continue
+            with self._lock:
+                payload = handler(query, body, *match.groups())
+                # Encode under the lock, while no other request changes it.
+                return 200, json.dumps(payload) if payload is not None else ''
+
+        if allowed:
+            raise SimulatorError(405, 'Method not allowed')
+        raise SimulatorError(404, 'Not found')
+
+    @staticmethod
+    def _read_body(environ):
+        try:
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if not length:
+            return {}
+        raw = environ['wsgi.input'].read(length)
+        try:
+            body = json.loads(raw.decode('utf-8'))
+        except ValueError:
+            raise SimulatorError(400, 'Invalid JSON')
+        return body if isinstance(body, dict) else {}
+
+    def _build_routes(self):
+        ids = r'(\d+(?:,\d+)*)'
+        id = r'(\d+)'
+        kinds = '(clients|projects|project_users|tags|tasks|time_entries|' \
+                'workspaces|workspace_users)'
+        routes = [
+            ('GET', '/me', self._get_me),
+            ('PUT', '/me', self._put_me),
+            ('POST', '/signups', self._signup),
+            ('POST', '/reset_token', self._reset_token),
+            ('GET', '/dashboard/' + id, self._dashboard),
+            ('GET', '/time_entries', self._get_time_entries),
+            ('GET', '/time_entries/current', self._current_time_entry),
+            ('POST', '/time_entries/start', self._start_time_entry),
+            ('PUT', '/time_entries/' + id + '/stop', self._stop_time_entry),
+            ('GET', '/clients', self._list_clients),
+            ('GET', '/clients/' + id + '/projects', self._client_projects),
+            ('GET', '/workspaces', self._list_workspaces),
+            ('GET', '/workspaces/' + id + '/(clients|projects|tags|tasks|'
+                    'users|workspace_users)', self._workspace_children),
+            ('POST', '/workspaces/' + id + '/invite', self._invite),
+            ('GET', '/projects/' + id + '/(project_users|tasks)',
+             self._project_children),
+            ('POST', '/project_users', self._create_project_users),
+            ('POST', '/' + kinds, self._create),
+            ('GET', '/' + kinds + '/' + ids, self._read),
+            ('PUT', '/' + kinds + '/' + ids, self._write),
+            ('DELETE', '/' + kinds + '/' + ids, self._remove),
+        ]
+        return [(method, re.compile(pattern + '$'), handler)
+                for method, pattern, handler in routes]
+
+    # Handlers
+
+    def _fields(self, kind, body):
+        fields = body.get(WRAPPERS[kind])
+        if not isinstance(fields, dict):
+            raise SimulatorError(400, '{} is required'.format(WRAPPERS[kind]))
+        return fields
+
+    def _create(self, query, body, kind):
+        if kind not in REQUIRED:
+            raise SimulatorError(405, 'Method not allowed')
+        fields = self._fields(kind, body)
+        for name in REQUIRED[kind]:
+            if fields.get(name) in (None, ''):
+                raise SimulatorError(400, "{} can't be blank".format(
+                    name.capitalize()))
+        fields = dict(fields)
+        if kind == 'tasks':
+            fields.setdefault('wid', self._get('projects',
+                                               fields['pid'])['wid'])
+        else:
+            fields.setdefault('wid', self.user['default_wid'])
+        if kind == 'time_entries':
+            fields.setdefault('uid', self.user['id'])
+        if kind in ('projects', 'tasks'):
+            fields.setdefault('active', True)
+        return {'data': self._store(kind, fields)}
+
+    def _create_project_users(self, query, body):
+        fields = self._fields('project_users', body)
+        uids = str(fields.get('uid') or '').split(',')
+        if not fields.get('pid') or not all(uid.isdigit() for uid in uids):
+            raise SimulatorError(400, "Pid and uid can't be blank")
+        wid = self._get('projects', fields['pid'])['wid']
+        created = [self._store('project_users',
+                               dict(fields, uid=int(uid), wid=wid))
+                   for uid in uids]
+        return {'data': created if len(created) > 1 else created[0]}
+
+    def _parse_ids(self, ids):
+        return [int(id) for id in ids.split(',')]
+
+    def _read(self, query, body, kind, ids):
+        objects = [self._get(kind, id) for id in self._parse_ids(ids)]
+        return {'data': objects if len(objects) > 1 else objects[0]}
+
+    def _write(self, query, body, kind, ids):
+        fields = dict(self._fields(kind, body))
+        tag_action = fields.pop('tag_action', None)
+        updated = []
+        for id in self._parse_ids(ids):
+            changes = dict(fields)
+            if kind == 'time_entries' and tag_action and 'tags' in changes:
+                current = list(self._get(kind, id).get('tags') or [])
+                if tag_action == 'add':
+                    changes['tags'] = current + [
+                        tag for tag in changes['tags'] if tag not in current]
+                elif tag_action == 'remove':
+                    changes['tags'] = [tag for tag in current
+                                       if tag not in changes['tags']]
+            updated.append(self._update(kind, id, changes))
+        return {'data': updated if len(updated) > 1 else updated[0]}
+
+    def _remove(self, query, body, kind, ids):
+        if kind == 'workspaces':
+            raise SimulatorError(405, 'Method not allowed')
+        for id in self._parse_ids(ids):
+            self._delete(kind, id)
+        return None
+
+    def _get_me(self, query, body):
+        now = int(self.clock())
+        data = dict(self.user)
+        if query.get('with_related_data', '').lower() == 'true':
+            since = query.get('since')
+            for kind in RELATED:
+                data[kind] = self._changed(kind, since)
+        return {'since': now, 'data': data}
+
+    def _changed(self, kind, since):
+        """ Returns the objects changed after since, deleted ones too. """
+        objects = list(self._objects[kind].values())
+        if since is None:
+            return [dict(obj) for obj in objects]
+        since = float(since)
+        objects += list(self._deleted[kind].values())
+        return [dict(obj) for obj in objects if _epoch(obj['at']) >= since]
+
+    def _put_me(self, query, body):
+        fields = body.get('user') or {}
+        for name in ('id', 'api_token'):
+            fields.pop(name, None)
+        self.user.update(fields, at=_iso(self.clock()))
+        return {'data': dict(self.user)}
+
+    def _signup(self, query, body):
+        fields = body.get('user') or {}
+        if not fields.get('email') or not fields.get('password'):
+            raise SimulatorError(400, "Email and password can't be blank")
+        return {'data': {'id': self._next_id(), 'email': fields['email'],
+                         'api_token': 'token{}'.format(self._next_id())}}
+
+    def _reset_token(self, query, body):
+        token = 'token{}'.format(self._next_id())
+        if self.tokens is not None:
+            self.tokens.add(token)
+        self.user['api_token'] = token
+        return token
+
+    def _dashboard(self, query, body, wid):
+        self._get('workspaces', int(wid))
+        totals = {}
+        for entry in self._objects['time_entries'].values():
+            if entry['wid'] == int(wid) and entry['duration'] >= 0:
+                totals[entry['uid']] = (totals.get(entry['uid'], 0) +
+                                        entry['duration'])
+        most_active = [{'user_id': uid, 'duration': duration}
+                       for uid, duration in sorted(
+                           totals.items(), key=lambda item: -item[1])]
+        return {'most_active_user': most_active, 'activity': []}
+
+    def _get_time_entries(self, query, body):
+        now = self.clock()
+        try:
+            end = _epoch(query['end_date']) if 'end_date' in query else now
+            start = (_epoch(query['start_date']) if 'start_date' in query
+                     else end - TIME_ENTRIES_DEFAULT_DAYS * 86400)
+        except ValueError:
+            raise SimulatorError(400, 'Invalid date')
+        starts = [(self._start_of(entry), entry)
+                  for entry in self._objects['time_entries'].values()]
+        starts = [(entry_start, entry) for entry_start, entry in starts
+                  if start <= entry_start <= end]
+        starts.sort(key=lambda pair: pair[0])
+        entries = [entry for _, entry in starts]
+        return [dict(entry) for entry in entries[:self.time_entries_limit]]
+
+    def _start_of(self, entry):
+        """ Returns the start epoch of a time entry, parsed once. """
+        cached = self._starts.get(entry['id'])
+        if cached is None or cached[0] != entry['start']:
+            cached = (entry['start'], _epoch(entry['start']))
+            self._starts[entry['id']] = cached
+        return cached[1]
+
+    def _running(self):
+        for entry in self._objects['time_entries'].values():
+            if entry['duration'] < 0 and entry['uid'] == self.user['id']:
+                return entry
+        return None
+
+    def _current_time_entry(self, query, body):
+        running = self._running()
+        return {'data': dict(running) if running is not None else None}
+
+    def _start_time_entry(self, query, body):
+        fields = dict(self._fields('time_entries', body))
+        running = self._running()
+        if running is not None:
+            self._stop(running)
+        now = self.clock()
+        fields.update(start=_iso(now), duration=-int(now), stop=None,
+                      uid=self.user['id'])
+        fields.setdefault('wid', self.user['default_wid'])
+        return {'data': self._store('time_entries', fields)}
+
+    def _stop(self, entry):
+        now = self.clock()
+        return self._update('time_entries', entry['id'], {
+            'stop': _iso(now),
+            'duration': int(now - _epoch(entry['start']))})
+
+    def _stop_time_entry(self, query, body, id):
+        entry = self._get('time_entries', int(id))
+        if entry['duration'] < 0:
+            entry = self._stop(entry)
+        return {'data': entry}
+
+    def _active(self, query):
+        choice = str(query.get('active', 'true')).lower()
+        if choice not in ACTIVE_CHOICES:
+            raise SimulatorError(400, 'Invalid active value')
+        return ACTIVE_CHOICES[choice]
+
+    def _list_clients(self, query, body):
+        return self.objects('clients')
+
+    def _client_projects(self, query, body, cid):
+        self._get('clients', int(cid))
+        active = self._active(query)
+        return [dict(project)
+                for project in self._objects['projects'].values()
+                if project.get('cid') == int(cid) and
+                project.get('active', True) in active]
+
+    def _list_workspaces(self, query, body):
+        return self.objects('workspaces')
+
+    def _workspace_children(self, query, body, wid, child):
+        wid = int(wid)
+        self._get('workspaces', wid)
+        if child == 'users':
+            return [dict(self.user)]
+        objects = [dict(obj) for obj in self._objects[child].values()
+                   if obj.get('wid') == wid]
+        if child == 'projects':
+            active = self._active(query)
+            objects = [project for project in objects
+                       if project.get('active', True) in active]
+        return objects
+
+    def _project_children(self, query, body, pid, child):
+        pid = int(pid)
+        self._get('projects', pid)
+        return [dict(obj) for obj in self._objects[child].values()
+                if obj.get('pid') == pid]
+
+    def _invite(self, query, body, wid):
+        wid = int(wid)
+        self._get('workspaces', wid)
+        emails = body.get('emails') or []
+        if not emails:
+            raise SimulatorError(400, "Emails can't be blank")
+        invited = [self._store('workspace_users', {
+            'wid': wid, 'uid': self._next_id(), 'email': email,
+            'admin': False, 'active': False, 'invitation_code': 'simulated',
+        }) for email in emails]
+        return {'data': invited}
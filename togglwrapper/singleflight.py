@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.singleflight
+-------------------------
+
+Coalescing of identical GETs. With ``Toggl(..., coalesce=True)``, a GET made
+while an identical one (same URI, params and headers) is in flight does not
+send a request: it waits for that one and shares its response, so a burst of
+callers asking for the same workspace's projects costs one request and one
+unit of rate budget. Each caller decodes the shared response into objects of
+its own. A call that failed for reasons of its own, such as running out of
+its deadline, is not shared: the callers waiting for it send the request
+again. ``AsyncToggl(..., coalesce=True)`` does the same for coroutines.
+"""
+
+import threading
+import time
+
+from .exceptions import DeadlineExceeded
+
+
+class _Call(object):
+    """ A call in flight, and its outcome once done. """
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Runs at most one call per key at a time; calls made with a key already in
+    flight wait for its outcome instead. Thread-safe.
+
+    Attributes:
+        calls (int): Calls actually run.
+        coalesced (int): Calls that shared the outcome of one in flight.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, func, timeout=None, unshared=(TimeoutError,)):
+        """
+        Returns func's result, or raises its exception, running it unless a
+        call with the same key is in flight.
+
+        Args:
+            key (hashable): Identifies identical calls.
+            func (callable): Called without arguments.
+            timeout (float, optional): The longest to wait for a call in
+                flight, in seconds. Defaults to None, which waits as long as
+                it takes.
+            unshared (tuple of exception classes, optional): Errors that
+                only concern the caller whose call raised them, such as its
+                own timeouts. Callers waiting for a call that raised one run
+                func again instead. Defaults to TimeoutError, which includes
+                DeadlineExceeded.
+
+        Raises:
+            DeadlineExceeded: If the call in flight took longer than
+                `timeout`.
+        """
+        expires = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            with self._lock:
+                call = self._in_flight.get(key)
+                leader = call is None
+                if leader:
+                    call = self._in_flight[key] = _Call()
+                    self.calls += 1
+                else:
+                    self.coalesced += 1
+            if leader:
+                break
+            remaining = None
+            if expires is not None:
+                remaining = max(0.0, expires - time.monotonic())
+            if not call.done.wait(remaining):
+                raise DeadlineExceeded(
+                    'The deadline passed waiting for an identical request.')
+            if call.error is None:
+                return call.result
+            if not isinstance(call.error, unshared):
+                raise call.error
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    def as_dict(self):
+        """ Returns a consistent copy of the counters. """
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced}
+
+
+class AsyncSingleFlight(object):
+    """
+    Like :class:`SingleFlight`, for coroutines of one event loop. Cancelling
+    one of the waiting callers doesn't cancel the shared call.
+    """
+    def __init__(self):
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, func):
+        """
+        Returns the result of awaiting func(), unless a call with the same
+        key is in flight, whose result is returned instead.
+        """
+        import asyncio
+
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def as_dict(self):
+        """ Returns a copy of the counters. """
+        return {'calls': self.calls, 'coalesced': self.coalesced}
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.streaming
+----------------------
+
+Incremental JSON parsing of large responses. Instead of building the whole
+object tree of e.g. ``User.get(related_data=True)``, :func:`iter_items` reads
+the body chunk by chunk and yields the elements of one array as soon as each
+is complete. Only the element being parsed and the current chunk are held in
+memory, so peak memory doesn't grow with the size of the response.
+
+Arrays are addressed by the dotted keys leading to them: ``'data.projects'``
+is the ``projects`` array inside the top-level ``data`` object, and ``''`` is
+a top-level array.
+"""
+
+import codecs
+import json
+import re
+
+
+TOKEN = re.compile(r'[{}\[\]",:]')
+ELEMENT_TOKEN = re.compile(r'[{}\[\]"]')
+STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.DOTALL)
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+DELIMITERS = frozenset(' \t\n\r,]}')
+
+
+class _Frame(object):
+    """ An object or array the parser is inside of. """
+    __slots__ = ('is_object', 'path', 'key', 'expect_key')
+
+    def __init__(self, is_object, path):
+        self.is_object = is_object
+        self.path = path
+        self.key = None
+        self.expect_key = is_object
+
+
+class ItemParser(object):
+    """
+    Parses a JSON document fed in pieces, collecting the elements of the array
+    at a path.
+    """
+    def __init__(self, path=''):
+        """
+        Args:
+            path (str): The dotted keys of the array whose elements to yield.
+                Defaults to '', the top-level array.
+        """
+        self.path = tuple(path.split('.')) if path else ()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._stack = []
+        # How far into the incomplete object or array at the start of the
+        # buffer the scan for its end got, and how deeply nested it was.
+        self._scanned = 0
+        self._depth = 0
+
+    def _child_path(self):
+        """ Returns the path of the value starting at the current position. """
+        if not self._stack:
+            return ()
+        frame = self._stack[-1]
+        return frame.path + ((frame.key if frame.is_object else None),)
+
+    def _scan_element(self, buf, start):
+        """
+        Returns the end of the object or array starting at `start`, or None
+        if it is not complete yet. The scan resumes where the last call for
+        the same element stopped, so every character is only scanned once.
+        """
+        pos = start + self._scanned
+        depth = self._depth
+        while True:
+            match = ELEMENT_TOKEN.search(buf, pos)
+            if match is None:
+                pos = len(buf)
+                break
+            char = match.group()
+            pos = match.start()
+            if char == '"':
+                string = STRING.match(buf, pos)
+                if string is None:
+                    break
+                pos = string.end()
+                continue
+            pos += 1
+            depth += 1 if char == '{' or char == '[' else -1
+            if depth == 0:
+                self._scanned = self._depth = 0
+                return pos
+        self._scanned = pos - start
+        self._depth = depth
+        return None
+
+    def _in_target(self):
+        stack = self._stack
+        return (bool(stack) and not stack[-1].is_object and
+                stack[-1].path == self.path)
+
+    def feed(self, text, final=False):
+        """
+        Parses the next piece of the document.
+
+        Args:
+            text (str): The next piece of the document.
+            final (bool): True if this is the last piece.
+
+        Returns:
+            list: The elements of the target array completed by this piece.
+        """
+        buf = self._buffer + text
+        pos = 0
+        items = []
+        while pos < len(buf):
+            if self._in_target():
+                pos = WHITESPACE.match(buf, pos).end()
+                if pos == len(buf):
+                    break
+                char = buf[pos]
+                if char == ',':
+                    pos += 1
+                    continue
+                if char == ']':
+                    self._stack.pop()
+                    pos += 1
+                    continue
+                if char == '{' or char == '[':
+                    # Only decode an object or array once all of it is here,
+                    # rather than retrying it with every piece.
+                    if self._scan_element(buf, pos) is None:
+                        if final:
+                            raise ValueError('Unterminated JSON element.')
+                        break
+                    item, pos = self._decoder.raw_decode(buf, pos)
+                    items.append(item)
+                    continue
+                try:
+                    item, end = self._decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if final:
+                        raise
+                    break
+                # A number cut off by the end of the piece (e.g. '2' of '2.5')
+                # only ends where a delimiter follows it.
+                if not final and (end == len(buf) or
+                                  buf[end] not in DELIMITERS):
+                    break
+                items.append(item)
+                pos = end
+                continue
+
+            match = TOKEN.search(buf, pos)
+            if match is None:
+                pos = len(buf)
+                break
+            char = match.group()
+            pos = match.start()
+            frame = self._stack[-1] if self._stack else None
+            if char == '"':
+                string = STRING.match(buf, pos)
+                if string is None:
+                    if final:
+                        raise ValueError('Unterminated string in JSON.')
+                    break
+                if frame is not None and frame.expect_key:
+                    frame.key = json.loads(string.group())
+                pos = string.end()
+                continue
+            pos += 1
+            if char == ':':
+                frame.expect_key = False
+            elif char == ',':
+                if frame is not None and frame.is_object:
+                    frame.expect_key = True
+            elif char == '{' or char == '[':
+                self._stack.append(_Frame(char == '{', self._child_path()))
+            else:
+                self._stack.pop()
+        self._buffer = buf[pos:]
+        return items
+
+
+def iter_items(chunks, path='', encoding='utf-8'):
+    """
+    Yields the elements of the array at a path of a JSON document.
+
+    Args:
+        chunks (iterable): The document in pieces, as bytes or str.
+        path (str): The dotted keys of the array whose elements to yield,
+            e.g. 'data.time_entries'. Defaults to '', the top-level array.
+        encoding (str): The encoding of byte chunks. Defaults to 'utf-8'.
+    """
+    parser = ItemParser(path)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        for item in parser.feed(chunk):
+            yield item
+    for item in parser.feed(decoder.decode(b'', final=True), final=True):
+        yield item
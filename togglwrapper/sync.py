@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.sync
+-----------------
+
+Incremental synchronisation of a Toggl account into a local store.
+
+The first :meth:`SyncEngine.sync` downloads everything the user can see with
+``User.get(related_data=True)``. Every following sync only asks for objects
+changed since the previous one, using the ``since`` timestamp returned by
+Toggl, and applies them to the store. Objects with ``server_deleted_at`` set
+are removed. The cost of a sync therefore grows with the amount of change,
+not with the size of the account. Objects are stored as dicts, also when the
+client returns :mod:`togglwrapper.models` records.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from .models import Model
+
+SYNC_COLLECTIONS = ('workspaces', 'clients', 'projects', 'tasks',
+                    'time_entries', 'tags')
+
+
+class MemoryStore(object):
+    """
+    Keeps synced objects in memory.
+
+    Objects are grouped by store key (one per API token), then by collection
+    name, then by ID. Subclass it to persist somewhere else;
+    :class:`SyncEngine` only uses the methods defined here.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._since = {}
+        self._objects = {}
+
+    def get_since(self, key):
+        """ Returns the timestamp of the last sync for the key, or None. """
+        with self._lock:
+            return self._since.get(key)
+
+    def set_since(self, key, since):
+        """ Records the timestamp of a completed sync for the key. """
+        with self._lock:
+            self._since[key] = since
+
+    def clear(self, key):
+        """ Forgets every object and the sync timestamp for the key. """
+        with self._lock:
+            self._since.pop(key, None)
+            self._objects.pop(key, None)
+
+    def put(self, key, collection, obj):
+        """ Adds or replaces an object in a collection. """
+        with self._lock:
+            objects = self._objects.setdefault(key, {})
+            objects.setdefault(collection, {})[obj['id']] = obj
+
+    def remove(self, key, collection, id):
+        """ Removes an object from a collection, if present. """
+        with self._lock:
+            self._objects.get(key, {}).get(collection, {}).pop(id, None)
+
+    def objects(self, key, collection):
+        """ Returns a dict of the objects in a collection, keyed by ID. """
+        with self._lock:
+            return dict(self._objects.get(key, {}).get(collection, {}))
+
+
+class JSONFileStore(MemoryStore):
+    """
+    Keeps synced objects in memory, and saves them to a JSON file after every
+    completed sync, so that the next process can continue incrementally.
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The file to load from, if it exists, and save to.
+        """
+        super(JSONFileStore, self).__init__()
+        self.path = path
+        if os.path.exists(path):
+            with open(path) as json_file:
+                state = json.load(json_file)
+            self._since = state['since']
+            # JSON object keys are strings, so restore the integer IDs.
+            self._objects = dict(
+                (key, dict(
+                    (collection, dict((int(id), obj)
+                                      for id, obj in objects.items()))
+                    for collection, objects in collections.items()))
+                for key, collections in state['objects'].items())
+
+    def set_since(self, key, since):
+        """ Records the timestamp of a completed sync, and saves the file. """
+        with self._lock:
+            super(JSONFileStore, self).set_since(key, since)
+            self.save()
+
+    def save(self):
+        """ Writes the store to its file, replacing it atomically. """
+        with self._lock:
+            state = {'since': self._since, 'objects': self._objects}
+            directory = os.path.dirname(os.path.abspath(self.path))
+            handle, temp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(handle, 'w') as json_file:
+                json.dump(state, json_file)
+            os.replace(temp_path, self.path)
+
+
+class SyncEngine(object):
+    """ Keeps a store up to date with a Toggl account. """
+    def __init__(self, toggl, store=None, collections=SYNC_COLLECTIONS):
+        """
+        Args:
+            toggl (Toggl): The client whose account is synced.
+            store (MemoryStore, optional): Where synced objects are kept.
+                Defaults to a new :class:`MemoryStore`.
+            collections (iterable of str, optional): The related data to
+                keep. Defaults to workspaces, clients, projects, tasks, time
+                entries and tags.
+        """
+        self.toggl = toggl
+        self.store = store if store is not None else MemoryStore()
+        self.collections = tuple(collections)
+        # Key the store by a digest, so the token isn't written to disk.
+        token = toggl.auth.username
+        self.key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def sync(self):
+        """
+        Fetches the changes since the last sync and applies them to the store.
+
+        Returns:
+            dict: For every collection, the number of objects 'updated' and
+                'deleted' by this sync.
+        """
+        since = self.store.get_since(self.key)
+        response = self.toggl.User.get(related_data=True, since=since)
+        data = response['data']
+        if since is None:
+            self.store.clear(self.key)
+
+        changes = {}
+        for collection in self.collections:
+            updated = deleted = 0
+            for obj in data.get(collection) or []:
+                if obj.get('server_deleted_at'):
+                    self.store.remove(self.key, collection, obj['id'])
+                    deleted += 1
+                else:
+                    if isinstance(obj, Model):
+                        obj = obj.to_dict()
+                    self.store.put(self.key, collection, obj)
+                    updated += 1
+            changes[collection] = {'updated': updated, 'deleted': deleted}
+        self.store.set_since(self.key, response['since'])
+        return changes
+
+    def objects(self, collection):
+        """ Returns the synced objects of a collection, keyed by ID. """
+        return self.store.objects(self.key, collection)
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.transport
+----------------------
+
+Pluggable transports for :class:`togglwrapper.Toggl`. A transport is a
+`requests` transport adapter, given as ``Toggl(..., transport=...)`` and
+mounted on the client's session in place of the default pooled
+``HTTPAdapter``.
+
+:class:`RecordingAdapter` sends requests for real and records every exchange
+into a :class:`Cassette`. :class:`ReplayAdapter` plays a cassette back without
+a network, with optional simulated latency, injected 429 responses and
+scaled-up payloads, for benchmarks and load tests. :class:`WSGIAdapter`
+sends requests to a WSGI application in the same process, such as
+:class:`togglwrapper.simulator.TogglSimulator`.
+"""
+
+import io
+import json
+import random
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+
+
+# Response headers worth keeping in a cassette. Others, e.g. cookies or
+# Date, are dropped.
+RECORDED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Retry-After')
+
+# Added to the IDs of each extra copy of a scaled payload's elements.
+ID_STRIDE = 10 ** 9
+
+
+def request_key(method, url):
+    """
+    Returns what a recorded request is matched on: the method, and the path
+    and query string of the URL with the parameters sorted. The host is left
+    out, so cassettes replay against any base URL.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    path = parts.path + ('?' + query if query else '')
+    return method.upper(), path
+
+
+def scale_payload(payload, factor):
+    """
+    Returns a copy of a decoded response with every list of objects repeated
+    `factor` times. Copies get distinct IDs.
+
+    Handles top-level arrays, {'data': [...]} and the related data of
+    ``User.get(related_data=True)``.
+    """
+    def repeat(items):
+        if not items or not isinstance(items[0], dict):
+            return items
+        scaled = list(items)
+        for copy in range(1, factor):
+            for item in items:
+                item = dict(item)
+                if isinstance(item.get('id'), int):
+                    item['id'] += copy * ID_STRIDE
+                scaled.append(item)
+        return scaled
+
+    if factor <= 1:
+        return payload
+    if isinstance(payload, list):
+        return repeat(payload)
+    if isinstance(payload, dict) and 'data' in payload:
+        data = payload['data']
+        if isinstance(data, list):
+            data = repeat(data)
+        elif isinstance(data, dict):
+            data = dict((key, repeat(value) if isinstance(value, list)
+                         else value) for key, value in data.items())
+        return dict(payload, data=data)
+    return payload
+
+
+class Cassette(object):
+    """
+    Recorded HTTP exchanges, kept in order, optionally saved to a JSON file.
+
+    Each interaction is a dict with 'method', 'path' (including the sorted
+    query string), 'status', 'headers' and 'body' (the response text).
+    """
+    def __init__(self, path=None, interactions=None):
+        """
+        Args:
+            path (str, optional): The file to save to. Defaults to None.
+            interactions (list, optional): Interactions to start with.
+        """
+        self.path = path
+        self.interactions = list(interactions or [])
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """ Returns the cassette saved in the given file. """
+        with open(path) as cassette_file:
+            return cls(path, json.load(cassette_file)['interactions'])
+
+    def save(self, path=None):
+        """ Writes the interactions to the given file, or to `path`. """
+        with self._lock:
+            interactions = list(self.interactions)
+        with open(path or self.path, 'w') as cassette_file:
+            json.dump({'interactions': interactions}, cassette_file, indent=1)
+
+    def add(self, method, url, status=200, body='', headers=None):
+        """
+        Appends an interaction.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The URL or path of the request, with its query string.
+            status (int, optional): The response status. Defaults to 200.
+            body (str or JSON-serializable, optional): The response body.
+                Anything but a string is encoded as JSON.
+            headers (dict, optional): Response headers. Defaults to a JSON
+                Content-Type.
+        """
+        if not isinstance(body, str):
+            body = json.dumps(body)
+        method, path = request_key(method, url)
+        interaction = {
+            'method': method,
+            'path': path,
+            'status': status,
+            'headers': dict(headers or {'Content-Type': 'application/json'}),
+            'body': body,
+        }
+        with self._lock:
+            self.interactions.append(interaction)
+        return interaction
+
+    def __len__(self):
+        return len(self.interactions)
+
+
+def build_response(request, status, body, headers=None, connection=None):
+    """ Returns a requests.Response for a request, without a network. """
+    response = Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers or {})
+    response.raw = io.BytesIO(body)
+    response.encoding = 'utf-8'
+    response.url = request.url
+    response.request = request
+    response.connection = connection
+    return response
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Sends requests like the default adapter, and records every exchange into
+    a cassette. Call ``cassette.save()`` once done.
+    """
+    def __init__(self, cassette, **kwargs):
+        """
+        Args:
+            cassette (Cassette): Where exchanges are recorded.
+            **kwargs: Passed to `requests.adapters.HTTPAdapter`, e.g. the
+                pool sizes.
+        """
+        super(RecordingAdapter, self).__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request, stream=False, **kwargs):
+        response = super(RecordingAdapter, self).send(request, stream=stream,
+                                                      **kwargs)
+        # Reading the body here buffers streamed responses too.
+        body = response.content.decode(response.encoding or 'utf-8')
+        headers = dict((name, response.headers[name])
+                       for name in RECORDED_HEADERS
+                       if name in response.headers)
+        self.cassette.add(request.method, request.url, response.status_code,
+                          body, headers)
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers requests from a cassette without a network.
+
+    Interactions recorded for the same method and path are played back in
+    turn, wrapping around once all were played, so a short cassette can
+    drive a long load test.
+    """
+    def __init__(self, cassette, latency=0.0, throttle_rate=0.0,
+                 retry_after=1, scale=1, seed=None, sleep=time.sleep):
+        """
+        Args:
+            cassette (Cassette): The interactions to play back.
+            latency (float or callable, optional): Seconds to wait before
+                each response, or a function returning them, e.g. to draw
+                from a distribution. Defaults to 0.
+            throttle_rate (float, optional): The share of requests answered
+                with a 429 instead, between 0 and 1. Defaults to 0.
+            retry_after (int, optional): The Retry-After of injected 429
+                responses, in seconds. Defaults to 1.
+            scale (int, optional): Repeats every list of objects in JSON
+                responses this many times. Defaults to 1.
+            seed (optional): Seeds the random choice of throttled requests.
+            sleep (callable, optional): Blocks for the given seconds.
+                Defaults to `time.sleep`.
+        """
+        super(ReplayAdapter, self).__init__()
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.scale = scale
+        self.sleep = sleep
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._cursors = {}
+        self._routes = {}
+        self._bodies = {}
+        for interaction in cassette.interactions:
+            key = (interaction['method'], interaction['path'])
+            self._routes.setdefault(key, []).append(interaction)
+
+    def _next(self, key):
+        """ Returns the next interaction for the key, or None. """
+        routes = self._routes.get(key)
+        if not routes:
+            return None
+        with self._lock:
+            cursor = self._cursors.get(key, 0)
+            self._cursors[key] = cursor + 1
+        return routes[cursor % len(routes)]
+
+    def _body(self, interaction):
+        """ Returns the encoded, scaled body of an interaction, memoized. """
+        body = self._bodies.get(id(interaction))
+        if body is None:
+            text = interaction['body']
+            if self.scale > 1 and text:
+                try:
+                    text = json.dumps(scale_payload(json.loads(text),
+                                                    self.scale))
+                except ValueError:
+                    pass
+            body = self._bodies[id(interaction)] = text.encode('utf-8')
+        return body
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.requests += 1
+            throttle = (self.throttle_rate and
+                        self.random.random() < self.throttle_rate)
+            if throttle:
+                self.throttled += 1
+        latency = self.latency() if callable(self.latency) else self.latency
+        if latency > 0:
+            self.sleep(latency)
+        if throttle:
+            return build_response(
+                request, 429, b'', {'Retry-After': str(self.retry_after)},
+                self)
+
+        method, path = request_key(request.method, request.url)
+        interaction = self._next((method, path))
+        if interaction is None:
+            message = 'No recorded response for {} {}'.format(method, path)
+            return build_response(request, 404, json.dumps(message).encode(
+                'utf-8'), {'Content-Type': 'application/json'}, self)
+        return build_response(request, interaction['status'],
+                              self._body(interaction),
+                              interaction['headers'], self)
+
+    def close(self):
+        pass
+
+
+class WSGIAdapter(BaseAdapter):
+    """
+    Sends requests to a WSGI application in the same process, without a
+    network, e.g. a :class:`togglwrapper.simulator.TogglSimulator`.
+    """
+    def __init__(self, app):
+        """
+        Args:
+            app (callable): The WSGI application.
+        """
+        super(WSGIAdapter, self).__init__()
+        self.app = app
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        body = request.body or b''
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote(parts.path),
+            'QUERY_STRING': parts.query,
+            'SERVER_NAME': parts.hostname or 'localhost',
+            'SERVER_PORT': str(parts.port or
+                               (443 if parts.scheme == 'https' else 80)),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': parts.scheme,
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in request.headers.items():
+            key = name.upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            environ[key] = value
+
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        result = self.app(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return build_response(request, started['status'], content,
+                              started['headers'], self)
+
+    def close(self):
+        pass
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.utils
+------------------
+
+Small helpers shared by the other modules.
+"""
+
+from datetime import date, datetime, timezone
+
+
+def parse_datetime(value):
+    """
+    Returns a timezone-aware datetime from a datetime or ISO 8601 string.
+    Naive values are assumed to be UTC.
+    """
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def parse_date(value):
+    """ Returns a date from a date, a datetime or a 'YYYY-MM-DD' string. """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
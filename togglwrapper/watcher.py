@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+
+"""
+togglwrapper.watcher
+--------------------
+
+Tracking of the running time entries of many users, for status boards.
+
+Polling ``TimeEntries.get_current()`` every few seconds for every user spends
+most requests learning that nothing changed. A :class:`Watcher` polls each
+user on an adaptive interval instead: it starts at `min_interval`, grows by
+`backoff` after every poll that found no change, up to `max_interval`, and
+drops back to `min_interval` when the entry changes. A time entry started,
+stopped or edited through one of the watched clients makes that user's next
+poll immediate. The time a running entry has been running for is derived
+locally from its negative duration (see :func:`elapsed`), so no request is
+needed to keep a clock ticking.
+
+Changes are delivered to callbacks, from :meth:`Watcher.run`, or by an async
+iterator, :meth:`Watcher.changes`. Both wake up as soon as a write through a
+watched client expedites a poll::
+
+    watcher = Watcher(pool, on_change=board.update)
+    threading.Thread(target=watcher.run).start()
+    ...
+    watcher.stop()
+"""
+
+import threading
+import time
+
+from .concurrency import DEFAULT_MAX_WORKERS, run_concurrently
+from .hooks import Hook
+
+
+MIN_INTERVAL = 5.0
+MAX_INTERVAL = 300.0
+BACKOFF = 2.0
+
+
+def elapsed(entry, now=None):
+    """
+    Returns the seconds a time entry has been running, or lasted.
+
+    A running entry's duration is the negated epoch time it started at, so
+    adding the current epoch time gives the time it has run for.
+
+    Args:
+        entry (dict): A time entry.
+        now (float, optional): The current epoch time. Defaults to
+            `time.time()`.
+    """
+    duration = entry['duration']
+    if duration >= 0:
+        return duration
+    if now is None:
+        now = time.time()
+    return now + duration
+
+
+class Change(object):
+    """
+    A change of a user's running time entry.
+
+    Attributes:
+        key (hashable): The watched user.
+        previous (dict): The running time entry before, or None.
+        current (dict): The running time entry now, or None.
+    """
+    def __init__(self, key, previous, current):
+        self.key = key
+        self.previous = previous
+        self.current = current
+
+    @property
+    def started(self):
+        """ True if a different time entry is now running. """
+        return self.current is not None and (
+            self.previous is None or
+            self.previous['id'] != self.current['id'])
+
+    @property
+    def stopped(self):
+        """ True if the time entry that was running no longer is. """
+        return self.previous is not None and (
+            self.current is None or
+            self.previous['id'] != self.current['id'])
+
+    def __repr__(self):
+        return '<Change {!r} {} -> {}>'.format(
+            self.key,
+            self.previous['id'] if self.previous is not None else None,
+            self.current['id'] if self.current is not None else None)
+
+
+class _Watch(object):
+    """ The state of one watched user. """
+    __slots__ = ('toggl', 'hook', 'entry', 'interval', 'due')
+
+    def __init__(self, toggl, hook, interval, due):
+        self.toggl = toggl
+        self.hook = hook
+        self.entry = None
+        self.interval = interval
+        self.due = due
+
+
+class _WriteHook(Hook):
+    """ Expedites the next poll of a user after it wrote a time entry. """
+    def __init__(self, watcher, key):
+        self.watcher = watcher
+        self.key = key
+
+    def after_response(self, event, response):
+        if (event.method != 'GET' and
+                event.endpoint.startswith('/time_entries') and
+                response.status_code < 400):
+            self.watcher.expedite(self.key)
+
+
+class Watcher(object):
+    """
+    Polls the running time entries of many users on adaptive intervals.
+
+    Attributes:
+        polls (int): Requests made to get running time entries.
+        errors (dict): The exception of the last failed poll of each user
+            whose last poll failed.
+    """
+    def __init__(self, clients=None, on_change=None,
+                 min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 backoff=BACKOFF, max_workers=DEFAULT_MAX_WORKERS,
+                 clock=time.time):
+        """
+        Args:
+            clients (mapping, optional): The :class:`togglwrapper.Toggl`
+                client of every user to watch, keyed by anything hashable,
+                e.g. a dict or a :class:`togglwrapper.pool.TogglPool`.
+                Defaults to None, which watches no one until :meth:`add`.
+            on_change (callable, optional): Called with every
+                :class:`Change` found by :meth:`poll`. Defaults to None.
+            min_interval (float, optional): The shortest time between two
+                polls of a user, in seconds. Defaults to 5.
+            max_interval (float, optional): The longest time between two
+                polls of a user, in seconds. Defaults to 300.
+            backoff (float, optional): The factor the interval grows by after
+                a poll finding no change. Defaults to 2.
+            max_workers (int, optional): The maximum number of users polled
+                at once. Defaults to 8.
+            clock (callable, optional): Returns the current epoch time in
+                seconds. Defaults to `time.time`.
+        """
+        self.on_change = on_change
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_workers = max_workers
+        self.clock = clock
+        self.polls = 0
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._watches = {}
+        self._stopped = False
+        self._wakeup = threading.Event()
+        self._async_wakeups = []
+        for key in clients or ():
+            self.add(key, clients[key])
+
+    def add(self, key, toggl):
+        """
+        Starts watching a user, polling them on the next :meth:`poll`.
+
+        A hook is added to the client, so that time entries written through
+        it make the next poll of the user immediate.
+        """
+        hook = _WriteHook(self, key)
+        with self._lock:
+            if key in self._watches:
+                raise ValueError('Already watching {!r}.'.format(key))
+            self._watches[key] = _Watch(toggl, hook, self.min_interval,
+                                        self.clock())
+        # Replaced rather than appended to, so that requests iterating over
+        # the hooks on other threads never see the list change.
+        toggl.hooks = toggl.hooks + [hook]
+
+    def remove(self, key):
+        """ Stops watching a user, and removes the hook from their client. """
+        with self._lock:
+            watch = self._watches.pop(key)
+            self.errors.pop(key, None)
+        watch.toggl.hooks = [hook for hook in watch.toggl.hooks
+                             if hook is not watch.hook]
+
+    def expedite(self, key):
+        """ Polls a user now, and then at the shortest interval. """
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is None:
+                return
+            watch.interval = self.min_interval
+            watch.due = self.clock()
+        self._wake()
+
+    def _wake(self):
+        """ Wakes :meth:`run` and :meth:`changes` if they are waiting. """
+        self._wakeup.set()
+        with self._lock:
+            wakeups = list(self._async_wakeups)
+        for loop, event in wakeups:
+            loop.call_soon_threadsafe(event.set)
+
+    def running(self):
+        """
+        Returns the running time entry of every watched user, as of their
+        last poll, keyed by user. Users not running one are left out.
+        """
+        with self._lock:
+            return dict((key, watch.entry)
+                        for key, watch in self._watches.items()
+                        if watch.entry is not None)
+
+    def elapsed(self, key):
+        """
+        Returns the seconds the user's time entry has been running, derived
+        from their last poll, or None if they are not running one.
+        """
+        with self._lock:
+            entry = self._watches[key].entry
+        if entry is None:
+            return None
+        return elapsed(entry, self.clock())
+
+    def delay(self):
+        """ Returns the seconds until the next poll is due, at least 0. """
+        with self._lock:
+            if not self._watches:
+                return self.max_interval
+            due = min(watch.due for watch in self._watches.values())
+        return max(0.0, due - self.clock())
+
+    def poll(self):
+        """
+        Polls every user whose poll is due, concurrently.
+
+        Returns:
+            list of Change: The changes found, in the order the users were
+                added. Each is passed to `on_change` too. The first poll of a
+                user running a time entry finds it started.
+        """
+        now = self.clock()
+        with self._lock:
+            due = [(key, watch) for key, watch in self._watches.items()
+                   if watch.due <= now]
+            # Marks the polls in flight: a write made meanwhile through the
+            # client sets a new due time, which is kept.
+            for _, watch in due:
+                watch.due = float('inf')
+        result = run_concurrently(
+            [(key, watch.toggl.TimeEntries.get_current) for key, watch in due],
+            self.max_workers)
+
+        changes = []
+        now = self.clock()
+        with self._lock:
+            self.polls += len(due)
+            for key, watch in due:
+                if key not in self._watches:
+                    continue
+                if key in result.errors:
+                    self.errors[key] = result.errors[key]
+                else:
+                    self.errors.pop(key, None)
+                    current = result.results[key]['data']
+                    if current == watch.entry:
+                        watch.interval = min(watch.interval * self.backoff,
+                                             self.max_interval)
+                    else:
+                        changes.append(Change(key, watch.entry, current))
+                        watch.interval = self.min_interval
+                    watch.entry = current
+                if watch.due == float('inf'):
+                    watch.due = now + watch.interval
+                else:
+                    watch.interval = self.min_interval
+        if self.on_change is not None:
+            for change in changes:
+                self.on_change(change)
+        return changes
+
+    def run(self):
+        """
+        Polls users as they fall due, passing changes to `on_change`, until
+        :meth:`stop` is called. Waits between polls are cut short when a
+        write through a watched client expedites a user.
+        """
+        try:
+            while True:
+                # Cleared before polling, so that a write made during the
+                # poll still cuts the following wait short.
+                self._wakeup.clear()
+                if self._stopped:
+                    return
+                self.poll()
+                self._wakeup.wait(self.delay())
+        finally:
+            self._stopped = False
+
+    def stop(self):
+        """ Makes :meth:`run` return, waking it if it is waiting. """
+        self._stopped = True
+        self._wake()
+
+    async def changes(self):
+        """
+        Yields every :class:`Change`, polling users as they fall due::
+
+            async for change in watcher.changes():
+                ...
+
+        The polls run on the event loop's default executor. Waits between
+        polls are cut short when a write through a watched client expedites
+        a user.
+        """
+        import asyncio
+
+        loop = asyncio.get_event_loop()
+        wakeup = (loop, asyncio.Event())
+        with self._lock:
+            self._async_wakeups.append(wakeup)
+        try:
+            while True:
+                wakeup[1].clear()
+                for change in await loop.run_in_executor(None, self.poll):
+                    yield change
+                try:
+                    await asyncio.wait_for(wakeup[1].wait(), self.delay())
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                self._async_wakeups.remove(wakeup)